@@ -1,11 +1,78 @@
 from flask import Flask
 
-def create_app():
-    app = Flask(__name__)
-    app.secret_key = 'supersecretkey'  # Needed for session support
+def create_app(config=None):
+    """Build the app from a Config (or anything with uppercase settings).
+
+    A dict is applied on top of the environment defaults. Optional features
+    are only imported when enabled, so a worker boots with just what it
+    serves.
+    """
+    from app.config import Config, WORKER_MODES
+
+    app = Flask(__name__, template_folder='../templates', static_folder='../static')
+    app.config.from_object(Config())
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    mode = app.config['GAME_WORKER_MODE']
+    if mode not in WORKER_MODES:
+        raise ValueError('GAME_WORKER_MODE must be one of ' + ', '.join(WORKER_MODES))
+    if mode == 'gevent':
+        # Locks created before patching would block the whole worker
+        from gevent import monkey
+        if not monkey.is_module_patched('threading'):
+            raise RuntimeError('GAME_WORKER_MODE=gevent needs the gevent worker (gunicorn -k gevent)')
+
+    from app import game
+    from app.storage import storage_from_url
+    game.set_storage(storage_from_url(app.config['GAME_STORAGE_URL']))
+    game.configure(game_range=app.config['GAME_RANGE'], max_games=app.config['GAME_MAX_GAMES'],
+                   max_rooms=app.config['GAME_MAX_ROOMS'], cache_size=app.config['GAME_CACHE_SIZE'])
+
+    if app.config['GAME_JOURNAL']:
+        from app import journal
+        journal.init_app(app, app.config['GAME_JOURNAL'], app.config['GAME_JOURNAL_ARCHIVE'])
+    else:
+        game.journal = None
 
     # Import and register blueprints
     from app.routes import main_bp
+    from app.api import api_bp
     app.register_blueprint(main_bp)
+    app.register_blueprint(api_bp)
+
+    # Templates link static files through asset_url(), fingerprinted or not
+    from app import assets
+    app.jinja_env.globals['asset_url'] = assets.asset_url
+    if app.config['GAME_ASSETS']:
+        assets.init_app(app)
+
+    if app.config['GAME_LEGACY_ROUTES']:
+        from app.legacy import legacy_bp
+        app.register_blueprint(legacy_bp)
+
+    if app.config['GAME_STATELESS']:
+        from app.tokens import GameTokens
+        app.extensions['game_tokens'] = GameTokens(app.secret_key)
+
+    if app.config['GAME_RATE_LIMIT']:
+        from app import ratelimit
+        ratelimit.init_app(app, game.storage)
+
+    if app.config['GAME_METRICS']:
+        from app import metrics
+        metrics.init_app(app)
+
+    if app.config['GAME_PRELOAD']:
+        # Compile the page templates once at startup instead of on first request
+        for template in ('index.html', 'guess.html', 'scores.html'):
+            app.jinja_env.get_template(template)
+
+        # Build the par table for the default range before the first win
+        from app.solver import get_table
+        from app.targets import DIFFICULTIES, DEFAULT_DIFFICULTY
+        get_table(*DIFFICULTIES[DEFAULT_DIFFICULTY])
 
-    return app 
\ No newline at end of file
+    return app
@@ -0,0 +1,22 @@
+import hmac
+from functools import wraps
+
+from flask import abort, current_app, jsonify, request
+
+
+def admin_required(view):
+    """Serve ``view`` only to requests bearing GAME_ADMIN_TOKEN.
+
+    Clients send ``Authorization: Bearer <token>``. Without a configured
+    token the endpoint is not served at all.
+    """
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        token = current_app.config.get('GAME_ADMIN_TOKEN')
+        if not token:
+            abort(404)
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return jsonify({'error': 'Admin token required'}), 401
+        return view(*args, **kwargs)
+    return guarded
@@ -0,0 +1,264 @@
+"""Offline analytics over the guesses recorded in the event log.
+
+Loads every game and guess from a GAME_JOURNAL directory (including its
+archive/ when GAME_JOURNAL_ARCHIVE is set) into NumPy arrays and reports,
+per player, efficiency against binary search, inter-guess timing and a
+fingerprint of how their guesses relate to the remaining interval:
+
+    python -m app.analytics /var/lib/guess/journal > report.json
+
+NumPy is only needed here: pip install numpy
+"""
+import argparse
+import json
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from app.journal import ARCHIVE, segments
+
+# Inter-guess intervals shorter than this (seconds) are faster than a
+# person types a number
+FAST_GUESS = 0.3
+
+# Intervals or games a player needs before being flagged
+MIN_SAMPLES = 20
+
+# Flag thresholds: share of fast guesses, coefficient of variation of the
+# intervals (scripts are regular), and efficiency over many games (better
+# than binary search on average means the player knew the target)
+FAST_SHARE = 0.5
+REGULAR_CV = 0.1
+TOO_EFFICIENT = 1.5
+
+PATTERNS = ('bisect', 'sequential', 'wasted', 'other')
+
+
+def read_events(directory):
+    """Events of every archived and live segment, oldest first."""
+    paths = segments(directory)
+    if os.path.isdir(os.path.join(directory, ARCHIVE)):
+        paths = segments(os.path.join(directory, ARCHIVE)) + paths
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                yield event[1:]
+
+
+class GuessTable:
+    """Games and guesses as flat arrays.
+
+    Games (including each reset of a game) are numbered in order of
+    appearance; ``target``, ``low``, ``high`` and ``player`` are indexed by
+    game, with players as indexes into ``players``. Guesses are sorted by
+    game, keeping their order within it, in ``game``, ``value`` and ``time``.
+    """
+
+    def __init__(self, players, target, low, high, player, game, value, time):
+        self.players = players
+        self.target, self.low, self.high, self.player = target, low, high, player
+        order = np.argsort(game, kind='stable')
+        self.game, self.value, self.time = game[order], value[order], time[order]
+
+
+def load_guesses(events):
+    """Build a GuessTable from journal events (see read_events)."""
+    if np is None:
+        raise RuntimeError('app.analytics needs NumPy: pip install numpy')
+    players, player_ids = [], {}
+    current = {}
+    target, low, high, owner = [], [], [], []
+    game, value, time = [], [], []
+    for event in events:
+        op = event[0]
+        if op == 'guess' and event[1] in current and len(event) > 3:
+            game.append(current[event[1]])
+            value.append(event[2])
+            time.append(event[3])
+        elif op == 'new_game' or (op == 'reset_game' and event[1] in current):
+            if op == 'new_game':
+                _, game_id, game_target, player, game_low, game_high = event
+            else:
+                # A reset starts a new game for the same player and range
+                _, game_id, game_target = event
+                index = current[game_id]
+                player = players[owner[index]] if owner[index] >= 0 else None
+                game_low, game_high = low[index], high[index]
+            current[game_id] = len(target)
+            if player is not None and player not in player_ids:
+                player_ids[player] = len(players)
+                players.append(player)
+            target.append(game_target)
+            low.append(game_low)
+            high.append(game_high)
+            owner.append(player_ids[player] if player is not None else -1)
+    return GuessTable(players, np.array(target, np.int64), np.array(low, np.int64), np.array(high, np.int64),
+                      np.array(owner, np.int64), np.array(game, np.int64), np.array(value, np.int64),
+                      np.array(time, np.float64))
+
+
+def par(target, low, high):
+    """Binary-search guesses needed for each target, all games at once."""
+    depth = np.ones_like(target)
+    low, high = low.copy(), high.copy()
+    searching = np.ones(target.shape, bool)
+    while searching.any():
+        middle = (low + high) // 2
+        found = middle == target
+        searching &= ~found
+        depth[searching] += 1
+        low = np.where(searching & (middle < target), middle + 1, low)
+        high = np.where(searching & (middle > target), middle - 1, high)
+    return depth
+
+
+def intervals_before(table):
+    """The interval (low, high) still open before each guess."""
+    low, high = table.low[table.game], table.high[table.game]
+    target = table.target[table.game]
+    value = np.clip(table.value, low - 1, high + 1)
+    # Segmented running max/min: an offset per game keeps each game's
+    # values above all earlier games' so one accumulate covers them all
+    offset = table.game * (int(table.high.max() - table.low.min()) + 4 if len(table.high) else 0)
+    low_after = np.maximum.accumulate(np.where(value < target, value + 1, low) + offset) - offset
+    high_after = -(np.maximum.accumulate(-np.where(value > target, value - 1, high) + offset) - offset)
+    first = np.ones(len(value), bool)
+    first[1:] = table.game[1:] != table.game[:-1]
+    low_before = np.where(first, low, np.roll(low_after, 1))
+    high_before = np.where(first, high, np.roll(high_after, 1))
+    return np.maximum(low_before, low), np.minimum(high_before, high), first
+
+
+def patterns(table):
+    """Index into PATTERNS for every guess."""
+    low, high, first = intervals_before(table)
+    middle = (low + high) // 2
+    bisect = (table.value == middle) | (table.value == (low + high + 1) // 2)
+    wasted = (table.value < low) | (table.value > high)
+    step = np.abs(np.diff(table.value, prepend=table.value[:1]))
+    sequential = ~first & (step == 1)
+    return np.select([bisect, wasted, sequential], [0, 2, 1], 3)
+
+
+def per_player(keys, count, values=None):
+    # Sum (or count) per player; unowned entries (-1) are dropped
+    owned = keys >= 0
+    return np.bincount(keys[owned], weights=None if values is None else values[owned], minlength=count)
+
+
+def report(table, fast=FAST_GUESS, min_samples=MIN_SAMPLES):
+    """Per-player efficiency, timing and guess-pattern report as a dict."""
+    count = len(table.players)
+    games = len(table.target)
+    guess_player = table.player[table.game] if len(table.game) else table.game
+
+    # Guesses until the first correct one, for finished games
+    correct = table.value == table.target[table.game]
+    finished_games, first_correct = np.unique(table.game[correct], return_index=True)
+    starts = np.searchsorted(table.game, finished_games)
+    guesses = np.flatnonzero(correct)[first_correct] - starts + 1
+    finished_par = par(table.target[finished_games], table.low[finished_games], table.high[finished_games])
+    finished_player = table.player[finished_games]
+    efficiency = finished_par / guesses
+
+    # Inter-guess intervals within a game
+    same = table.game[1:] == table.game[:-1]
+    gaps = np.diff(table.time)[same]
+    gap_player = guess_player[1:][same]
+    gap_count = per_player(gap_player, count)
+    gap_sum = per_player(gap_player, count, gaps)
+    gap_squares = per_player(gap_player, count, gaps * gaps)
+    fast_count = per_player(gap_player, count, (gaps < fast).astype(np.float64))
+    owned = gap_player >= 0
+    order = np.lexsort((gaps[owned], gap_player[owned]))
+    sorted_gaps, sorted_players = gaps[owned][order], gap_player[owned][order]
+    gap_starts = np.searchsorted(sorted_players, np.arange(count))
+
+    kinds = patterns(table) if len(table.game) else table.game
+    guess_count = per_player(guess_player, count)
+    shares = [per_player(guess_player, count, (kinds == index).astype(np.float64)) for index in range(len(PATTERNS))]
+
+    game_count = per_player(table.player, count)
+    finished_count = per_player(finished_player, count)
+    guess_sum = per_player(finished_player, count, guesses.astype(np.float64))
+    par_sum = per_player(finished_player, count, finished_par.astype(np.float64))
+    efficiency_sum = per_player(finished_player, count, efficiency)
+
+    players = {}
+    for index, name in enumerate(table.players):
+        entry = {'games': int(game_count[index]), 'finished': int(finished_count[index])}
+        if finished_count[index]:
+            entry['mean_guesses'] = guess_sum[index] / finished_count[index]
+            entry['mean_par'] = par_sum[index] / finished_count[index]
+            entry['efficiency'] = efficiency_sum[index] / finished_count[index]
+        if gap_count[index]:
+            mean = gap_sum[index] / gap_count[index]
+            variance = max(gap_squares[index] / gap_count[index] - mean * mean, 0.0)
+            entry['timing'] = {
+                'intervals': int(gap_count[index]),
+                'median': float(sorted_gaps[gap_starts[index] + int(gap_count[index]) // 2]),
+                'fast_share': fast_count[index] / gap_count[index],
+                'cv': variance ** 0.5 / mean if mean else 0.0,
+            }
+        if guess_count[index]:
+            entry['patterns'] = {name: shares[kind][index] / guess_count[index] for kind, name in enumerate(PATTERNS)}
+            entry['style'] = style(entry['patterns'])
+        entry['flags'] = flags(entry, min_samples)
+        players[name] = entry
+    return {
+        'games': games,
+        'finished': len(finished_games),
+        'guesses': len(table.value),
+        'mean_efficiency': float(efficiency.mean()) if len(efficiency) else None,
+        'players': players,
+    }
+
+
+def style(shares):
+    if shares['bisect'] >= 0.8:
+        return 'binary-search'
+    if shares['sequential'] >= 0.5:
+        return 'linear-scan'
+    if shares['wasted'] >= 0.3:
+        return 'careless'
+    return 'mixed'
+
+
+def flags(entry, min_samples=MIN_SAMPLES):
+    found = []
+    timing = entry.get('timing')
+    if timing and timing['intervals'] >= min_samples:
+        if timing['fast_share'] >= FAST_SHARE:
+            found.append('fast')
+        if timing['cv'] < REGULAR_CV:
+            found.append('regular')
+    if entry['finished'] >= min_samples and entry['efficiency'] >= TOO_EFFICIENT:
+        found.append('too-efficient')
+    if entry.get('style') == 'linear-scan' and entry['games'] >= min_samples:
+        found.append('brute-force')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('journal', help='GAME_JOURNAL directory')
+    parser.add_argument('--flagged', action='store_true', help='only list flagged players')
+    args = parser.parse_args(argv)
+    result = report(load_guesses(read_events(args.journal)))
+    if args.flagged:
+        result['players'] = {name: entry for name, entry in result['players'].items() if entry['flags']}
+    json.dump(result, sys.stdout, indent=2, default=float)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+import json
+
+from flask import Blueprint, request, jsonify, current_app, abort, Response, stream_with_context
+from app.game import add_player, add_guess, record_score, evaluate_guess, get_game, new_game, game_locks, create_room, get_room, join_room, leave_room, room_guess, TOO_LOW, TOO_HIGH, CORRECT, OUT_OF_GUESSES, ROOM_FINISHED
+from app.metrics import counters
+from app.ratelimit import limit_games, limit_guesses
+from app.sessions import MAX_GUESSES
+from app.solver import hint, par
+from app.targets import DIFFICULTIES, DEFAULT_DIFFICULTY, new_target
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Upper bound on guesses accepted in one batch request
+MAX_BATCH_GUESSES = 1000
+
+RESULTS = {TOO_LOW: 'low', TOO_HIGH: 'high', CORRECT: 'correct'}
+
+# Seconds between keep-alive comments on an idle room stream
+ROOM_KEEPALIVE = 15
+
+def parse_new_game(data):
+    # Returns (player, difficulty, seed) or raises ValueError
+    difficulty = data.get('difficulty', DEFAULT_DIFFICULTY)
+    seed = data.get('seed')
+    if difficulty not in DIFFICULTIES:
+        raise ValueError('Difficulty must be one of ' + ', '.join(DIFFICULTIES))
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        raise ValueError('Seed must be an integer')
+    return data.get('player'), difficulty, seed
+
+def parse_guesses(data):
+    guesses = data.get('guesses') if isinstance(data, dict) else data
+    if (not isinstance(guesses, list) or not guesses or len(guesses) > MAX_BATCH_GUESSES
+            or not all(isinstance(number, int) and not isinstance(number, bool) for number in guesses)):
+        raise ValueError(f'Expected a list of 1 to {MAX_BATCH_GUESSES} integer guesses')
+    return guesses
+
+def play_batch(game, guesses, previous=None):
+    # Evaluate in order and stop at the first correct guess. Token games
+    # pass the ``previous`` count from their token and keep no pending
+    # guesses on the server, so any worker can score them
+    results = []
+    for number in guesses:
+        if game.player and previous is None:
+            add_guess(game.player, number)
+        result = evaluate_guess(game, number)
+        results.append({'guess': number, 'result': RESULTS[result]})
+        if result == CORRECT:
+            if game.player and previous is None:
+                record_score(game.player, score=len(game.guesses))
+            elif game.player:
+                add_player(game.player)
+                record_score(game.player, score=previous + len(game.guesses), keep_guesses=True)
+            break
+    return results
+
+@api_bp.route('/games', methods=['POST'])
+def create_game():
+    try:
+        player_name, difficulty, seed = parse_new_game(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limited = limit_games()
+    if limited:
+        return limited
+    if player_name:
+        add_player(player_name)
+    game = get_game(new_game(player_name, difficulty, seed))
+    return jsonify(game.to_dict()), 201
+
+@api_bp.route('/games/<game_id>', methods=['GET'])
+def show_game(game_id):
+    game = get_game(game_id)
+    if game is None:
+        return jsonify({'error': 'Game not found'}), 404
+    return jsonify(game.to_dict())
+
+@api_bp.route('/games/<game_id>/hint', methods=['GET'])
+def show_hint(game_id):
+    if not current_app.config.get('GAME_HINTS'):
+        return jsonify({'error': 'Hints are disabled'}), 404
+    game = get_game(game_id)
+    if game is None:
+        return jsonify({'error': 'Game not found'}), 404
+    return jsonify(hint(game))
+
+@api_bp.route('/games/<game_id>/guesses', methods=['POST'])
+def submit_guesses(game_id):
+    try:
+        guesses = parse_guesses(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    game = get_game(game_id)
+    if game is None:
+        return jsonify({'error': 'Game not found'}), 404
+    limited = limit_guesses(len(guesses), f'game:{game.id}')
+    if limited:
+        return limited
+    # Hold the game for the whole batch so concurrent batches cannot interleave
+    with game_locks(game.id):
+        if game.finished:
+            return jsonify({'error': 'Game already finished'}), 409
+        if game.guesses_left <= 0:
+            return jsonify({'error': 'No guesses left in this game'}), 409
+        results = play_batch(game, guesses[:game.guesses_left])
+    return jsonify({
+        'game': game.to_dict(),
+        'results': results,
+        'finished': game.finished,
+        'par': par(game) if game.finished else None,
+        'unused': len(guesses) - len(results),
+    })
+
+# --- Stateless games carried in signed tokens (GAME_STATELESS) ---
+def game_tokens():
+    tokens = current_app.extensions.get('game_tokens')
+    if tokens is None:
+        abort(404)
+    return tokens
+
+@api_bp.route('/tokens', methods=['POST'])
+def create_token_game():
+    tokens = game_tokens()
+    try:
+        player_name, difficulty, seed = parse_new_game(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limited = limit_games()
+    if limited:
+        return limited
+    if player_name:
+        add_player(player_name)
+    low, high = DIFFICULTIES[difficulty]
+    counters.add('games')
+    game = tokens.new_game(new_target(low, high, seed), low, high, player_name)
+    return jsonify({'token': tokens.issue(game), 'player': player_name, 'low': low, 'high': high}), 201
+
+@api_bp.route('/tokens/guesses', methods=['POST'])
+def submit_token_guesses():
+    from app.tokens import InvalidToken
+    tokens = game_tokens()
+    data = request.get_json(silent=True) or {}
+    try:
+        guesses = parse_guesses(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Checked before loading so a refused request does not spend the token
+    limited = limit_guesses(len(guesses))
+    if limited:
+        return limited
+    try:
+        game, previous = tokens.load(data.get('token') or '')
+    except InvalidToken as e:
+        return jsonify({'error': str(e)}), 403
+    if previous >= MAX_GUESSES:
+        return jsonify({'error': 'No guesses left in this game'}), 409
+    results = play_batch(game, guesses[:MAX_GUESSES - previous], previous)
+    count = previous + len(results)
+    return jsonify({
+        'results': results,
+        'guesses': count,
+        'finished': game.finished,
+        'par': par(game) if game.finished else None,
+        # Finished games get no further token
+        'token': None if game.finished else tokens.issue(game, count),
+        'unused': len(guesses) - len(results),
+    })
+
+# --- Multiplayer rooms ---
+@api_bp.route('/rooms', methods=['POST'])
+def open_room():
+    try:
+        player_name, difficulty, seed = parse_new_game(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limited = limit_games()
+    if limited:
+        return limited
+    room = create_room(difficulty, seed)
+    if player_name:
+        join_room(room.id, player_name)
+    return jsonify(room.to_dict()), 201
+
+@api_bp.route('/rooms/<room_id>', methods=['GET'])
+def show_room(room_id):
+    room = get_room(room_id)
+    if room is None:
+        return jsonify({'error': 'Room not found'}), 404
+    return jsonify(room.to_dict())
+
+@api_bp.route('/rooms/<room_id>/members', methods=['POST'])
+def enter_room(room_id):
+    player_name = (request.get_json(silent=True) or {}).get('player')
+    if not isinstance(player_name, str) or not player_name:
+        return jsonify({'error': 'Player name is required'}), 400
+    # A new member gets a fresh guess bucket, so joining costs like a new game
+    limited = limit_games()
+    if limited:
+        return limited
+    room = join_room(room_id, player_name)
+    if room is None:
+        return jsonify({'error': 'Room not found'}), 404
+    return jsonify(room.to_dict())
+
+@api_bp.route('/rooms/<room_id>/members/<player_name>', methods=['DELETE'])
+def exit_room(room_id, player_name):
+    if not leave_room(room_id, player_name):
+        return jsonify({'error': 'Player is not in this room'}), 404
+    return jsonify({'message': f'{player_name} left the room'})
+
+@api_bp.route('/rooms/<room_id>/guesses', methods=['POST'])
+def submit_room_guess(room_id):
+    data = request.get_json(silent=True) or {}
+    number = data.get('guess')
+    if not isinstance(number, int) or isinstance(number, bool):
+        return jsonify({'error': 'Guess must be an integer'}), 400
+    room = get_room(room_id)
+    if room is None:
+        return jsonify({'error': 'Room not found'}), 404
+    limited = limit_guesses(key=f"room:{room.id}:{data.get('player')}")
+    if limited:
+        return limited
+    result = room_guess(room, data.get('player'), number)
+    if result is None:
+        return jsonify({'error': 'Player is not in this room'}), 403
+    if result == ROOM_FINISHED:
+        return jsonify({'error': 'Room already won', 'winner': room.winner}), 409
+    if result == OUT_OF_GUESSES:
+        return jsonify({'error': 'No guesses left in this room'}), 409
+    return jsonify({'guess': number, 'result': RESULTS[result], 'finished': room.finished, 'winner': room.winner})
+
+def room_events(room, sequence):
+    # Same framing as /scores/stream; ends once the room is closed
+    yield 'retry: 3000\n\n'
+    while not room.closed:
+        sequence, changes = room.feed.wait(sequence, ROOM_KEEPALIVE)
+        if changes is None:
+            yield f'id: {sequence}\nevent: reset\ndata: {json.dumps(room.to_dict())}\n\n'
+        elif changes:
+            changes.pop(None, None)
+            if changes:
+                yield f'id: {sequence}\nevent: room\ndata: {json.dumps(list(changes.values()))}\n\n'
+        else:
+            yield ': keepalive\n\n'
+    yield 'event: closed\ndata: {}\n\n'
+
+@api_bp.route('/rooms/<room_id>/events')
+def stream_room(room_id):
+    room = get_room(room_id)
+    if room is None:
+        return jsonify({'error': 'Room not found'}), 404
+    sequence = request.headers.get('Last-Event-ID', type=int)
+    if sequence is None:
+        sequence = room.feed.sequence
+    response = Response(stream_with_context(room_events(room, sequence)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
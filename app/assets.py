@@ -0,0 +1,158 @@
+"""Fingerprinted, precompressed static assets.
+
+At startup every file under static/ is read once and named after a hash of
+its content (game.css -> game.1a2b3c4d5e.css). Text files are also
+compressed with gzip, and with brotli when the ``brotli`` package is
+installed. Templates link to them through ``asset_url()``; as a new version
+gets a new URL, /assets/ responses can be cached by browsers for a year.
+
+The feedback GIFs are vendored into static/img by running
+
+    python -m app.assets fetch
+
+and until then ``asset_url()`` links to where they were originally hosted.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import urllib.request
+
+from flask import Blueprint, Response, abort, current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vendored images and the address each was copied from
+REMOTE = {
+    'img/win.gif': 'https://media.giphy.com/media/4T7e4DmcrP9du/giphy.gif',
+    'img/welcome.gif': 'https://media.giphy.com/media/3o7aCSPqXE5C6T8tBC/giphy.gif',
+}
+
+# Precompressed when at least this large; images are compressed already
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'image/x-icon',
+                'image/vnd.microsoft.icon')
+MIN_COMPRESS_SIZE = 512
+
+# A year, the longest lifetime caches honour
+MAX_AGE = 365 * 24 * 60 * 60
+
+# Encodings in order of preference
+ENCODINGS = ('br', 'gzip')
+
+
+class Asset:
+    """One static file: its bodies per content encoding, and their ETag."""
+
+    __slots__ = ('filename', 'mimetype', 'digest', 'bodies')
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha1(data).hexdigest()
+        self.bodies = {'identity': data}
+        if len(data) >= MIN_COMPRESS_SIZE and self.mimetype.startswith(COMPRESSIBLE):
+            self.bodies['gzip'] = gzip.compress(data, 9, mtime=0)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(data)
+            # Only keep encodings that actually save bytes
+            for encoding in ENCODINGS:
+                if len(self.bodies.get(encoding, data)) >= len(data):
+                    self.bodies.pop(encoding, None)
+
+    @property
+    def url_name(self):
+        root, extension = os.path.splitext(self.filename)
+        return f'{root}.{self.digest[:10]}{extension}'
+
+
+class AssetManifest:
+    """Every file under ``folder``, keyed by its name and its fingerprinted name."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.url_names = {}
+        self._assets = {}
+        for directory, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(directory, name)
+                filename = os.path.relpath(path, folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    asset = Asset(filename, f.read())
+                self.url_names[filename] = asset.url_name
+                self._assets[asset.url_name] = asset
+
+    def __len__(self):
+        return len(self._assets)
+
+    def get(self, url_name):
+        return self._assets.get(url_name)
+
+
+def asset_url(filename):
+    """URL of a static file: fingerprinted, local, or its original location."""
+    manifest = current_app.extensions.get('game_assets')
+    if manifest is not None and filename in manifest.url_names:
+        return url_for('assets.asset', filename=manifest.url_names[filename])
+    if filename in REMOTE and not os.path.exists(os.path.join(current_app.static_folder, filename)):
+        return REMOTE[filename]
+    return url_for('static', filename=filename)
+
+
+def choose_encoding(asset):
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if encoding in asset.bodies and accepted[encoding]:
+            return encoding
+    return 'identity'
+
+
+assets_bp = Blueprint('assets', __name__)
+
+
+@assets_bp.route('/assets/<path:filename>')
+def asset(filename):
+    asset = current_app.extensions['game_assets'].get(filename)
+    if asset is None:
+        abort(404)
+    encoding = choose_encoding(asset)
+    response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(asset.digest if encoding == 'identity' else f'{asset.digest}-{encoding}')
+    response.cache_control.public = True
+    response.cache_control.max_age = MAX_AGE
+    response.cache_control.immutable = True
+    # Answers If-None-Match with 304 and Range with 206
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(asset.bodies[encoding]))
+
+
+def init_app(app):
+    """Fingerprint and compress the static folder and serve it under /assets/."""
+    app.extensions['game_assets'] = AssetManifest(app.static_folder)
+    app.register_blueprint(assets_bp)
+
+
+def fetch(folder, remote=REMOTE):
+    """Download the vendored files that are missing from ``folder``."""
+    for filename, url in remote.items():
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        print(f'{filename}: {len(data)} bytes from {url}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['fetch']:
+        sys.exit('usage: python -m app.assets fetch')
+    fetch(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'))
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Serialized responses kept per process
+MAX_ENTRIES = 10000
+
+
+class ResponseCache:
+    """Serialized read responses, invalidated by the writes in app.game.
+
+    Collection views (all players, score pages) are keyed by the version
+    of the data they were built from, which every relevant write bumps.
+    Per-player views are dropped individually when that player changes.
+    Both live in one bounded LRU.
+
+    The versions are per process, so the cache is only safe with storage
+    that is not shared between workers.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.enabled = True
+        self.versions = {'players': 0, 'scores': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, names=(), players=True, scores=False):
+        with self._lock:
+            if players:
+                self.versions['players'] += 1
+            if scores:
+                self.versions['scores'] += 1
+            for name in names:
+                self._entries.pop(('player', name), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for kind in self.versions:
+                self.versions[kind] += 1
+
+    def get(self, key, kind, build):
+        """Return (etag, body) for ``key``, calling ``build()`` on a miss.
+
+        ``kind`` names the version the entry depends on ('players' or
+        'scores'), or is None for per-player entries.
+        """
+        if not self.enabled:
+            body = build()
+            return etag_for(body), body
+        with self._lock:
+            version = self.versions[kind] if kind else None
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] is not None:
+                self._entries.move_to_end(key)
+                return entry[1], entry[2]
+            # Placeholder that invalidate() removes if the data changes
+            # while the response is being built
+            pending = self._entries[key] = (object(), None, None)
+        body = build()
+        etag = etag_for(body)
+        with self._lock:
+            if self._entries.get(key) is pending and (kind is None or self.versions[kind] == version):
+                self._entries[key] = (version, etag, body)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+
+def etag_for(body):
+    return hashlib.sha1(body).hexdigest()
@@ -0,0 +1,76 @@
+import os
+
+from app.cache import MAX_ENTRIES
+from app.rooms import MAX_ROOMS
+from app.sessions import MAX_GAMES
+
+# Values accepted for GAME_WORKER_MODE
+WORKER_MODES = ('sync', 'gevent')
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def parse_range(value):
+    """Parse '<low>-<high>' (e.g. '1-1000') into (low, high)."""
+    low, _, high = value.partition('-')
+    low, high = int(low), int(high)
+    if low > high:
+        raise ValueError('Game range must be <low>-<high> with low <= high')
+    return low, high
+
+
+class Config:
+    """Settings for create_app, defaulting to the GAME_* environment variables.
+
+    Keyword arguments override single settings, e.g.
+    ``create_app(Config(game_storage_url='sqlite:///game.db'))``; a plain
+    dict passed to create_app is applied on top of the defaults the same way.
+    """
+
+    def __init__(self, **settings):
+        self.SECRET_KEY = os.environ.get('SECRET_KEY', 'supersecretkey')
+        # Lets browsers cache files linked under /static/ between page loads
+        self.SEND_FILE_MAX_AGE_DEFAULT = 12 * 60 * 60
+        # Serve static files fingerprinted and precompressed under /assets/,
+        # cached by browsers for a year
+        self.GAME_ASSETS = env_flag('GAME_ASSETS', True)
+        # e.g. sqlite:////var/lib/guess/game.db to share state between workers
+        self.GAME_STORAGE_URL = os.environ.get('GAME_STORAGE_URL', 'memory://')
+        # Directory of the write-ahead event log and snapshots that let a
+        # restarted worker recover its games and in-memory players
+        self.GAME_JOURNAL = os.environ.get('GAME_JOURNAL', '')
+        # Keep compacted log segments for app.analytics instead of deleting them
+        self.GAME_JOURNAL_ARCHIVE = env_flag('GAME_JOURNAL_ARCHIVE')
+        # Range of the default difficulty as (low, high); None keeps 1-100
+        self.GAME_RANGE = parse_range(os.environ['GAME_RANGE']) if os.environ.get('GAME_RANGE') else None
+        # Live games, open rooms and cached responses kept per process
+        self.GAME_MAX_GAMES = int(os.environ.get('GAME_MAX_GAMES', MAX_GAMES))
+        self.GAME_MAX_ROOMS = int(os.environ.get('GAME_MAX_ROOMS', MAX_ROOMS))
+        self.GAME_CACHE_SIZE = int(os.environ.get('GAME_CACHE_SIZE', MAX_ENTRIES))
+        # 'gevent' checks that the worker patched the standard library
+        # before the app was created
+        self.GAME_WORKER_MODE = os.environ.get('GAME_WORKER_MODE', 'sync')
+        # Compile templates and build the par table before the first request;
+        # turn off for the fastest worker boot
+        self.GAME_PRELOAD = env_flag('GAME_PRELOAD', True)
+        # Serve the URLs of the old single-file server.py
+        self.GAME_LEGACY_ROUTES = env_flag('GAME_LEGACY_ROUTES', True)
+        # Show the remaining interval and the optimal next guess while playing
+        self.GAME_HINTS = env_flag('GAME_HINTS')
+        # Per-route latency, game counters and a sampling profiler under /metrics
+        self.GAME_METRICS = env_flag('GAME_METRICS')
+        # Bearer token for operator endpoints such as /metrics/profiler;
+        # unset leaves them switched off
+        self.GAME_ADMIN_TOKEN = os.environ.get('GAME_ADMIN_TOKEN', '')
+        # Serve /api/tokens, where game state travels in signed tokens instead
+        # of living in this process
+        self.GAME_STATELESS = env_flag('GAME_STATELESS')
+        # Token bucket per client for guesses, as '<per second>/<burst>' (e.g. 5/30)
+        self.GAME_RATE_LIMIT = os.environ.get('GAME_RATE_LIMIT', '')
+        for name, value in settings.items():
+            setattr(self, name.upper(), value)
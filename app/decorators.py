@@ -1,7 +1,10 @@
+from functools import wraps
+
 def guess_decorator(function):
+    @wraps(function)
     def wrapper(*args, **kwargs):
         result = function(*args, **kwargs)
         if isinstance(result, str):
             return f"<h2 style='color:yellow'>{result}</h2>"
         return result
-    return wrapper 
\ No newline at end of file
+    return wrapper
\ No newline at end of file
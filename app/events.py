@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import deque
+
+# Score changes remembered for subscribers that fall behind or reconnect
+HISTORY = 4096
+
+# After waking up, a subscriber waits this long to fold a burst of changes
+# into a single message
+COALESCE_INTERVAL = 0.2
+
+
+class ScoreFeed:
+    """Leaderboard changes fanned out from one publisher to many subscribers.
+
+    Publishing appends to a shared, sequence-numbered log and wakes every
+    waiting subscriber, so its cost does not grow with the audience. Each
+    subscriber reads the log from its own position and keeps only the
+    latest change per player.
+    """
+
+    def __init__(self, history=HISTORY):
+        self._changed = threading.Condition()
+        self._log = deque(maxlen=history)
+        self.sequence = 0
+
+    def publish(self, name, change):
+        with self._changed:
+            self.sequence += 1
+            self._log.append((self.sequence, name, change))
+            self._changed.notify_all()
+
+    def changes_since(self, sequence):
+        """Return (latest sequence, {name: change}) after ``sequence``.
+
+        The changes are None when ``sequence`` is older than the history
+        kept, meaning the caller has to reload the full table.
+        """
+        with self._changed:
+            if self._log and sequence < self._log[0][0] - 1:
+                return self.sequence, None
+            changes = {}
+            for number, name, change in reversed(self._log):
+                if number <= sequence:
+                    break
+                changes.setdefault(name, change)
+            return self.sequence, changes
+
+    def wait(self, sequence, timeout=None, coalesce=COALESCE_INTERVAL):
+        with self._changed:
+            if not self._changed.wait_for(lambda: self.sequence > sequence, timeout):
+                return sequence, {}
+        if coalesce:
+            time.sleep(coalesce)
+        return self.changes_since(sequence)
@@ -1,53 +1,295 @@
-import random
+import time
+import uuid
+from contextlib import nullcontext
 
-# In-memory player storage for CRUD
-players = {}
+from app.cache import ResponseCache
+from app.events import ScoreFeed
+from app.locks import LockStripes
+from app.metrics import counters
+from app.rooms import RoomRegistry
+from app.sessions import GameRegistry
+from app.storage import MemoryStorage
+from app.targets import DIFFICULTIES, DEFAULT_DIFFICULTY, DEFAULT_RANGE, new_target
 
-# Track scores: {player_name: score}
-scores = {}
+# Player and score storage; replaced by create_app when a shared
+# backend is configured
+storage = MemoryStorage()
 
-# Game state
-number_to_be_guessed = random.randint(1, 100)
+# Game state: one GameSession per game id
+games = GameRegistry()
 
-def reset_game():
-    global number_to_be_guessed
-    number_to_be_guessed = random.randint(1, 100)
-    return number_to_be_guessed
+# Multiplayer rooms: one shared target raced by their members
+rooms = RoomRegistry()
 
-def get_number():
-    return number_to_be_guessed
+# Serializes guesses within a game without a lock object per game
+game_locks = LockStripes()
+
+# Live leaderboard changes for /scores/stream
+feed = ScoreFeed()
+
+# Serialized read responses; every write below invalidates what it touches
+response_cache = ResponseCache()
+
+# Write-ahead event log (app.journal.EventLog) when GAME_JOURNAL is set
+journal = None
+
+# Held around a storage write and its log entry, so the log records writes
+# to the same player in the order they were applied
+journal_locks = LockStripes()
+
+TOO_LOW = "Too low! Guess again!"
+TOO_HIGH = "Too High! Guess again!"
+OUT_OF_GUESSES = "No guesses left! Play again for a new number."
+GAME_FINISHED = "You already guessed it! Play again for a new number."
+ROOM_FINISHED = "Someone else guessed it first!"
+CORRECT = "You guessed it right!"
+
+def log_event(*event):
+    if journal is not None:
+        journal.append(event)
+
+def logging_writes():
+    # Storage writes only need logging while the storage is process-local
+    return journal is not None and not storage.shared
+
+def log_write(*event):
+    if logging_writes():
+        journal.append(event)
+
+def logged_write(*names):
+    if not logging_writes():
+        return nullcontext()
+    if not names:
+        return journal_locks.all()
+    return journal_locks.many(*names)
+
+def create_game(target, game_id=None, player=None, low=1, high=100):
+    # Registered and logged under the game's lock, so a snapshot never
+    # holds a game whose new_game event is not in the log yet
+    game_id = game_id or uuid.uuid4().hex
+    with game_locks(game_id):
+        game = games.create(target, game_id, player, low, high)
+        log_event('new_game', game.id, game.target, game.player, *game.range)
+    return game
+
+def new_game(player_name=None, difficulty=DEFAULT_DIFFICULTY, seed=None):
+    # Raises KeyError for an unknown difficulty
+    low, high = DIFFICULTIES[difficulty]
+    counters.add('games')
+    if player_name:
+        # Guesses are pending per player, so an abandoned game's would
+        # count towards this one's score
+        clear_guesses(player_name)
+    return create_game(new_target(low, high, seed), player=player_name, low=low, high=high).id
+
+def get_game(game_id):
+    return games.get(game_id)
+
+def ensure_game(game_id):
+    game = games.get(game_id) if game_id else None
+    if game is None:
+        low, high = DIFFICULTIES[DEFAULT_DIFFICULTY]
+        counters.add('games')
+        game = create_game(new_target(low, high), game_id=game_id, low=low, high=high)
+    return game
+
+def reset_game(game_id):
+    game = ensure_game(game_id)
+    with game_locks(game.id):
+        game.reset(new_target(*game.range))
+        log_event('reset_game', game.id, game.target)
+        if game.player:
+            clear_guesses(game.player)
+        return game.target
+
+def get_number(game_id):
+    game = games.get(game_id)
+    return game.target if game else None
+
+def set_storage(backend):
+    global storage
+    storage = backend
+    # Writes from other workers would not invalidate this process's cache
+    response_cache.enabled = not backend.shared
+    response_cache.clear()
+
+def configure(game_range=None, max_games=None, max_rooms=None, cache_size=None):
+    # Applies create_app's settings to the process-wide state above
+    DIFFICULTIES[DEFAULT_DIFFICULTY] = tuple(game_range) if game_range else DEFAULT_RANGE
+    if max_games is not None:
+        games.max_games = max_games
+    if max_rooms is not None:
+        rooms.max_rooms = max_rooms
+    if cache_size is not None:
+        response_cache.max_entries = cache_size
 
 def add_player(player_name):
-    if player_name not in players:
-        players[player_name] = {'guesses': []}
+    with logged_write(player_name):
+        storage.add_player(player_name)
+        log_write('add_player', player_name)
+    response_cache.invalidate([player_name])
+
+def player_exists(player_name):
+    return storage.has_player(player_name)
 
 def add_guess(player_name, guess):
-    if player_name in players:
-        players[player_name]['guesses'].append(guess)
+    with logged_write(player_name):
+        storage.add_guess(player_name, guess)
+        log_write('add_guess', player_name, guess)
+    response_cache.invalidate([player_name])
 
-def record_score(player_name):
-    if player_name in players:
-        # Always update with the latest game's guesses
-        scores[player_name] = len(players[player_name]['guesses'])
-        # Clear the guesses for the next game
-        players[player_name]['guesses'] = []
+def clear_guesses(player_name):
+    with logged_write(player_name):
+        storage.clear_guesses(player_name)
+        log_write('clear_guesses', player_name)
+    response_cache.invalidate([player_name])
+
+def publish_score(player_name):
+    score = storage.get_score(player_name)
+    if score is None:
+        feed.publish(player_name, {'name': player_name, 'deleted': True})
+    else:
+        feed.publish(player_name, {'name': player_name, 'score': score, 'rank': storage.get_rank(player_name)})
+
+def record_score(player_name, expected_guesses=None, score=None, keep_guesses=False):
+    # Games pass their own guess count as ``score``: the player's pending
+    # guesses are shared by every game they have open
+    with logged_write(player_name):
+        score = storage.record_score(player_name, expected_guesses, score, keep_guesses)
+        if score is not None:
+            log_write('record_score', player_name, expected_guesses, score, keep_guesses)
+    if score is not None:
+        response_cache.invalidate([player_name], scores=True)
+        publish_score(player_name)
+    return score
 
 def delete_player(player_name):
-    if player_name in players:
-        del players[player_name]
-    if player_name in scores:
-        del scores[player_name]
+    with logged_write(player_name):
+        deleted = storage.delete_player(player_name)
+        if deleted:
+            log_write('delete_player', player_name)
+    if deleted:
+        response_cache.invalidate([player_name], scores=True)
+        publish_score(player_name)
+    return deleted
+
+def rename_player(old_name, new_name):
+    with logged_write(old_name, new_name):
+        renamed = storage.rename_player(old_name, new_name)
+        if renamed:
+            log_write('rename_player', old_name, new_name)
+    if renamed:
+        response_cache.invalidate([old_name, new_name], scores=True)
+        publish_score(old_name)
+        publish_score(new_name)
+    return renamed
 
 def get_players():
-    return players
+    return storage.get_players()
+
+def search_players(limit, prefix=None, query=None, after=None):
+    return storage.search_players(limit, prefix, query, after)
 
 def get_scores():
-    return scores
+    return storage.get_scores()
+
+def get_player(player_name):
+    guesses = storage.get_guesses(player_name)
+    if guesses is None:
+        return None
+    return {'guesses': guesses, 'score': storage.get_score(player_name)}
+
+def iter_players():
+    return storage.iter_players()
+
+def bulk_import(records):
+    with logged_write():
+        created, updated = storage.bulk_import(records)
+        log_write('bulk_import', records)
+    response_cache.invalidate([record['name'] for record in records], scores=True)
+    for record in records:
+        if record.get('score') is not None:
+            publish_score(record['name'])
+    return created, updated
+
+def get_leaderboard(limit, after=None, offset=0):
+    return storage.get_leaderboard(limit, after, offset)
+
+def get_score(player_name):
+    return storage.get_score(player_name)
+
+def get_rank(player_name):
+    return storage.get_rank(player_name)
+
+def count_players():
+    return storage.count_players()
 
-def check_guess(number):
-    if number < number_to_be_guessed:
-        return "Too low! Guess again!"
-    elif number > number_to_be_guessed:
-        return "Too High! Guess again!"
+def count_scores():
+    return storage.count_scores()
+
+def get_stats(player_name):
+    return storage.get_stats(player_name)
+
+def evaluate_guess(game, number):
+    with game_locks(game.id):
+        difference = game.guess(number)
+        # Timestamped for the timing checks in app.analytics
+        log_event('guess', game.id, number, round(time.time(), 3))
+    counters.add('guesses')
+    if difference < 0:
+        return TOO_LOW
+    elif difference > 0:
+        return TOO_HIGH
     else:
-        return "<h2 style='color:green'>You guessed it right!</h2><img style='width:300px' src='https://media.giphy.com/media/4T7e4DmcrP9du/giphy.gif'>" 
\ No newline at end of file
+        counters.add('wins')
+        return CORRECT
+
+def check_guess(number, game_id):
+    return evaluate_guess(ensure_game(game_id), number)
+
+def create_room(difficulty=DEFAULT_DIFFICULTY, seed=None):
+    # Raises KeyError for an unknown difficulty
+    low, high = DIFFICULTIES[difficulty]
+    counters.add('games')
+    return rooms.create(new_target(low, high, seed), low, high)
+
+def get_room(room_id):
+    return rooms.get(room_id)
+
+def join_room(room_id, player_name):
+    room = rooms.join(room_id, player_name)
+    if room is not None:
+        add_player(player_name)
+        room.feed.publish(player_name, {'player': player_name, 'joined': True})
+    return room
+
+def leave_room(room_id, player_name):
+    room = rooms.leave(room_id, player_name)
+    if room is not None and not room.closed:
+        room.feed.publish(player_name, {'player': player_name, 'left': True})
+    return room is not None
+
+def room_guess(room, player_name, number):
+    """Play ``number`` for a member and broadcast the result to the room.
+
+    Returns TOO_LOW, TOO_HIGH or CORRECT, OUT_OF_GUESSES or ROOM_FINISHED
+    when the guess is refused, or None if the player is not a member.
+    """
+    with room.lock:
+        if player_name not in room.members:
+            return None
+        if room.finished:
+            return ROOM_FINISHED
+        if room.guesses_left(player_name) <= 0:
+            return OUT_OF_GUESSES
+        difference = room.guess(player_name, number)
+        count = room.members[player_name]
+    counters.add('guesses')
+    result = 'low' if difference < 0 else 'high' if difference > 0 else 'correct'
+    if not difference:
+        counters.add('wins')
+        # The room counts its members' guesses; their solo games' pending
+        # guesses are left alone
+        record_score(player_name, score=count, keep_guesses=True)
+    room.feed.publish(player_name, {'player': player_name, 'guess': number, 'result': result, 'guesses': count})
+    return TOO_LOW if difference < 0 else TOO_HIGH if difference > 0 else CORRECT
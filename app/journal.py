@@ -0,0 +1,305 @@
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+
+from app import game
+
+# Events written between two snapshots; the log tail replayed at startup
+# never grows beyond this
+SNAPSHOT_EVERY = 100000
+
+# Seconds the writer waits after the first event of a batch so that more
+# can share its fsync; 0 still batches whatever arrives during one fsync
+COMMIT_DELAY = 0
+
+# Seconds a new process waits for the directory lock, covering a recycled
+# worker whose predecessor is still shutting down (gunicorn's default
+# graceful timeout)
+LOCK_TIMEOUT = 30
+
+# Logged storage writes, replayed by calling the storage method of that name
+STORAGE_OPS = frozenset(('add_player', 'add_guess', 'clear_guesses', 'record_score', 'delete_player',
+                         'rename_player', 'bulk_import'))
+
+SNAPSHOT = 'snapshot.json'
+ARCHIVE = 'archive'
+SEGMENT = 'journal-%012d.log'
+
+
+def fsync(fd):
+    """os.fsync, run on a real thread when gevent has patched the process.
+
+    Under gevent the writer thread is a greenlet, and a plain fsync would
+    block the hub and every request on it until the disk answers.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        from gevent import get_hub
+        get_hub().threadpool.apply(os.fsync, (fd,))
+    else:
+        os.fsync(fd)
+
+
+def segments(directory):
+    """Log segments in ``directory``, oldest first."""
+    names = [name for name in os.listdir(directory) if name.startswith('journal-') and name.endswith('.log')]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+class EventLog:
+    """Write-ahead log of state changes, with snapshots, in one directory.
+
+    Events are appended as JSON lines ``[sequence, op, *args]`` to the
+    current segment by a single writer thread. The thread writes and fsyncs
+    every event queued since its last write at once (group commit), and
+    callers wait only until their own sequence number is durable.
+
+    Every ``snapshot_every`` events the writer captures the full state,
+    writes it atomically to snapshot.json together with the sequence it
+    covers, starts a new segment and deletes the old ones. Recovery loads
+    the snapshot and replays only the segments written after it, ignoring
+    a torn last line.
+
+    With ``archive`` covered segments are moved to the archive/
+    subdirectory instead of being deleted, keeping the full history for
+    app.analytics.
+
+    The directory is locked with flock, so only one process can own it;
+    another waits up to ``lock_timeout`` seconds for it, then fails.
+    """
+
+    def __init__(self, directory, snapshot_every=SNAPSHOT_EVERY, commit_delay=COMMIT_DELAY, archive=False,
+                 lock_timeout=LOCK_TIMEOUT):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.archive = os.path.join(directory, ARCHIVE) if archive else None
+        self.snapshot_every = snapshot_every
+        self.commit_delay = commit_delay
+        self._lock_file = self._acquire(os.path.join(directory, 'LOCK'), lock_timeout)
+        self._changed = threading.Condition()
+        self._pending = []
+        self._local = threading.local()
+        self.sequence = 0
+        self.synced = 0
+        self.closed = False
+        self._capture = None
+        self._segment = None
+        self._since_snapshot = 0
+        self._thread = None
+
+    @staticmethod
+    def _acquire(path, timeout):
+        # Opened for appending so a waiting process keeps the holder's pid
+        lock_file = open(path, 'a+')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    lock_file.seek(0)
+                    holder = lock_file.read().strip() or 'unknown'
+                    lock_file.close()
+                    raise RuntimeError(
+                        f'Event log {os.path.dirname(path)} is in use by process {holder}. GAME_JOURNAL needs '
+                        'a directory per process: serve it from a single worker (gunicorn -w 1)') from None
+                time.sleep(0.1)
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        return lock_file
+
+    def _segments(self):
+        return segments(self.directory)
+
+    def recover(self):
+        """Return (state, events): the latest snapshot and the events after it."""
+        state, covered = None, 0
+        path = os.path.join(self.directory, SNAPSHOT)
+        if os.path.exists(path):
+            with open(path) as f:
+                snapshot = json.load(f)
+            state, covered = snapshot['state'], snapshot['sequence']
+        events = []
+        last = covered
+        for segment in self._segments():
+            with open(segment) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break  # Torn write at the moment of a crash
+                    if event[0] > covered:
+                        events.append(event[1:])
+                        last = event[0]
+        self.sequence = self.synced = last
+        return state, events
+
+    def start(self, capture, compact=False):
+        """Start writing; ``capture()`` returns (sequence, state) for snapshots.
+
+        With ``compact`` a snapshot is written first, so the recovered tail
+        does not have to be replayed again next time.
+        """
+        self._capture = capture
+        if compact:
+            self.snapshot()
+        else:
+            self._open_segment()
+        self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+        self._thread.start()
+
+    def _open_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+        # Named after the first event it will hold
+        self._segment = open(os.path.join(self.directory, SEGMENT % (self.synced + 1)), 'a')
+
+    def append(self, event):
+        with self._changed:
+            self.sequence += 1
+            self._pending.append(json.dumps([self.sequence, *event], separators=(',', ':')) + '\n')
+            self._changed.notify_all()
+            self._local.last = self.sequence
+            return self.sequence
+
+    def wait(self, sequence, timeout=None):
+        """Block until ``sequence`` is durable."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.synced >= sequence or self.closed, timeout)
+
+    def commit(self):
+        """Wait for the events this thread appended since its last commit."""
+        sequence = getattr(self._local, 'last', 0)
+        if sequence:
+            self.wait(sequence)
+            self._local.last = 0
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._pending or self.closed)
+                if self.closed and not self._pending:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._changed:
+                lines, self._pending = self._pending, []
+                last = self.sequence
+            self._segment.write(''.join(lines))
+            self._segment.flush()
+            fsync(self._segment.fileno())
+            with self._changed:
+                self.synced = last
+                self._changed.notify_all()
+            self._since_snapshot += len(lines)
+            if self._since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def snapshot(self):
+        """Write the current state and drop the segments it covers.
+
+        Only called from the writer thread, or by start() before it runs.
+        """
+        sequence, state = self._capture()
+        path = os.path.join(self.directory, SNAPSHOT)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'sequence': sequence, 'state': state}, f, separators=(',', ':'))
+            f.flush()
+            fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            fsync(directory)
+        finally:
+            os.close(directory)
+        # Everything written so far is covered by the snapshot; events still
+        # queued go to a fresh segment
+        old = self._segments()
+        self._open_segment()
+        if self.archive:
+            os.makedirs(self.archive, exist_ok=True)
+        for segment in old:
+            if segment == self._segment.name:
+                continue
+            if self.archive:
+                os.replace(segment, os.path.join(self.archive, os.path.basename(segment)))
+            else:
+                os.remove(segment)
+        self._since_snapshot = 0
+
+    def close(self):
+        with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._segment is not None:
+            self._segment.close()
+        self._lock_file.close()
+
+
+def capture(log):
+    # Holding every write lock means each logged event is fully applied and
+    # no applied change is missing from the log
+    with game.game_locks.all(), game.journal_locks.all():
+        sequence = log.sequence
+        state = {'games': [[g.id, g.target, g.player, g.range[0], g.range[1], list(g.guesses)]
+                           for g in game.games.values()]}
+        if not game.storage.shared:
+            state['storage'] = game.storage.dump()
+    return sequence, state
+
+
+def restore(state):
+    if state.get('storage') is not None and not game.storage.shared:
+        game.storage.load(state['storage'])
+    for game_id, target, player, low, high, guesses in state['games']:
+        session = game.games.create(target, game_id, player, low, high)
+        for number in guesses:
+            session.guess(number)
+
+
+def apply(event):
+    """Replay one logged event against the storage and the game registry."""
+    op, *args = event
+    storage = game.storage
+    if op == 'new_game':
+        game_id, target, player, low, high = args
+        game.games.create(target, game_id, player, low, high)
+    elif op in ('guess', 'reset_game'):
+        session = game.games.get(args[0])
+        if session is not None:
+            if op == 'guess':
+                session.guess(args[1])
+            else:
+                session.reset(args[1])
+    elif op in STORAGE_OPS:
+        if not storage.shared:
+            getattr(storage, op)(*args)
+    else:
+        raise ValueError(f'Unknown event {op!r} in the event log')
+
+
+def init_app(app, directory, archive=False):
+    """Recover state from ``directory`` and log every change made from now on."""
+    log = EventLog(directory, archive=archive)
+    state, events = log.recover()
+    if state is not None:
+        restore(state)
+    for event in events:
+        apply(event)
+    game.journal = log
+    log.start(lambda: capture(log), compact=bool(events))
+
+    @app.after_request
+    def commit(response):
+        # Group commit: the response waits for its own writes to be durable
+        log.commit()
+        return response
+
+    app.extensions['game_journal'] = log
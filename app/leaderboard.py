@@ -0,0 +1,201 @@
+import base64
+import bisect
+import json
+
+# Keys per SortedKeys block; a block is split once it holds twice as many
+BLOCK_LOAD = 512
+
+
+class SortedKeys:
+    """A sorted list of keys kept in blocks, with positions by Fenwick tree.
+
+    Adding or removing a key binary-searches the block maxima, then shifts
+    at most ``2 * load`` keys inside one block, so an update costs
+    O(log n + load) instead of moving the tail of one flat list. Block
+    sizes are summed in a Fenwick tree, so positions (ranks, offsets) are
+    O(log n) too; it is rebuilt, lazily, only when blocks split or empty.
+    """
+
+    def __init__(self, load=BLOCK_LOAD):
+        self.load = load
+        self._blocks = []
+        self._maxes = []
+        self._tree = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._tree = None
+        else:
+            i = bisect.bisect_left(self._maxes, key)
+            if i == len(self._maxes):
+                i -= 1
+                self._blocks[i].append(key)
+                self._maxes[i] = key
+            else:
+                bisect.insort(self._blocks[i], key)
+            block = self._blocks[i]
+            if len(block) > 2 * self.load:
+                self._blocks.insert(i + 1, block[self.load:])
+                del block[self.load:]
+                self._maxes.insert(i, block[-1])
+                self._tree = None
+            elif self._tree is not None:
+                self._tree_add(i, 1)
+        self._size += 1
+
+    def remove(self, key):
+        """Remove ``key``, which must be present."""
+        i = bisect.bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect.bisect_left(block, key)]
+        if block:
+            self._maxes[i] = block[-1]
+            if self._tree is not None:
+                self._tree_add(i, -1)
+        else:
+            del self._blocks[i], self._maxes[i]
+            self._tree = None
+        self._size -= 1
+
+    def clear(self):
+        self._blocks.clear()
+        self._maxes.clear()
+        self._tree = None
+        self._size = 0
+
+    def bisect_left(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return self._size
+        return self._before(i) + bisect.bisect_left(self._blocks[i], key)
+
+    def bisect_right(self, key):
+        i = bisect.bisect_right(self._maxes, key)
+        if i == len(self._maxes):
+            return self._size
+        return self._before(i) + bisect.bisect_right(self._blocks[i], key)
+
+    def slice(self, start, stop):
+        """Keys at positions ``start`` up to (not including) ``stop``."""
+        stop = min(stop, self._size)
+        if start >= stop:
+            return []
+        i, offset = self._locate(start)
+        keys = []
+        while len(keys) < stop - start:
+            keys.extend(self._blocks[i][offset:offset + stop - start - len(keys)])
+            i, offset = i + 1, 0
+        return keys
+
+    def _fenwick(self):
+        if self._tree is None:
+            tree = [0] + [len(block) for block in self._blocks]
+            for i in range(1, len(tree)):
+                parent = i + (i & -i)
+                if parent < len(tree):
+                    tree[parent] += tree[i]
+            self._tree = tree
+        return self._tree
+
+    def _tree_add(self, i, delta):
+        tree = self._tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _before(self, i):
+        # Keys in the blocks before block i
+        tree = self._fenwick()
+        total = 0
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position):
+        # (block, offset within it) of the key at ``position``
+        tree = self._fenwick()
+        i = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            if i + step < len(tree) and tree[i + step] <= position:
+                i += step
+                position -= tree[i]
+            step >>= 1
+        return i, position
+
+
+class Leaderboard:
+    """Scores ranked by (score, name), fewest guesses first.
+
+    Keeps the keys in a SortedKeys next to a name -> score dict, so score
+    changes, rank lookups and pages are all logarithmic in the number of
+    players instead of a sort per request.
+    """
+
+    def __init__(self):
+        self._keys = SortedKeys()
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, name, score):
+        old = self._scores.get(name)
+        if old is not None:
+            self._keys.remove((old, name))
+        self._scores[name] = score
+        self._keys.add((score, name))
+
+    def remove(self, name):
+        old = self._scores.pop(name, None)
+        if old is not None:
+            self._keys.remove((old, name))
+
+    def clear(self):
+        self._keys.clear()
+        self._scores.clear()
+
+    def rank(self, name):
+        """1-based position of the player, or None if they have no score."""
+        score = self._scores.get(name)
+        if score is None:
+            return None
+        return self._keys.bisect_left((score, name)) + 1
+
+    def count_before(self, score, name):
+        """Number of scores ranked ahead of the (score, name) key."""
+        return self._keys.bisect_left((score, name))
+
+    def top(self, limit, after=None, offset=0):
+        """Return up to ``limit`` (name, score) pairs.
+
+        ``after`` is the (score, name) key of the last row of the previous
+        page; ``offset`` skips that many rows from the top instead.
+        """
+        start = self._keys.bisect_right(tuple(after)) if after else offset
+        return [(name, score) for score, name in self._keys.slice(start, start + limit)]
+
+
+def encode_cursor(name, score):
+    raw = json.dumps([score, name], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, name = json.loads(raw.decode('utf-8'))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(score, int) or not isinstance(name, str):
+        raise ValueError('Invalid cursor')
+    return score, name
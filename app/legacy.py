@@ -0,0 +1,20 @@
+from flask import Blueprint, session, redirect, url_for
+from app.decorators import guess_decorator
+from app.routes import invite_page, submit_guess
+
+# URLs of the original single-file server.py that the main blueprint does
+# not already serve, played through the same game engine
+legacy_bp = Blueprint('legacy', __name__)
+
+@legacy_bp.route('/', methods=['POST'])
+def register():
+    # server.py took the player's name on the landing page
+    return invite_page()
+
+@legacy_bp.route('/guess/<int:number>')
+@guess_decorator
+def play(number):
+    player_name = session.get('player_name')
+    if not player_name:
+        return redirect(url_for('main.invite_page'))
+    return submit_guess(player_name, number)
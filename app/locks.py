@@ -0,0 +1,44 @@
+import threading
+import zlib
+
+# Number of locks shared by all keys; collisions only cost some contention
+STRIPES = 64
+
+
+class LockStripes:
+    """A fixed set of locks picked by key, so unrelated keys rarely contend.
+
+    Memory stays constant however many players or games exist, and code
+    that needs several keys at once takes their stripes in index order to
+    avoid deadlocks.
+    """
+
+    def __init__(self, stripes=STRIPES):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def index(self, key):
+        # crc32 rather than hash() so the stripe is stable across processes
+        return zlib.crc32(key.encode('utf-8')) % len(self._locks)
+
+    def __call__(self, key):
+        return self._locks[self.index(key)]
+
+    def many(self, *keys):
+        return _Ordered([self._locks[i] for i in sorted({self.index(key) for key in keys})])
+
+    def all(self):
+        return _Ordered(self._locks)
+
+
+class _Ordered:
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.release()
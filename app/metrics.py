@@ -0,0 +1,251 @@
+import bisect
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from flask import Blueprint, Response, current_app, g, jsonify, request
+
+from app.admin import admin_required
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Slow-request profiles kept for GET /metrics/profiler
+PROFILE_HISTORY = 20
+
+# Seconds between checks while the profiler's sampling thread is idle
+IDLE_INTERVAL = 0.5
+
+
+class Counters:
+    """Monotonic event counters shared by all threads."""
+
+    def __init__(self, *names):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(names, 0)
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self._values, 0)
+
+
+# Game events, counted whether or not metrics are exported
+counters = Counters('games', 'guesses', 'wins')
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+
+
+class RequestMetrics:
+    """Per-endpoint latency histograms in Prometheus layout."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, endpoint, seconds):
+        with self._lock:
+            histogram = self.histograms.get(endpoint)
+            if histogram is None:
+                histogram = self.histograms[endpoint] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def render(self):
+        lines = ['# HELP guess_request_duration_seconds Request latency by endpoint.',
+                 '# TYPE guess_request_duration_seconds histogram']
+        with self._lock:
+            for endpoint, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'guess_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'guess_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram.total}')
+                lines.append(f'guess_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+        return lines
+
+
+class SamplingProfiler:
+    """Samples the stacks of in-flight requests while enabled.
+
+    A background thread records the stack of every request in flight each
+    ``interval`` seconds; when a request turns out slower than
+    ``threshold`` its samples are folded into the hottest stacks and kept
+    for inspection. Threads are sampled from ``sys._current_frames()``.
+    Under gevent requests are greenlets sharing one OS thread: a
+    switched-out greenlet is sampled from its ``gr_frame`` and the running
+    one from its thread's frame, and the sampler runs on a real OS thread
+    so it also catches requests that never yield to the hub.
+    """
+
+    def __init__(self, interval=0.005, threshold=0.2):
+        self.interval = interval
+        self.threshold = threshold
+        self.enabled = False
+        self.slow_requests = deque(maxlen=PROFILE_HISTORY)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, interval=None, threshold=None):
+        if interval is not None:
+            self.interval = interval
+        if threshold is not None:
+            self.threshold = threshold
+        with self._lock:
+            self.enabled = True
+            # Started once and left idling while disabled
+            if self._thread is None:
+                if _gevent_patched():
+                    from gevent.monkey import get_original
+                    self._thread = get_original('_thread', 'start_new_thread')(
+                        self._run, (get_original('time', 'sleep'),))
+                else:
+                    self._thread = threading.Thread(target=self._run, args=(time.sleep,),
+                                                    name='request-profiler', daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        self.enabled = False
+
+    def _run(self, sleep):
+        # No lock here: under gevent it would be a greenlet lock, and
+        # copying the dict is atomic anyway
+        while True:
+            if self.enabled:
+                frames = sys._current_frames()
+                for thread_id, task, samples in list(self._active.values()):
+                    # A switched-out greenlet keeps its frame; the running
+                    # one is its thread's current frame
+                    frame = task.gr_frame if task is not None else None
+                    if frame is None:
+                        frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples.append(_stack(frame))
+            sleep(self.interval if self.enabled else IDLE_INTERVAL)
+
+    def begin(self):
+        if self.enabled:
+            key, thread_id, task = _current_request()
+            with self._lock:
+                self._active[key] = (thread_id, task, [])
+
+    def end(self, description, seconds):
+        with self._lock:
+            entry = self._active.pop(_current_request()[0], None)
+        if entry is None or seconds < self.threshold:
+            return None
+        samples = entry[2]
+        hot = Counter(samples).most_common(5)
+        profile = {
+            'request': description,
+            'seconds': seconds,
+            'samples': len(samples),
+            'hot_stacks': [{'samples': count, 'stack': list(stack)} for stack, count in hot],
+        }
+        self.slow_requests.append(profile)
+        return profile
+
+
+def _gevent_patched():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def _current_request():
+    """Key, OS thread id and greenlet (None outside gevent) of this request."""
+    if _gevent_patched():
+        from gevent.monkey import get_original
+        from greenlet import getcurrent
+        task = getcurrent()
+        return task, get_original('_thread', 'get_ident')(), task
+    ident = threading.get_ident()
+    return ident, ident, None
+
+
+def _stack(frame, depth=12):
+    stack = []
+    while frame is not None and len(stack) < depth:
+        code = frame.f_code
+        stack.append(f'{code.co_filename}:{frame.f_lineno} {code.co_name}')
+        frame = frame.f_back
+    return tuple(stack)
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def export_metrics():
+    from app import game
+    lines = current_app.extensions['guess_metrics'].render()
+    for name, value in sorted(counters.snapshot().items()):
+        lines += [f'# TYPE guess_{name}_total counter', f'guess_{name}_total {value}']
+    for name, value in (('active_games', len(game.games)),
+                        ('active_rooms', len(game.rooms)),
+                        ('players', game.count_players()),
+                        ('scores', game.count_scores())):
+        lines += [f'# TYPE guess_{name} gauge', f'guess_{name} {value}']
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+@metrics_bp.route('/metrics/profiler', methods=['GET', 'POST'])
+@admin_required
+def profiler_control():
+    # POST {"enabled": true, "threshold_ms": 100, "interval_ms": 5} toggles sampling
+    profiler = current_app.extensions['guess_profiler']
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('enabled'):
+            threshold = data.get('threshold_ms')
+            interval = data.get('interval_ms')
+            profiler.start(interval / 1000 if interval else None, threshold / 1000 if threshold else None)
+        else:
+            profiler.stop()
+    return jsonify({
+        'enabled': profiler.enabled,
+        'threshold_ms': profiler.threshold * 1000,
+        'interval_ms': profiler.interval * 1000,
+        'slow_requests': list(profiler.slow_requests),
+    })
+
+
+def init_app(app):
+    """Time every request and expose /metrics and /metrics/profiler."""
+    request_metrics = app.extensions['guess_metrics'] = RequestMetrics()
+    profiler = app.extensions['guess_profiler'] = SamplingProfiler()
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        profiler.begin()
+
+    @app.teardown_request
+    def stop_timer(exc=None):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        request_metrics.observe(request.endpoint or 'unmatched', seconds)
+        profile = profiler.end(f'{request.method} {request.path}', seconds)
+        if profile:
+            app.logger.warning('Slow request %s took %.3fs; hottest stack: %s', profile['request'],
+                               seconds, profile['hot_stacks'][0]['stack'] if profile['hot_stacks'] else [])
+
+    app.register_blueprint(metrics_bp)
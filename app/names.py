@@ -0,0 +1,119 @@
+import base64
+import bisect
+import heapq
+
+# Length of the substrings indexed for ?q= search; shorter queries scan
+# the sorted names instead
+GRAM = 3
+
+
+def fold(name):
+    return name.lower()
+
+
+def grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class NameIndex:
+    """Player names for case-insensitive prefix and substring search.
+
+    Like Leaderboard, keeps a sorted list of (folded name, name) keys, so a
+    prefix is a binary search followed by a slice. Substrings of at least
+    GRAM characters are looked up in an index from every GRAM-character
+    substring to the names containing it; the rarest of the query's grams
+    gives the candidates, which are checked and sorted. Shorter queries walk
+    the sorted keys and stop once a page is full.
+
+    Pages are in key order and continue after the key of the last name
+    returned (see encode_cursor).
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._grams = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, name):
+        key = (fold(name), name)
+        position = bisect.bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return
+        self._keys.insert(position, key)
+        for gram in grams(key[0]):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def add_many(self, names):
+        # One sort instead of an insert per name, for imports and snapshots
+        keys = {(fold(name), name) for name in names}.difference(self._keys)
+        self._keys.extend(keys)
+        self._keys.sort()
+        for key in keys:
+            for gram in grams(key[0]):
+                self._grams.setdefault(gram, set()).add(key)
+
+    def remove(self, name):
+        key = (fold(name), name)
+        position = bisect.bisect_left(self._keys, key)
+        if position == len(self._keys) or self._keys[position] != key:
+            return
+        del self._keys[position]
+        for gram in grams(key[0]):
+            names = self._grams[gram]
+            names.discard(key)
+            if not names:
+                del self._grams[gram]
+
+    def rename(self, old_name, new_name):
+        self.remove(old_name)
+        self.add(new_name)
+
+    def clear(self):
+        self._keys.clear()
+        self._grams.clear()
+
+    def prefix(self, prefix, limit, after=None):
+        """Up to ``limit`` names starting with ``prefix``, after the ``after`` name."""
+        prefix = fold(prefix)
+        position = bisect.bisect_left(self._keys, (prefix, ''))
+        if after is not None:
+            position = max(position, bisect.bisect_right(self._keys, (fold(after), after)))
+        names = []
+        for key, name in self._keys[position:position + limit]:
+            if not key.startswith(prefix):
+                break
+            names.append(name)
+        return names
+
+    def search(self, query, limit, after=None):
+        """Up to ``limit`` names containing ``query``, after the ``after`` name."""
+        query = fold(query)
+        start = (fold(after), after) if after is not None else None
+        if len(query) < GRAM:
+            position = bisect.bisect_right(self._keys, start) if start else 0
+            names = []
+            for index in range(position, len(self._keys)):
+                key, name = self._keys[index]
+                if query in key:
+                    names.append(name)
+                    if len(names) == limit:
+                        break
+            return names
+        candidates = [self._grams.get(gram, ()) for gram in grams(query)]
+        matches = (key for key in min(candidates, key=len)
+                   if query in key[0] and (start is None or key > start))
+        return [name for _, name in heapq.nsmallest(limit, matches)]
+
+
+def encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed input."""
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, make_response, request
+
+# Default GAME_RATE_LIMIT: guesses per second, and how many can be made in
+# a burst. Binary search finishes the hardest range in 30 guesses.
+GUESS_RATE = 5.0
+GUESS_BURST = 30
+
+# Clients tracked per process; the least recently seen are forgotten first
+MAX_CLIENTS = 100000
+
+# Shared buckets are swept of idle clients once every this many requests
+SWEEP_INTERVAL = 1000
+
+# Clients behind one address (NAT, proxies) share its bucket, so a guess
+# charged to a game or room member costs the address only this fraction
+ADDRESS_SHARE = 10
+
+
+def parse_rate(value):
+    """Parse '<rate>/<burst>' (e.g. '5/30') into (rate, burst)."""
+    rate, _, burst = value.partition('/')
+    rate = float(rate)
+    burst = int(burst) if burst else max(1, int(rate))
+    if rate <= 0 or burst < 1:
+        raise ValueError('Rate limit must be a positive rate and burst')
+    return rate, burst
+
+
+class MemoryRateLimiter:
+    """Token buckets per client, kept in this process.
+
+    Each bucket stores its token count and when it was last refilled; the
+    refill is computed on demand, so a request costs one dict lookup and a
+    few arithmetic operations whatever the number of clients.
+    """
+
+    def __init__(self, rate=GUESS_RATE, burst=GUESS_BURST, max_clients=MAX_CLIENTS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, cost=1):
+        """Spend ``cost`` tokens from ``key``'s bucket.
+
+        Returns 0 when allowed, otherwise the seconds until it would be.
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+                # Forgotten clients come back with a full bucket, which is
+                # where an idle one would be anyway
+                if len(self._buckets) >= self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return (cost - tokens) / self.rate if cost <= self.burst else float('inf')
+            self._buckets[key] = (tokens - cost, now)
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+RATE_LIMIT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS rate_limits_updated ON rate_limits (updated);
+'''
+SELECT_BUCKET = 'SELECT tokens, updated FROM rate_limits WHERE key = ?'
+UPSERT_BUCKET = 'INSERT OR REPLACE INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)'
+DELETE_IDLE_BUCKETS = 'DELETE FROM rate_limits WHERE updated < ?'
+
+
+class SQLiteRateLimiter:
+    """Token buckets in an SQLite store, shared by every worker process.
+
+    Each request reads and writes one row by primary key inside a
+    ``BEGIN IMMEDIATE`` transaction. Buckets idle long enough to be full
+    again are deleted every ``SWEEP_INTERVAL`` requests.
+    """
+
+    def __init__(self, storage, rate=GUESS_RATE, burst=GUESS_BURST, clock=time.time):
+        self.storage = storage
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._requests = 0
+        self._lock = threading.Lock()
+        with storage.connection() as conn:
+            conn.executescript(RATE_LIMIT_SCHEMA)
+
+    def take(self, key, cost=1):
+        now = self.clock()
+        with self._lock:
+            self._requests += 1
+            sweep = self._requests % SWEEP_INTERVAL == 0
+        with self.storage.transaction() as conn:
+            if sweep:
+                conn.execute(DELETE_IDLE_BUCKETS, (now - self.burst / self.rate,))
+            row = conn.execute(SELECT_BUCKET, (key,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            if tokens < cost:
+                conn.execute(UPSERT_BUCKET, (key, tokens, now))
+                return (cost - tokens) / self.rate if cost <= self.burst else float('inf')
+            conn.execute(UPSERT_BUCKET, (key, tokens - cost, now))
+            return 0
+
+    def clear(self):
+        with self.storage.connection() as conn:
+            conn.execute('DELETE FROM rate_limits')
+
+
+def limit_guesses(cost=1, key=None):
+    """Return a 429 response if this client is over its guess rate, else None.
+
+    Guesses are charged to ``key`` (their game, or room and player) when
+    there is one, so players behind the same address do not share a
+    bucket, and to the client's address, at 1/ADDRESS_SHARE of the cost,
+    so starting a new game does not start a fresh allowance. Without a key
+    the address pays the full cost.
+    """
+    limiter = current_app.extensions.get('guess_limiter')
+    if limiter is None:
+        return None
+    if key is None:
+        wait = limiter.take(address_key(), cost)
+    else:
+        wait = limiter.take(address_key(), cost / ADDRESS_SHARE) or limiter.take(key, cost)
+    return too_many(wait, 'Too many guesses, slow down')
+
+
+def limit_games():
+    """Return a 429 response if this address starts games too fast, else None.
+
+    A new game costs the address as much as a full guess, so a client
+    cannot sidestep its game's bucket by starting game after game.
+    """
+    limiter = current_app.extensions.get('guess_limiter')
+    if limiter is None:
+        return None
+    return too_many(limiter.take(address_key()), 'Too many new games, slow down')
+
+
+def address_key():
+    return 'ip:' + (request.remote_addr or '')
+
+
+def too_many(wait, message):
+    if not wait:
+        return None
+    response = make_response(jsonify({'error': message}), 429)
+    if wait != float('inf'):
+        response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def init_app(app, storage):
+    """Rate-limit guesses per client, in the SQLite store (or shard) if there is one."""
+    from app.storage import SQLiteStorage
+    rate, burst = parse_rate(app.config['GAME_RATE_LIMIT'])
+    database = next((shard for shard in getattr(storage, 'shards', [storage]) if isinstance(shard, SQLiteStorage)),
+                    None)
+    if database is not None:
+        limiter = SQLiteRateLimiter(database, rate, burst)
+    else:
+        limiter = MemoryRateLimiter(rate, burst)
+    app.extensions['guess_limiter'] = limiter
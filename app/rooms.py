@@ -0,0 +1,152 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.events import ScoreFeed
+from app.sessions import IDLE_TIMEOUT, MAX_GUESSES
+
+# Upper bound on open rooms per process; the least recently active room is
+# closed when a new one would exceed it
+MAX_ROOMS = 10000
+
+# Room events kept for members that reconnect; one per member is enough
+# since changes are folded per player
+ROOM_HISTORY = 256
+
+
+class Room:
+    """One target raced by many players, with a feed of what they do.
+
+    ``members`` maps each player to the guesses they have made. The first
+    correct guess wins and finishes the room for everyone. ``lock`` guards
+    the members and the winner.
+    """
+
+    __slots__ = ('id', 'target', 'range', 'members', 'winner', 'feed', 'lock', 'closed',
+                 'created', 'last_seen')
+
+    def __init__(self, room_id, target, low=1, high=100):
+        self.id = room_id
+        self.target = target
+        self.range = (low, high)
+        self.members = {}
+        self.winner = None
+        self.feed = ScoreFeed(ROOM_HISTORY)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.created = self.last_seen = time.monotonic()
+
+    @property
+    def finished(self):
+        return self.winner is not None
+
+    def guesses_left(self, player):
+        return MAX_GUESSES - self.members[player]
+
+    def guess(self, player, number):
+        self.members[player] += 1
+        if number == self.target and self.winner is None:
+            self.winner = player
+        return number - self.target
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'low': self.range[0],
+            'high': self.range[1],
+            'members': dict(self.members),
+            'winner': self.winner,
+            'finished': self.finished,
+        }
+
+
+class RoomRegistry:
+    """Open rooms keyed by id, in least-recently-used order like GameRegistry.
+
+    Joining and leaving go through the registry lock so a room is closed
+    exactly when its last member leaves, and nobody joins a closed room.
+    Guesses only take the room's own lock (see app.game), so rooms never
+    contend with each other while playing.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_rooms=MAX_ROOMS, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.max_rooms = max_rooms
+        self.clock = clock
+        self._rooms = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def create(self, target, low=1, high=100):
+        room = Room(uuid.uuid4().hex, target, low, high)
+        with self._lock:
+            self.evict_expired()
+            room.created = room.last_seen = self.clock()
+            self._rooms[room.id] = room
+            while len(self._rooms) > self.max_rooms:
+                self._close(self._rooms.popitem(last=False)[1])
+        return room
+
+    def get(self, room_id):
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                return None
+            now = self.clock()
+            if now - room.last_seen > self.idle_timeout:
+                self._close(self._rooms.pop(room_id))
+                return None
+            room.last_seen = now
+            self._rooms.move_to_end(room_id)
+            return room
+
+    def join(self, room_id, player):
+        """Add ``player`` to the room; returns the room, or None if it is gone."""
+        with self._lock:
+            room = self.get(room_id)
+            if room is not None:
+                with room.lock:
+                    room.members.setdefault(player, 0)
+            return room
+
+    def leave(self, room_id, player):
+        """Remove ``player``, closing the room if it is now empty.
+
+        Returns the room, or None if the player was not in it.
+        """
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                return None
+            with room.lock:
+                if room.members.pop(player, None) is None:
+                    return None
+            if not room.members:
+                self._close(self._rooms.pop(room_id))
+            return room
+
+    def evict_expired(self):
+        with self._lock:
+            deadline = self.clock() - self.idle_timeout
+            evicted = 0
+            while self._rooms:
+                room = next(iter(self._rooms.values()))
+                if room.last_seen >= deadline:
+                    break
+                self._close(self._rooms.popitem(last=False)[1])
+                evicted += 1
+            return evicted
+
+    def _close(self, room):
+        # Wakes up event streams so they notice the room is gone
+        room.closed = True
+        room.feed.publish(None, {'closed': True})
+
+    def clear(self):
+        with self._lock:
+            for room in self._rooms.values():
+                self._close(room)
+            self._rooms.clear()
@@ -1,14 +1,74 @@
-from flask import Blueprint, request, session, redirect, url_for, jsonify
+import json
+
+from flask import Blueprint, request, session, redirect, url_for, jsonify, abort, render_template, make_response, current_app, Response, stream_with_context
 from app.decorators import guess_decorator
-from app.game import add_player, add_guess, record_score, get_players, get_scores, check_guess, reset_game, delete_player
+from app.game import add_player, add_guess, record_score, get_players, get_player, search_players, iter_players, bulk_import, check_guess, reset_game, delete_player, rename_player, ensure_game, new_game, player_exists, get_leaderboard, get_score, get_rank, count_scores, get_stats, feed, response_cache, game_locks, CORRECT, OUT_OF_GUESSES, GAME_FINISHED
+from app.leaderboard import encode_cursor, decode_cursor
+from app import names
+from app.ratelimit import limit_games, limit_guesses
+from app.solver import hint, par
+from app.targets import DIFFICULTIES, DEFAULT_DIFFICULTY
+
+# Page size for the score table and its JSON variant
+DEFAULT_SCORES_LIMIT = 50
+MAX_SCORES_LIMIT = 500
+
+# Page size for player search (?prefix= / ?q= on /players)
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+
+# Seconds between keep-alive comments on an idle score stream
+STREAM_KEEPALIVE = 15
+
+# Largest NDJSON import accepted in one request
+MAX_IMPORT_RECORDS = 100000
 
 main_bp = Blueprint('main', __name__)
 
+def cached_response(key, kind, build, mimetype='application/json'):
+    # Serve a cached body, or 304 when the client already has it
+    etag, body = response_cache.get(key, kind, build)
+    response = make_response()
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+    response.set_data(body)
+    response.mimetype = mimetype
+    return response
+
+def json_body(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def current_game():
+    # Each browser session plays its own game; expired games are replaced
+    game = ensure_game(session.get('game_id'))
+    session['game_id'] = game.id
+    return game
+
 # --- CRUD Routes ---
 @main_bp.route('/players', methods=['GET'])
 def get_all_players():
-    players = get_players()
-    return jsonify(players)
+    if 'prefix' in request.args or 'q' in request.args:
+        return find_players()
+    return cached_response(('players',), 'players', lambda: json_body(get_players()))
+
+def find_players():
+    # Names matching ?prefix= or ?q=, one page at a time like /scores.json
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    if limit is None or limit < 1:
+        abort(400)
+    limit = min(limit, MAX_SEARCH_LIMIT)
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = names.decode_cursor(request.args['cursor'])
+        except ValueError:
+            abort(400)
+    matches = search_players(limit, request.args.get('prefix'), request.args.get('q'), after)
+    next_cursor = names.encode_cursor(matches[-1]) if len(matches) == limit else None
+    return jsonify({'players': matches, 'next_cursor': next_cursor})
 
 @main_bp.route('/players', methods=['POST'])
 def create_player():
@@ -19,10 +79,58 @@ def create_player():
         return jsonify({"message": f"Player {player_name} created successfully"}), 201
     return jsonify({"error": "Player name is required"}), 400
 
+@main_bp.route('/players/<name>', methods=['GET'])
+def get_one_player(name):
+    if not player_exists(name):
+        return jsonify({'error': 'Player not found'}), 404
+
+    def build():
+        player = get_player(name)
+        if player is None:
+            abort(404)
+        return json_body({name: player})
+    return cached_response(('player', name), None, build)
+
+@main_bp.route('/players.ndjson', methods=['GET'])
+def export_players():
+    # One JSON object per line, generated as the response is sent
+    def generate():
+        for record in iter_players():
+            yield json.dumps(record, separators=(',', ':')) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def parse_import_line(line):
+    record = json.loads(line)
+    if not isinstance(record, dict) or not isinstance(record.get('name'), str) or not record['name']:
+        raise ValueError('each line needs a non-empty "name"')
+    guesses = record.get('guesses')
+    if guesses is not None and not (isinstance(guesses, list) and all(
+            isinstance(guess, int) and not isinstance(guess, bool) for guess in guesses)):
+        raise ValueError('"guesses" must be a list of integers')
+    score = record.get('score')
+    if score is not None and (not isinstance(score, int) or isinstance(score, bool) or score < 0):
+        raise ValueError('"score" must be a non-negative integer')
+    return {'name': record['name'], 'guesses': guesses, 'score': score}
+
+@main_bp.route('/players.ndjson', methods=['POST'])
+def import_players():
+    # Validate everything first so the import is applied all or nothing
+    records = []
+    for number, line in enumerate(request.stream, 1):
+        if not line.strip():
+            continue
+        if len(records) == MAX_IMPORT_RECORDS:
+            return jsonify({"error": f"At most {MAX_IMPORT_RECORDS} players per import"}), 413
+        try:
+            records.append(parse_import_line(line))
+        except ValueError as e:
+            return jsonify({"error": f"Line {number}: {e}"}), 400
+    created, updated = bulk_import(records)
+    return jsonify({"created": created, "updated": updated})
+
 @main_bp.route('/players/<name>', methods=['DELETE'])
 def remove_player(name):
-    if name in get_players():
-        delete_player(name)
+    if delete_player(name):
         return jsonify({"message": f"Player {name} deleted successfully"})
     return jsonify({"error": "Player not found"}), 404
 
@@ -30,13 +138,20 @@ def remove_player(name):
 def update_player(name):
     data = request.get_json()
     new_name = data.get('name')
-    if name in get_players() and new_name:
-        # Delete old player and create new one
-        delete_player(name)
-        add_player(new_name)
-        return jsonify({"message": f"Player {name} updated to {new_name} successfully"})
+    if player_exists(name) and new_name:
+        # Atomically move the player, keeping their score and stats
+        if new_name == name or rename_player(name, new_name):
+            return jsonify({"message": f"Player {name} updated to {new_name} successfully"})
+        if player_exists(new_name):
+            return jsonify({"error": f"Player {new_name} already exists"}), 409
     return jsonify({"error": "Player not found or new name not provided"}), 404
 
+@main_bp.route('/players/<name>/stats', methods=['GET'])
+def player_stats(name):
+    if not player_exists(name):
+        return jsonify({"error": "Player not found"}), 404
+    return jsonify(get_stats(name) or {'games': 0})
+
 @main_bp.route('/')
 def landing_page():
     return redirect(url_for('main.invite_page'))
@@ -46,56 +161,52 @@ def invite_page():
     if request.method == 'POST':
         player_name = request.form.get('player_name')
         if player_name:
+            difficulty = request.form.get('difficulty', DEFAULT_DIFFICULTY)
+            if difficulty not in DIFFICULTIES:
+                difficulty = DEFAULT_DIFFICULTY
+            limited = limit_games()
+            if limited:
+                return limited
             session['player_name'] = player_name
+            session['game_id'] = new_game(player_name, difficulty)
             add_player(player_name)
             return redirect(url_for('main.invite_page'))
     
     player_name = session.get('player_name', '')
     message = session.pop('message', '')
-    
-    return f'''
-        <h1 style="text-align:center">Welcome to the Number Guessing Game!</h1>
-        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-            <form method="post" style="text-align:center; margin-bottom: 30px;">
-                <label style="font-size: 18px; margin-right: 10px;">Enter your name:</label>
-                <input type="text" name="player_name" value="{player_name}" required 
-                       style="padding: 8px; font-size: 16px; width: 200px;">
-                <button type="submit" 
-                        style="padding: 8px 20px; font-size: 16px; margin-left: 10px; background-color: #4CAF50; color: white; border: none; border-radius: 4px; cursor: pointer;">
-                    Set Name
-                </button>
-            </form>
-
-            <div style="text-align:center; margin-bottom: 20px;">
-                <img src="https://media.giphy.com/media/3o7aCSPqXE5C6T8tBC/giphy.gif">
-            </div>
-
-            {f'<h2 style="text-align:center">Hello, {player_name}!</h2>' if player_name else ''}
-            
-            <div style="text-align:center; margin: 20px 0; padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
-                <h3 style="color: #2196F3; margin: 0;">Guess the number between 1 - 100</h3>
-            </div>
-
-            <div style="text-align:center; margin-top: 20px; font-size: 20px; font-weight: bold;">
-                {message}
-            </div>
-
-            <div style="text-align:center; margin-top: 20px;">
-                <form action="/guess" method="post">
-                    <input type="number" name="guess" min="1" max="100" required 
-                           style="padding: 10px; font-size: 16px; width: 100px; text-align: center;">
-                    <button type="submit" 
-                            style="padding: 10px 20px; font-size: 16px; margin-left: 10px; background-color: #4CAF50; color: white; border: none; border-radius: 4px; cursor: pointer;">
-                        Guess!
-                    </button>
-                </form>
-            </div>
-
-            <div style="text-align:center; margin-top: 20px;">
-                <a href="/scores" style="text-decoration: none; color: #2196F3;">View Scores</a>
-            </div>
-        </div>
-    '''
+    game_range = DIFFICULTIES[DEFAULT_DIFFICULTY]
+    game_hint = None
+    if player_name:
+        game = current_game()
+        game_range = game.range
+        if current_app.config.get('GAME_HINTS'):
+            game_hint = hint(game)
+    return render_template('index.html', player_name=player_name, message=message, hint=game_hint,
+                           low=game_range[0], high=game_range[1], difficulties=DIFFICULTIES)
+
+def submit_guess(player_name, number):
+    # Play one guess in the session's game. Returns the feedback message,
+    # or a response for a refused guess or the win page.
+    game = current_game()
+    limited = limit_guesses(key=f'game:{game.id}')
+    if limited:
+        return limited
+    # Checked and played under the game's lock, so concurrent posts from one
+    # session can neither score twice nor go past MAX_GUESSES
+    with game_locks(game.id):
+        if game.finished:
+            return GAME_FINISHED
+        if game.guesses_left <= 0:
+            return OUT_OF_GUESSES
+        add_guess(player_name, number)
+        result = check_guess(number, game.id)
+        if result != CORRECT:
+            return result
+        # Record the score and show the number of guesses
+        guesses_count = len(game.guesses)
+        record_score(player_name, score=guesses_count)
+    # Rendered as a full page, so the decorator passes the response through
+    return make_response(render_template('guess.html', guesses_count=guesses_count, par=par(game)))
 
 @main_bp.route('/guess', methods=['POST'])
 @guess_decorator
@@ -108,120 +219,109 @@ def play():
     guess = request.form.get('guess')
     if not guess:
         return "Please enter a number!"
-    number = int(guess)
-    add_guess(player_name, number)
-    result = check_guess(number)
-    if "guessed it right" in result:
-        # Record the score and show the number of guesses
-        record_score(player_name)
-        guesses_count = len(get_players()[player_name]['guesses'])
-        result = f"<h2 style='color:green'>You guessed it right in {guesses_count} tries!</h2><img style='width:300px' src='https://media.giphy.com/media/4T7e4DmcrP9du/giphy.gif'>"
-        # Add play again button to the success message
-        result += '''
-            <div style="text-align:center; margin-top: 20px;">
-                <form action="/play-again" method="post">
-                    <button type="submit" 
-                            style="padding: 10px 20px; font-size: 16px; background-color: #2196F3; color: white; border: none; border-radius: 4px; cursor: pointer;">
-                        Play Again!
-                    </button>
-                </form>
-            </div>
-        '''
-        return result
-    else:
+    result = submit_guess(player_name, int(guess))
+    if isinstance(result, str):
         session['message'] = result
         return redirect(url_for('main.invite_page'))
+    return result
 
 @main_bp.route('/play-again', methods=['POST'])
 def play_again():
-    reset_game()
+    reset_game(current_game().id)
     return redirect(url_for('main.invite_page'))
 
+def scores_page():
+    # Read ?limit= and ?cursor= and return one ranked page plus the next cursor
+    limit = request.args.get('limit', DEFAULT_SCORES_LIMIT, type=int)
+    if limit is None or limit < 1:
+        abort(400)
+    limit = min(limit, MAX_SCORES_LIMIT)
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'])
+        except ValueError:
+            abort(400)
+    rows = get_leaderboard(limit, after)
+    next_cursor = None
+    if len(rows) == limit:
+        name, score = rows[-1]
+        next_cursor = encode_cursor(name, score)
+    return rows, next_cursor
+
+@main_bp.route('/scores.json')
+def show_scores_json():
+    def build():
+        rows, next_cursor = scores_page()
+        return json_body({
+            'scores': [{'name': name, 'score': score} for name, score in rows],
+            'total': count_scores(),
+            'next_cursor': next_cursor,
+        })
+    key = ('scores.json', request.args.get('limit'), request.args.get('cursor'))
+    return cached_response(key, 'scores', build)
+
+def score_events(sequence, reset=False):
+    yield 'retry: 3000\n\n'
+    if reset:
+        yield f'id: {sequence}\nevent: reset\ndata: {{}}\n\n'
+    while True:
+        sequence, changes = feed.wait(sequence, STREAM_KEEPALIVE)
+        if changes is None:
+            # Fell too far behind; the client reloads the whole table
+            yield f'id: {sequence}\nevent: reset\ndata: {{}}\n\n'
+        elif changes:
+            yield f'id: {sequence}\nevent: scores\ndata: {json.dumps(list(changes.values()))}\n\n'
+        else:
+            yield ': keepalive\n\n'
+
+@main_bp.route('/scores/stream')
+def stream_scores():
+    # Resume from the last event the browser saw, or from now
+    sequence = request.headers.get('Last-Event-ID', type=int)
+    # Sequences are per worker and restart from 0, so an ID this worker has
+    # not reached comes from another worker or an earlier process; the
+    # client reloads the table and follows from now
+    reset = sequence is not None and not 0 <= sequence <= feed.sequence
+    if sequence is None or reset:
+        sequence = feed.sequence
+    response = Response(stream_with_context(score_events(sequence, reset)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@main_bp.route('/scores/<name>', methods=['GET'])
+def show_score(name):
+    score = get_score(name)
+    if score is None:
+        return jsonify({'error': 'Player has no score'}), 404
+    return jsonify({'name': name, 'score': score, 'rank': get_rank(name)})
+
 # --- Score Table Route ---
 @main_bp.route('/scores')
 def show_scores():
-    scores = get_scores()
-    table_rows = "".join([
-        f'''
-        <tr>
-            <td>{name}</td>
-            <td>{score}</td>
-            <td>
-                <button onclick="deleteScore('{name}')" 
-                        style="padding: 5px 10px; font-size: 14px; background-color: #f44336; color: white; border: none; border-radius: 4px; cursor: pointer;">
-                    Delete
-                </button>
-                <button onclick="updateScore('{name}')" 
-                        style="padding: 5px 10px; font-size: 14px; background-color: #2196F3; color: white; border: none; border-radius: 4px; cursor: pointer; margin-left: 10px;">
-                    Update
-                </button>
-            </td>
-        </tr>
-        ''' for name, score in scores.items()
-    ])
-    return f'''
-        <h2>Player Scores</h2>
-        <table border="1" style="border-collapse:collapse; margin: 0 auto;">
-            <tr>
-                <th>Player</th>
-                <th>Score (Guesses)</th>
-                <th>Action</th>
-            </tr>
-            {table_rows}
-        </table>
-        <div style="text-align:center; margin-top: 20px;">
-            <a href="/game" style="text-decoration: none; color: #2196F3;">Back to Game</a>
-        </div>
-        <script>
-        function deleteScore(name) {{
-            if (confirm('Are you sure you want to delete this player and their score?')) {{
-                fetch(`/scores/${{name}}`, {{
-                    method: 'DELETE'
-                }})
-                .then(response => response.json())
-                .then(data => {{
-                    alert(data.message);
-                    window.location.reload();
-                }})
-                .catch(error => {{
-                    console.error('Error:', error);
-                    alert('Error deleting player');
-                }});
-            }}
-        }}
-
-        function updateScore(name) {{
-            if (confirm('Do you want to play a new game with this player?')) {{
-                fetch(`/scores/${{name}}`, {{
-                    method: 'PUT'
-                }})
-                .then(response => response.json())
-                .then(data => {{
-                    alert(data.message);
-                    window.location.href = '/game';
-                }})
-                .catch(error => {{
-                    console.error('Error:', error);
-                    alert('Error updating player');
-                }});
-            }}
-        }}
-        </script>
-    '''
+    # Revalidated by a hash of the page itself, which stays valid across
+    # restarts and workers
+    def build():
+        rows, next_cursor = scores_page()
+        first_rank = get_rank(rows[0][0]) if rows else 1
+        return render_template('scores.html', rows=rows, next_cursor=next_cursor,
+                               first_rank=first_rank).encode('utf-8')
+    key = ('scores.html', request.args.get('limit'), request.args.get('cursor'))
+    return cached_response(key, 'scores', build, mimetype='text/html')
 
 @main_bp.route('/scores/<name>', methods=['DELETE'])
 def delete_score(name):
-    if name in get_players():
-        delete_player(name)  # This will delete both player and their score
+    if delete_player(name):  # This will delete both player and their score
         return jsonify({'message': f'Player {name} and their score deleted successfully'})
     return jsonify({'error': 'Player not found'}), 404
 
 @main_bp.route('/scores/<name>', methods=['PUT'])
 def update_score(name):
-    if name in get_players():
+    if player_exists(name):
         # Set the player name in session
         session['player_name'] = name
         # Reset the game for a new attempt
-        reset_game()
+        reset_game(current_game().id)
         return jsonify({'message': f'Player {name} is ready for a new game'})
     return jsonify({'error': 'Player not found'}), 404 
\ No newline at end of file
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Games idle for longer than this are evicted
+IDLE_TIMEOUT = 30 * 60
+
+# Upper bound on live games per process; the least recently used game is
+# evicted when a new one would exceed it
+MAX_GAMES = 100000
+
+# Guesses allowed in one game; binary search needs at most 30 even on the
+# largest range, so this only stops scripted guessing
+MAX_GUESSES = 200
+
+
+class GameSession:
+    """State of a single game: its secret target and the guesses made so far."""
+
+    __slots__ = ('id', 'target', 'player', 'guesses', 'created', 'last_seen', 'finished',
+                 'range', 'low', 'high')
+
+    def __init__(self, game_id, target, player=None, low=1, high=100):
+        self.id = game_id
+        self.player = player
+        self.range = (low, high)
+        self.created = self.last_seen = time.monotonic()
+        self.reset(target)
+
+    def guess(self, number):
+        self.guesses.append(number)
+        # Narrow the interval the target can still be in
+        if number < self.target:
+            self.low = max(self.low, number + 1)
+        elif number > self.target:
+            self.high = min(self.high, number - 1)
+        else:
+            self.low = self.high = number
+            self.finished = True
+        return number - self.target
+
+    @property
+    def guesses_left(self):
+        return MAX_GUESSES - len(self.guesses)
+
+    def reset(self, target):
+        self.target = target
+        self.guesses = []
+        self.finished = False
+        self.low, self.high = self.range
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'player': self.player,
+            'low': self.range[0],
+            'high': self.range[1],
+            'guesses': list(self.guesses),
+            'finished': self.finished,
+        }
+
+
+class GameRegistry:
+    """Live games keyed by id, kept in least-recently-used order.
+
+    Lookups are O(1); expired games are always at the front of the ordering
+    so eviction only ever inspects the oldest entries. The reordering is
+    guarded by a lock, which gevent's monkey patching makes cooperative.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_games=MAX_GAMES, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.max_games = max_games
+        self.clock = clock
+        self._games = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._games)
+
+    def __contains__(self, game_id):
+        return self.get(game_id) is not None
+
+    def create(self, target=None, game_id=None, player=None, low=1, high=100):
+        if target is None:
+            target = random.randint(low, high)
+        game = GameSession(game_id or uuid.uuid4().hex, target, player, low, high)
+        with self._lock:
+            self.evict_expired()
+            game.created = game.last_seen = self.clock()
+            self._games[game.id] = game
+            self._games.move_to_end(game.id)
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+        return game
+
+    def get(self, game_id):
+        with self._lock:
+            game = self._games.get(game_id)
+            if game is None:
+                return None
+            now = self.clock()
+            if now - game.last_seen > self.idle_timeout:
+                del self._games[game_id]
+                return None
+            game.last_seen = now
+            self._games.move_to_end(game_id)
+            return game
+
+    def values(self):
+        with self._lock:
+            return list(self._games.values())
+
+    def discard(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+
+    def evict_expired(self):
+        with self._lock:
+            deadline = self.clock() - self.idle_timeout
+            evicted = 0
+            while self._games:
+                game = next(iter(self._games.values()))
+                if game.last_seen >= deadline:
+                    break
+                self._games.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            self._games.clear()
@@ -0,0 +1,581 @@
+"""Players partitioned across several storage backends by consistent hashing.
+
+``storage_from_url`` builds a ShardedStorage from a comma-separated list of
+storage URLs, e.g.
+
+    GAME_STORAGE_URL=shard://:secret@10.0.0.1:7001,shard://:secret@10.0.0.2:7001
+
+where each ``shard://`` node is a process started with
+
+    python -m app.shards serve 0.0.0.0:7001 --authkey secret
+
+that keeps its share of the players in a MemoryStorage. The position of a
+URL in the list names its shard on the ring, so shards are only ever
+appended.
+
+``python -m app.shards add`` appends a shard while the workers keep
+serving: the new layout is published to every shard process, each shard
+refuses calls made with an older layout (ShardMoved), and a worker whose
+call is refused loads the new layout from the shards and retries.
+"""
+import argparse
+import bisect
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlsplit
+
+from app.locks import LockStripes
+from app.names import fold
+from app.storage import MemoryStorage, Storage
+
+# Points per shard on the ring; more points spread players more evenly
+REPLICAS = 128
+
+# Storage methods a shard process serves
+REMOTE_METHODS = ('add_player', 'has_player', 'add_guess', 'get_guesses', 'clear_guesses', 'record_score', 'delete_player',
+                  'rename_player', 'get_players', 'search_players', 'get_scores', 'bulk_import',
+                  'get_record', 'put_record', 'get_leaderboard', 'count_ranked_before', 'get_score', 'get_rank',
+                  'count_players', 'count_scores', 'get_stats', 'clear')
+
+# Storage methods whose first argument is the player they act on
+PLAYER_METHODS = ('add_player', 'has_player', 'add_guess', 'get_guesses', 'clear_guesses', 'record_score', 'delete_player',
+                  'rename_player', 'get_record', 'get_score', 'get_rank', 'get_stats')
+
+# Methods of the ShardNode behind a shard process
+NODE_METHODS = ('call', 'get_layout', 'set_layout', 'expect', 'take', 'admit')
+
+# Attempts at a call the shards refuse, and the pause between them while a
+# player is being moved
+MOVE_RETRIES = 100
+MOVE_WAIT = 0.01
+
+
+class ShardMoved(Exception):
+    """A shard refused a call routed by an old layout, or for a player it does not hold."""
+
+
+def ring_hash(key):
+    # md5 rather than hash() so every process places keys the same way
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes.
+
+    Each node owns REPLICAS points on a ring of 64-bit hashes and a key
+    belongs to the node of the first point at or after the key's hash.
+    Adding a node only takes over the keys just before its points, about
+    1/N of them, and leaves every other key where it was.
+    """
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self.nodes = []
+        self._hashes = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        self.nodes.append(node)
+        points = sorted(zip(self._hashes, self._owners))
+        points += [(ring_hash(f'{node}#{replica}'), node) for replica in range(self.replicas)]
+        points.sort()
+        self._hashes = [point for point, _ in points]
+        self._owners = [owner for _, owner in points]
+
+    def copy(self):
+        ring = HashRing(replicas=self.replicas)
+        ring.nodes, ring._hashes, ring._owners = list(self.nodes), list(self._hashes), list(self._owners)
+        return ring
+
+    def node(self, key):
+        index = bisect.bisect_left(self._hashes, ring_hash(key))
+        return self._owners[index % len(self._owners)]
+
+
+class ShardedStorage(Storage):
+    """Storage spread over ``shards``, each holding the players hashed to it.
+
+    Per-player calls go to the player's shard. Global views (all players,
+    scores, leaderboard pages, ranks, counts, search) ask every shard,
+    in parallel when they live in other processes, and merge the answers.
+    A rename across shards moves the player, and a bulk import is applied
+    all or nothing per shard only.
+
+    add_shard() rebalances online: the players the new shard takes over are
+    moved one at a time while requests keep being served, and until a
+    player has moved their calls still go to the shard that holds them.
+    When every shard is a shard process, the layout (shard URLs and the
+    shard count before the running rebalance) is kept by the shards
+    themselves and versioned; calls carry this process's version, and on
+    ShardMoved the layout is reloaded and the call retried, so workers in
+    other processes follow the rebalance without a restart. Other shards
+    are only rebalanced correctly while no other process uses them.
+    """
+
+    def __init__(self, shards, replicas=REPLICAS):
+        if not shards:
+            raise ValueError('ShardedStorage needs at least one shard')
+        self.shards = list(shards)
+        self.ring = HashRing(range(len(self.shards)), replicas)
+        self.shared = any(shard.shared for shard in self.shards)
+        # Held around each per-player call so a rebalance never moves a
+        # player in the middle of one
+        self.locks = LockStripes()
+        self._rebalance_lock = threading.Lock()
+        self._layout_lock = threading.Lock()
+        self._previous = None
+        self.version = 0
+        self._pid = None
+        self._pool = None
+
+    @property
+    def remote(self):
+        return all(isinstance(shard, RemoteStorage) for shard in self.shards)
+
+    def reload(self):
+        """Load a newer layout published by a rebalance in another process.
+
+        Returns whether the layout changed.
+        """
+        if not self.remote:
+            return False
+        with self._layout_lock:
+            layout = max((shard.get_layout() for shard in self.shards), key=lambda layout: layout['version'])
+            if layout['version'] <= self.version:
+                return False
+            if len(layout['urls']) < len(self.shards):
+                raise RuntimeError(f"The shards know {len(layout['urls'])} shards, GAME_STORAGE_URL has {len(self.shards)}")
+            self._adopt(layout, [remote_from_url(url) for url in layout['urls'][len(self.shards):]])
+            return True
+
+    def _adopt(self, layout, shards):
+        # The previous ring goes first, so a concurrent call that sees the
+        # new ring also sees the fallback to the shards still holding players
+        self.shards.extend(shards)
+        self.shared = any(shard.shared for shard in self.shards)
+        replicas = self.ring.replicas
+        self._previous = HashRing(range(layout['previous']), replicas) if layout['previous'] else None
+        self.ring = HashRing(range(len(self.shards)), replicas)
+        self.version = layout['version']
+        for shard in self.shards:
+            if isinstance(shard, RemoteStorage):
+                shard.version = self.version
+
+    def _routed(self, call):
+        # Retries calls the shards refuse: at once after loading a newer
+        # layout, after a pause while the player is moved between shards
+        for _ in range(MOVE_RETRIES):
+            try:
+                return call()
+            except ShardMoved:
+                if not self.reload():
+                    time.sleep(MOVE_WAIT)
+        return call()
+
+    def shard_index(self, player_name):
+        index = self.ring.node(player_name)
+        previous = self._previous
+        if previous is not None:
+            old = previous.node(player_name)
+            if old != index and self.shards[old].has_player(player_name):
+                # Not moved yet by the running rebalance
+                return old
+        return index
+
+    def shard_for(self, player_name):
+        return self.shards[self.shard_index(player_name)]
+
+    def _gather(self, method, *args):
+        return self._routed(lambda: self._gather_once(method, *args))
+
+    def _gather_once(self, method, *args):
+        # One result per shard, in shard order
+        calls = [getattr(shard, method) for shard in self.shards]
+        if not self.shared or len(calls) == 1:
+            return [call(*args) for call in calls]
+        if self._pid != os.getpid():
+            # Threads do not survive a fork; each worker starts its own
+            self._pid = os.getpid()
+            self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='shards')
+        return list(self._pool.map(lambda call: call(*args), calls))
+
+    def _player_call(self, method, player_name, *args):
+        with self.locks(player_name):
+            return self._routed(lambda: getattr(self.shard_for(player_name), method)(player_name, *args))
+
+    def add_player(self, player_name):
+        return self._player_call('add_player', player_name)
+
+    def has_player(self, player_name):
+        return self._player_call('has_player', player_name)
+
+    def add_guess(self, player_name, guess):
+        return self._player_call('add_guess', player_name, guess)
+
+    def get_guesses(self, player_name):
+        return self._player_call('get_guesses', player_name)
+
+    def clear_guesses(self, player_name):
+        return self._player_call('clear_guesses', player_name)
+
+    def record_score(self, player_name, expected_guesses=None, score=None, keep_guesses=False):
+        return self._player_call('record_score', player_name, expected_guesses, score, keep_guesses)
+
+    def delete_player(self, player_name):
+        return self._player_call('delete_player', player_name)
+
+    def get_record(self, player_name):
+        return self._player_call('get_record', player_name)
+
+    def put_record(self, record):
+        with self.locks(record['name']):
+            return self._routed(lambda: self.shard_for(record['name']).put_record(record))
+
+    def get_score(self, player_name):
+        return self._player_call('get_score', player_name)
+
+    def get_stats(self, player_name):
+        return self._player_call('get_stats', player_name)
+
+    def rename_player(self, old_name, new_name):
+        with self.locks.many(old_name, new_name):
+            return self._routed(lambda: self._rename(old_name, new_name))
+
+    def _rename(self, old_name, new_name):
+        source, target = self.shard_for(old_name), self.shard_for(new_name)
+        if source is target:
+            return source.rename_player(old_name, new_name)
+        if target.has_player(new_name):
+            return False
+        record = source.get_record(old_name)
+        if record is None:
+            return False
+        record['name'] = new_name
+        target.put_record(record)
+        source.delete_player(old_name)
+        return True
+
+    def get_players(self):
+        players = {}
+        for part in self._gather('get_players'):
+            players.update(part)
+        return players
+
+    def get_scores(self):
+        scores = {}
+        for part in self._gather('get_scores'):
+            scores.update(part)
+        return scores
+
+    def iter_players(self):
+        for shard in self.shards:
+            if isinstance(shard, RemoteStorage):
+                # Fetched at once anyway, so a refused call can be retried
+                yield from self._routed(lambda: list(shard.iter_players()))
+            else:
+                yield from shard.iter_players()
+
+    def search_players(self, limit, prefix=None, query=None, after=None):
+        pages = self._gather('search_players', limit, prefix, query, after)
+        merged = heapq.merge(*pages, key=lambda name: (fold(name), name))
+        return list(itertools.islice(merged, limit))
+
+    def bulk_import(self, records):
+        records = list(records)
+        with self.locks.all():
+            return self._routed(lambda: self._bulk_import(records))
+
+    def _bulk_import(self, records):
+        parts = [[] for _ in self.shards]
+        created = updated = 0
+        for record in records:
+            parts[self.shard_index(record['name'])].append(record)
+        for shard, part in zip(self.shards, parts):
+            if part:
+                shard_created, shard_updated = shard.bulk_import(part)
+                created += shard_created
+                updated += shard_updated
+        return created, updated
+
+    def get_leaderboard(self, limit, after=None, offset=0):
+        # Every shard's top offset + limit rows hold the merged page
+        pages = self._gather('get_leaderboard', offset + limit, after, 0)
+        merged = heapq.merge(*pages, key=lambda row: (row[1], row[0]))
+        return list(itertools.islice(merged, offset, offset + limit))
+
+    def get_rank(self, player_name):
+        score = self.get_score(player_name)
+        if score is None:
+            return None
+        return sum(self._gather('count_ranked_before', score, player_name)) + 1
+
+    def count_ranked_before(self, score, player_name):
+        return sum(self._gather('count_ranked_before', score, player_name))
+
+    def count_players(self):
+        return sum(self._gather('count_players'))
+
+    def count_scores(self):
+        return sum(self._gather('count_scores'))
+
+    def clear(self):
+        self._gather('clear')
+
+    def dump(self):
+        """Every shard's dump(), for snapshots of in-process shards."""
+        return {'shards': [shard.dump() for shard in self.shards]}
+
+    def load(self, state):
+        if len(state['shards']) != len(self.shards):
+            raise ValueError(f"Snapshot has {len(state['shards'])} shards, storage has {len(self.shards)}")
+        for shard, part in zip(self.shards, state['shards']):
+            shard.load(part)
+
+    def add_shard(self, shard):
+        """Append ``shard`` to the ring and move the players it now owns to it.
+
+        Returns the number of players moved.
+        """
+        with self._rebalance_lock:
+            self.reload()
+            count = len(self.shards)
+            remote = self.remote and isinstance(shard, RemoteStorage)
+            layout = {'version': self.version + 1, 'previous': count, 'replicas': self.ring.replicas,
+                      'urls': [source.url for source in self.shards] + [shard.url] if remote else None}
+            # Routed by the new layout here first, so this process is never
+            # refused while the shards learn it
+            with self._layout_lock:
+                self._adopt(layout, [shard])
+            if remote:
+                self._publish(layout)
+            moved = 0
+            for index, source in enumerate(self.shards[:count]):
+                names = [name for name in source.get_players() if self.ring.node(name) != index]
+                for name in names:
+                    with self.locks(name):
+                        if self._move(name, source, self.shards[self.ring.node(name)], remote):
+                            moved += 1
+            # Only once every player has moved; after a failure the
+            # previous ring keeps routing to the players left behind
+            layout = dict(layout, version=layout['version'] + 1, previous=None)
+            with self._layout_lock:
+                self._adopt(layout, [])
+            if remote:
+                self._publish(layout)
+            return moved
+
+    def _publish(self, layout):
+        for index, shard in enumerate(self.shards):
+            shard.set_layout(layout, index)
+
+    @staticmethod
+    def _move(name, source, target, remote):
+        if remote:
+            # The target refuses calls for the player until admit(), and
+            # the source refuses them from take() on, so no other process
+            # can write to either copy in between
+            target.expect(name)
+            record = source.take(name)
+            target.admit(name, record)
+        else:
+            record = source.get_record(name)
+            if record is not None:
+                target.put_record(record)
+                source.delete_player(name)
+        return record is not None
+
+
+class ShardNode:
+    """The storage a shard process serves, guarded by the cluster layout.
+
+    Calls arrive through call() with the caller's layout version. One made
+    with an older version than set_layout() last gave is refused, and so
+    is a per-player call while the player is being moved here, or when
+    this shard neither owns the player on the ring nor still holds them.
+    The caller reloads the layout and retries (see ShardedStorage.reload).
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        # (layout, this shard's index, ring), replaced as a whole
+        self._state = ({'version': 0, 'urls': None, 'replicas': REPLICAS, 'previous': None}, None, None)
+        self.incoming = set()
+        self.locks = LockStripes()
+        self._layout_lock = threading.Lock()
+
+    def get_layout(self):
+        return dict(self._state[0])
+
+    def set_layout(self, layout, index):
+        with self._layout_lock:
+            if layout['version'] > self._state[0]['version']:
+                self._state = (dict(layout), index, HashRing(range(len(layout['urls'])), layout['replicas']))
+
+    def call(self, version, method, *args):
+        layout, index, ring = self._state
+        if method not in REMOTE_METHODS:
+            raise AttributeError(method)
+        if version < layout['version']:
+            raise ShardMoved(f"Layout {version} is out of date, the shards are at {layout['version']}")
+        if method == 'put_record':
+            name = args[0]['name']
+        elif method in PLAYER_METHODS:
+            name = args[0]
+        else:
+            return getattr(self.storage, method)(*args)
+        with self.locks(name):
+            if name in self.incoming:
+                raise ShardMoved(f'{name!r} is being moved to this shard')
+            # has_player is how callers look for players not moved yet
+            if (method != 'has_player' and ring is not None and ring.node(name) != index
+                    and not self.storage.has_player(name)):
+                raise ShardMoved(f'{name!r} is not on this shard')
+            return getattr(self.storage, method)(*args)
+
+    def expect(self, name):
+        with self.locks(name):
+            self.incoming.add(name)
+
+    def take(self, name):
+        """Remove a player and return their record, for admit() on another shard."""
+        with self.locks(name):
+            record = self.storage.get_record(name)
+            if record is not None:
+                self.storage.delete_player(name)
+            return record
+
+    def admit(self, name, record):
+        with self.locks(name):
+            if record is not None:
+                self.storage.put_record(record)
+            self.incoming.discard(name)
+
+
+class ShardManager(BaseManager):
+    pass
+
+
+# Clients only need the name; serve() registers the object behind it
+ShardManager.register('storage', exposed=NODE_METHODS)
+
+
+class RemoteStorage:
+    """The ShardNode of a shard process, reached through a manager proxy.
+
+    Each call is one round trip and carries ``version``, the layout this
+    process routes by; the proxy keeps a connection per thread. ``url`` is
+    how other processes reach the same shard.
+    """
+
+    shared = True
+
+    def __init__(self, address, authkey, url=None):
+        manager = ShardManager(address=address, authkey=authkey)
+        manager.connect()
+        self._proxy = manager.storage()
+        self.url = url or f"shard://:{authkey.decode('utf-8')}@{address[0]}:{address[1]}"
+        self.version = 0
+
+    def __getattr__(self, name):
+        if name in REMOTE_METHODS:
+            return lambda *args: self._proxy.call(self.version, name, *args)
+        if name in NODE_METHODS:
+            return getattr(self._proxy, name)
+        raise AttributeError(name)
+
+    def iter_players(self):
+        # Generators cannot cross the connection; fetch the shard at once
+        scores = self.get_scores()
+        for name, player in self.get_players().items():
+            yield {'name': name, 'guesses': player['guesses'], 'score': scores.get(name)}
+
+
+def remote_from_url(url):
+    """RemoteStorage for ``shard://:<authkey>@<host>:<port>``."""
+    parts = urlsplit(url)
+    if not parts.hostname or not parts.port or not parts.password:
+        raise ValueError('Shard URL must be shard://:<authkey>@<host>:<port>')
+    return RemoteStorage((parts.hostname, parts.port), parts.password.encode('utf-8'), url)
+
+
+def serve(address, authkey, ready=None):
+    """Serve a fresh ShardNode at ``address`` until the process is killed.
+
+    The manager unpickles whatever its clients send, so ``authkey`` is what
+    keeps anyone who can reach the port from running code in the shard; it
+    must not be empty.
+    """
+    if not authkey:
+        raise ValueError('A shard needs a non-empty authkey')
+    node = ShardNode()
+    ShardManager.register('storage', callable=lambda: node, exposed=NODE_METHODS)
+    server = ShardManager(address=address, authkey=authkey).get_server()
+    if ready is not None:
+        ready.put(server.address)
+    server.serve_forever()
+
+
+def start_local(count, authkey=b'shards'):
+    """Start ``count`` shard processes on localhost, for tests and development.
+
+    Returns (processes, urls); terminate the processes when done.
+    """
+    context = multiprocessing.get_context('spawn')
+    processes, urls = [], []
+    for _ in range(count):
+        ready = context.Queue()
+        process = context.Process(target=serve, args=(('127.0.0.1', 0), authkey, ready), daemon=True)
+        process.start()
+        host, port = ready.get(timeout=30)
+        processes.append(process)
+        urls.append(f'shard://:{authkey.decode()}@{host}:{port}')
+    return processes, urls
+
+
+def main(argv=None):
+    from app.storage import storage_from_url
+    parser = argparse.ArgumentParser(description='Storage shard processes')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='serve one shard')
+    serve_parser.add_argument('address', help='<host>:<port> to listen on')
+    serve_parser.add_argument('--authkey', default=os.environ.get('GAME_SHARD_AUTHKEY', ''))
+    add_parser = commands.add_parser('add', help='add a shard and move its players to it')
+    add_parser.add_argument('storage_url', help='the current GAME_STORAGE_URL')
+    add_parser.add_argument('shard_url', help='storage URL of the new shard')
+    add_parser.add_argument('--offline', action='store_true',
+                            help='allow stores other than shard://; every worker must be stopped')
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        if not args.authkey:
+            parser.error('serve needs --authkey or GAME_SHARD_AUTHKEY')
+        host, _, port = args.address.rpartition(':')
+        serve((host, int(port)), args.authkey.encode('utf-8'))
+    else:
+        urls = [url.strip() for url in args.storage_url.split(',')] + [args.shard_url]
+        if not args.offline and not all(url.startswith('shard://') for url in urls):
+            # Only shard processes tell running workers about the new layout
+            parser.error('add moves players under running workers only between shard:// stores; '
+                         'stop every worker and pass --offline for other stores')
+        storage = storage_from_url(args.storage_url)
+        if not isinstance(storage, ShardedStorage):
+            storage = ShardedStorage([storage])
+        if args.shard_url.startswith('shard://'):
+            shard = remote_from_url(args.shard_url)
+        else:
+            shard = storage_from_url(args.shard_url)
+        moved = storage.add_shard(shard)
+        print(f'Moved {moved} players; now use GAME_STORAGE_URL={args.storage_url},{args.shard_url}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
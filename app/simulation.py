@@ -0,0 +1,235 @@
+"""Monte Carlo simulation of whole games against the real game logic.
+
+Every simulated game is played through app.game (new_game, add_guess,
+check_guess, record_score) on a fresh in-memory store, so changes to the
+ranges, the guess cap or scoring show up in the results. Players follow a
+pluggable strategy, and the games are spread over a process pool with one
+worker per core:
+
+    python -m app.simulation --games 1000000 --strategy human --difficulty hard
+    python -m app.simulation --games 100000 --strategy mypackage.bots:Sweeper --range 1-5000 --rate 200
+
+The JSON report has the score distribution (guesses per won game), the
+share of games lost to the guess cap and the requests each game costs on
+the page and API routes; with --rate (games started per second) it also
+gives the requests per second per route, for capacity planning.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from app import game
+from app.config import parse_range
+from app.solver import get_table, next_guess
+from app.storage import MemoryStorage
+from app.targets import DIFFICULTIES, DEFAULT_DIFFICULTY
+
+# Games per task handed to a worker; large enough to amortize the
+# round trip, small enough to keep every core busy until the end
+CHUNK_GAMES = 10000
+
+
+class Strategy:
+    """A player: ``guess()`` the next number, then learn its ``feedback``.
+
+    Keeps the interval the target is still in; subclasses pick a number.
+    Custom strategies subclass this and are passed as ``module:Class``.
+    """
+
+    def __init__(self, low, high, rng):
+        self.range = (low, high)
+        self.low = low
+        self.high = high
+        self.rng = rng
+
+    def guess(self):
+        raise NotImplementedError
+
+    def feedback(self, number, result):
+        if result == game.TOO_LOW:
+            self.low = max(self.low, number + 1)
+        elif result == game.TOO_HIGH:
+            self.high = min(self.high, number - 1)
+
+
+class BinarySearch(Strategy):
+    """Always the middle of the open interval, like the hints suggest."""
+
+    def guess(self):
+        return next_guess(self.low, self.high)
+
+
+class RandomGuess(Strategy):
+    """Any number of the open interval, uniformly."""
+
+    def guess(self):
+        return self.rng.randint(self.low, self.high)
+
+
+class LinearScan(Strategy):
+    """Counts up from the bottom of the range, like a brute-force script."""
+
+    def guess(self):
+        return self.low
+
+
+class HumanLike(Strategy):
+    """Aims for the middle but misses, and now and then ignores the feedback."""
+
+    # Standard deviation of the aim, as a share of the open interval
+    NOISE = 0.15
+    # Chance of a guess anywhere in the whole range
+    LAPSE = 0.05
+
+    def guess(self):
+        if self.rng.random() < self.LAPSE:
+            return self.rng.randint(*self.range)
+        number = round(self.rng.gauss((self.low + self.high) / 2, self.NOISE * (self.high - self.low)))
+        return min(max(number, self.low), self.high)
+
+
+STRATEGIES = {'binary': BinarySearch, 'random': RandomGuess, 'linear': LinearScan, 'human': HumanLike}
+
+
+def load_strategy(name):
+    """A Strategy class by STRATEGIES name or as ``module:Class``."""
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module, _, attribute = name.partition(':')
+    if not attribute:
+        raise ValueError(f"Unknown strategy {name!r}; use one of {', '.join(STRATEGIES)} or module:Class")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def init_worker(game_range):
+    game.set_storage(MemoryStorage())
+    game.journal = None
+    game.configure(game_range=game_range)
+
+
+def simulate(task):
+    """Play one chunk of games; returns the totals for summarize()."""
+    strategy_name, difficulty, games, seed = task
+    strategy_class = load_strategy(strategy_name)
+    rng = random.Random(seed)
+    player = f'simulated-{seed}'
+    game.add_player(player)
+    scores = Counter()
+    lost = guesses = par = 0
+    for _ in range(games):
+        game_id = game.new_game(player, difficulty, rng.getrandbits(64))
+        session = game.get_game(game_id)
+        strategy = strategy_class(*session.range, rng)
+        par += get_table(*session.range).par(session.target)
+        while True:
+            if session.guesses_left <= 0:
+                # new_game() drops the guesses left pending
+                lost += 1
+                break
+            number = strategy.guess()
+            guesses += 1
+            game.add_guess(player, number)
+            result = game.check_guess(number, game_id)
+            if result == game.CORRECT:
+                scores[game.record_score(player, score=len(session.guesses))] += 1
+                break
+            strategy.feedback(number, result)
+    return {'games': games, 'lost': lost, 'guesses': guesses, 'par': par, 'scores': dict(scores)}
+
+
+def percentile(distribution, total, fraction):
+    # Smallest score with at least ``fraction`` of the games at or below it
+    seen = 0
+    for score, count in distribution:
+        seen += count
+        if seen >= fraction * total:
+            return score
+    return None
+
+
+def summarize(parts, rate=None):
+    games = sum(part['games'] for part in parts)
+    lost = sum(part['lost'] for part in parts)
+    guesses = sum(part['guesses'] for part in parts)
+    scores = Counter()
+    for part in parts:
+        scores.update(part['scores'])
+    won = games - lost
+    distribution = sorted(scores.items())
+    per_game = guesses / games if games else 0
+    requests = {
+        # POST /game with the name, then a GET /game after it and after
+        # every guess that was not the winning one
+        'page': {'POST /game': 1, 'GET /game': 1 + (guesses - won) / games if games else 0, 'POST /guess': per_game},
+        # One guess per request, as played interactively
+        'api': {'POST /api/games': 1, 'POST /api/games/<id>/guesses': per_game},
+    }
+    report = {
+        'games': games,
+        'won': won,
+        'lost_share': lost / games if games else 0,
+        'scores': {
+            'mean': sum(score * count for score, count in distribution) / won if won else None,
+            'p50': percentile(distribution, won, 0.5),
+            'p90': percentile(distribution, won, 0.9),
+            'p99': percentile(distribution, won, 0.99),
+            'max': distribution[-1][0] if distribution else None,
+            'distribution': dict(distribution),
+        },
+        'mean_par': sum(part['par'] for part in parts) / games if games else None,
+        'requests_per_game': {flow: dict(routes, total=sum(routes.values())) for flow, routes in requests.items()},
+    }
+    if rate:
+        report['requests_per_second'] = {flow: {route: count * rate for route, count in routes.items()}
+                                         for flow, routes in report['requests_per_game'].items()}
+    return report
+
+
+def run(games, strategy='binary', difficulty=DEFAULT_DIFFICULTY, game_range=None, workers=None, seed=None,
+        rate=None, chunk=CHUNK_GAMES):
+    """Simulate ``games`` games and return the report as a dict.
+
+    The same ``seed`` gives the same results whatever the number of workers.
+    """
+    load_strategy(strategy)
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"Unknown difficulty {difficulty!r}; use one of {', '.join(DIFFICULTIES)}")
+    rng = random.Random(seed)
+    tasks = [(strategy, difficulty, min(chunk, games - start), rng.getrandbits(64))
+             for start in range(0, games, chunk)]
+    started = time.perf_counter()
+    # Spawned workers start from clean module state, whatever this process holds
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(game_range,)) as pool:
+        parts = list(pool.map(simulate, tasks))
+    report = summarize(parts, rate)
+    elapsed = time.perf_counter() - started
+    report['simulation'] = {'seconds': elapsed, 'games_per_second': games / elapsed if elapsed else None}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--strategy', default='binary', help=f"{', '.join(STRATEGIES)} or module:Class")
+    parser.add_argument('--difficulty', default=DEFAULT_DIFFICULTY, choices=sorted(DIFFICULTIES))
+    parser.add_argument('--range', type=parse_range, help='range of the default difficulty, as for GAME_RANGE')
+    parser.add_argument('--workers', type=int, help='processes to use (default: one per core)')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--rate', type=float, help='games started per second, to size the routes')
+    args = parser.parse_args(argv)
+    report = run(args.games, args.strategy, args.difficulty, args.range, args.workers, args.seed, args.rate)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+from array import array
+from functools import lru_cache
+
+# Ranges up to this many numbers get a full per-target table; larger ones
+# walk the (at most ~log2(n) step) search path instead
+TABLE_LIMIT = 1 << 16
+
+
+def next_guess(low, high):
+    """The binary-search guess for the remaining interval."""
+    return (low + high) // 2
+
+
+class DecisionTable:
+    """Optimal (binary search) play for the range ``low``..``high``.
+
+    ``par(target)`` is the number of guesses binary search needs to find
+    ``target``; for ranges up to TABLE_LIMIT it is a single array lookup.
+    """
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.worst_case = (high - low + 1).bit_length()
+        self.depths = None
+        if high - low + 1 <= TABLE_LIMIT:
+            self.depths = self._build()
+
+    def _build(self):
+        depths = array('B', bytes(self.high - self.low + 1))
+        intervals = [(self.low, self.high, 1)]
+        while intervals:
+            low, high, depth = intervals.pop()
+            if low > high:
+                continue
+            middle = next_guess(low, high)
+            depths[middle - self.low] = depth
+            intervals.append((low, middle - 1, depth + 1))
+            intervals.append((middle + 1, high, depth + 1))
+        return depths
+
+    def par(self, target):
+        if self.depths is not None:
+            return self.depths[target - self.low]
+        low, high, depth = self.low, self.high, 1
+        while True:
+            middle = next_guess(low, high)
+            if target == middle:
+                return depth
+            if target < middle:
+                high = middle - 1
+            else:
+                low = middle + 1
+            depth += 1
+
+
+@lru_cache(maxsize=16)
+def get_table(low, high):
+    return DecisionTable(low, high)
+
+
+def par(game):
+    return get_table(*game.range).par(game.target)
+
+
+def hint(game):
+    """Remaining interval and optimal next guess for a game.
+
+    Par is only reported once the game is over, since it narrows down
+    where the target sits.
+    """
+    return {
+        'low': game.low,
+        'high': game.high,
+        'remaining': game.high - game.low + 1,
+        'next_guess': next_guess(game.low, game.high),
+        'guesses': len(game.guesses),
+        'par': par(game) if game.finished else None,
+    }
@@ -0,0 +1,62 @@
+from array import array
+
+from app.sessions import MAX_GUESSES
+
+# One bucket per possible guess count, so every count is reported exactly;
+# a game ends after MAX_GUESSES guesses
+HISTOGRAM_SIZE = MAX_GUESSES + 1
+
+
+class PlayerStats:
+    """Running totals of a player's finished games.
+
+    Aggregates are updated per game instead of recomputed from history,
+    and the guess-count distribution is a histogram that only grows up to
+    the largest count seen, so memory does not depend on games played.
+    """
+
+    __slots__ = ('games', 'total', 'best', 'last', 'histogram')
+
+    def __init__(self):
+        self.games = 0
+        self.total = 0
+        self.best = None
+        self.last = None
+        self.histogram = array('I')
+
+    def add(self, guesses):
+        self.games += 1
+        self.total += guesses
+        self.last = guesses
+        if self.best is None or guesses < self.best:
+            self.best = guesses
+        bucket = min(guesses, HISTOGRAM_SIZE - 1)
+        if bucket >= len(self.histogram):
+            self.histogram.extend([0] * (bucket + 1 - len(self.histogram)))
+        self.histogram[bucket] += 1
+
+    def distribution(self):
+        return {count: games for count, games in enumerate(self.histogram) if games}
+
+    def dump(self):
+        return [self.games, self.total, self.best, self.last, self.histogram.tolist()]
+
+    @classmethod
+    def load(cls, state):
+        stats = cls()
+        stats.games, stats.total, stats.best, stats.last, histogram = state
+        stats.histogram.extend(histogram)
+        return stats
+
+    def to_dict(self):
+        return stats_dict(self.games, self.total, self.best, self.last, self.distribution())
+
+
+def stats_dict(games, total, best, last, distribution):
+    return {
+        'games': games,
+        'best': best,
+        'last': last,
+        'mean': total / games if games else None,
+        'distribution': distribution,
+    }
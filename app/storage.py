@@ -0,0 +1,679 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from app.leaderboard import Leaderboard
+from app.locks import LockStripes
+from app.names import NameIndex
+from app.stats import HISTOGRAM_SIZE, PlayerStats, stats_dict
+
+
+class Storage:
+    """Interface for player and score storage used by app.game."""
+
+    # True when other processes can write to the same data
+    shared = False
+
+    def add_player(self, player_name):
+        raise NotImplementedError
+
+    def has_player(self, player_name):
+        raise NotImplementedError
+
+    def add_guess(self, player_name, guess):
+        raise NotImplementedError
+
+    def get_guesses(self, player_name):
+        raise NotImplementedError
+
+    def clear_guesses(self, player_name):
+        """Drop the player's pending guesses, as a new game starts."""
+        raise NotImplementedError
+
+    def record_score(self, player_name, expected_guesses=None, score=None, keep_guesses=False):
+        """Store the number of pending guesses as the score and clear them.
+
+        With ``expected_guesses`` the score is only recorded if that is
+        still the pending count. ``score`` is the guess count of the game
+        that was won, recorded instead of the pending count, and
+        ``keep_guesses`` leaves the pending guesses alone. Returns the
+        score, or None if nothing was recorded.
+        """
+        raise NotImplementedError
+
+    def delete_player(self, player_name):
+        """Remove the player and their score; False if they did not exist."""
+        raise NotImplementedError
+
+    def rename_player(self, old_name, new_name):
+        """Move a player, with their score and stats, to a new name.
+
+        Fails (returns False) if ``old_name`` is gone or ``new_name`` is taken.
+        """
+        raise NotImplementedError
+
+    def get_players(self):
+        raise NotImplementedError
+
+    def search_players(self, limit, prefix=None, query=None, after=None):
+        """Up to ``limit`` names starting with ``prefix`` or containing ``query``.
+
+        Case-insensitive, ordered by lowercased name; ``after`` is the last
+        name of the previous page.
+        """
+        raise NotImplementedError
+
+    def get_scores(self):
+        raise NotImplementedError
+
+    def iter_players(self):
+        """Yield {'name', 'guesses', 'score'} records one player at a time."""
+        raise NotImplementedError
+
+    def bulk_import(self, records):
+        """Create or update many players at once, all or nothing.
+
+        Each record has a ``name`` and optionally ``guesses`` (replacing the
+        pending guesses) and ``score``. Returns (created, updated) counts.
+        """
+        raise NotImplementedError
+
+    def get_record(self, player_name):
+        """Everything stored for one player, or None.
+
+        A dict with ``name``, ``guesses``, ``score`` and ``stats`` (in
+        PlayerStats.dump() form, or None), for moving players between
+        stores with put_record.
+        """
+        raise NotImplementedError
+
+    def put_record(self, record):
+        """Create or replace a player from a get_record() dict."""
+        raise NotImplementedError
+
+    def get_leaderboard(self, limit, after=None, offset=0):
+        """Ranked (name, score) pairs, fewest guesses first."""
+        raise NotImplementedError
+
+    def count_ranked_before(self, score, player_name):
+        """Number of scores ranked ahead of the (score, player_name) key."""
+        raise NotImplementedError
+
+    def get_score(self, player_name):
+        raise NotImplementedError
+
+    def get_rank(self, player_name):
+        raise NotImplementedError
+
+    def count_players(self):
+        raise NotImplementedError
+
+    def count_scores(self):
+        raise NotImplementedError
+
+    def get_stats(self, player_name):
+        """Aggregates over every game the player has finished, or None."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryStorage(Storage):
+    """Per-process dictionaries; fast, but not shared between workers.
+
+    Each player is guarded by a lock stripe, so requests for different
+    players proceed in parallel; the shared leaderboard and the name index
+    have their own locks, always taken after a player's stripe.
+    """
+
+    def __init__(self):
+        self.locks = LockStripes()
+        self.board_lock = threading.RLock()
+        self.players = {}
+        self.scores = {}
+        self.leaderboard = Leaderboard()
+        self.names_lock = threading.Lock()
+        self.names = NameIndex()
+        self.stats = {}
+
+    def add_player(self, player_name):
+        with self.locks(player_name):
+            if player_name not in self.players:
+                self.players[player_name] = {'guesses': []}
+                with self.names_lock:
+                    self.names.add(player_name)
+
+    def has_player(self, player_name):
+        return player_name in self.players
+
+    def add_guess(self, player_name, guess):
+        with self.locks(player_name):
+            if player_name in self.players:
+                self.players[player_name]['guesses'].append(guess)
+
+    def get_guesses(self, player_name):
+        with self.locks(player_name):
+            player = self.players.get(player_name)
+            return list(player['guesses']) if player else None
+
+    def clear_guesses(self, player_name):
+        with self.locks(player_name):
+            if player_name in self.players:
+                self.players[player_name]['guesses'] = []
+
+    def record_score(self, player_name, expected_guesses=None, score=None, keep_guesses=False):
+        with self.locks(player_name):
+            player = self.players.get(player_name)
+            if player is None:
+                return None
+            if expected_guesses is not None and len(player['guesses']) != expected_guesses:
+                return None
+            if score is None:
+                score = len(player['guesses'])
+            # Clear the guesses for the next game
+            if not keep_guesses:
+                player['guesses'] = []
+            stats = self.stats.get(player_name)
+            if stats is None:
+                stats = self.stats[player_name] = PlayerStats()
+            stats.add(score)
+            with self.board_lock:
+                # Always update with the latest game's guesses
+                self.scores[player_name] = score
+                self.leaderboard.update(player_name, score)
+            return score
+
+    def delete_player(self, player_name):
+        with self.locks(player_name):
+            if self.players.pop(player_name, None) is None:
+                return False
+            with self.names_lock:
+                self.names.remove(player_name)
+            self.stats.pop(player_name, None)
+            with self.board_lock:
+                if self.scores.pop(player_name, None) is not None:
+                    self.leaderboard.remove(player_name)
+            return True
+
+    def rename_player(self, old_name, new_name):
+        with self.locks.many(old_name, new_name):
+            if old_name not in self.players or new_name in self.players:
+                return False
+            self.players[new_name] = self.players.pop(old_name)
+            with self.names_lock:
+                self.names.rename(old_name, new_name)
+            if old_name in self.stats:
+                self.stats[new_name] = self.stats.pop(old_name)
+            with self.board_lock:
+                score = self.scores.pop(old_name, None)
+                if score is not None:
+                    self.scores[new_name] = score
+                    self.leaderboard.remove(old_name)
+                    self.leaderboard.update(new_name, score)
+            return True
+
+    def get_players(self):
+        # Copies, so callers can serialize them while other requests write
+        return {name: {'guesses': list(player['guesses'])} for name, player in list(self.players.items())}
+
+    def search_players(self, limit, prefix=None, query=None, after=None):
+        with self.names_lock:
+            if query:
+                return self.names.search(query, limit, after)
+            return self.names.prefix(prefix or '', limit, after)
+
+    def get_scores(self):
+        with self.board_lock:
+            return dict(self.scores)
+
+    def iter_players(self):
+        for name in list(self.players):
+            with self.locks(name):
+                player = self.players.get(name)
+                if player is None:
+                    continue
+                record = {'name': name, 'guesses': list(player['guesses']), 'score': self.scores.get(name)}
+            yield record
+
+    def bulk_import(self, records):
+        added, updated = [], 0
+        with self.locks.all(), self.board_lock, self.names_lock:
+            for record in records:
+                name = record['name']
+                player = self.players.get(name)
+                if player is None:
+                    player = self.players[name] = {'guesses': []}
+                    added.append(name)
+                else:
+                    updated += 1
+                if record.get('guesses') is not None:
+                    player['guesses'] = list(record['guesses'])
+                if record.get('score') is not None:
+                    self.scores[name] = record['score']
+                    self.leaderboard.update(name, record['score'])
+            self.names.add_many(added)
+        return len(added), updated
+
+    def get_record(self, player_name):
+        with self.locks(player_name):
+            player = self.players.get(player_name)
+            if player is None:
+                return None
+            stats = self.stats.get(player_name)
+            return {'name': player_name, 'guesses': list(player['guesses']), 'score': self.scores.get(player_name),
+                    'stats': stats.dump() if stats else None}
+
+    def put_record(self, record):
+        name = record['name']
+        with self.locks(name):
+            if name not in self.players:
+                with self.names_lock:
+                    self.names.add(name)
+            self.players[name] = {'guesses': list(record['guesses'])}
+            if record['stats'] is not None:
+                self.stats[name] = PlayerStats.load(record['stats'])
+            else:
+                self.stats.pop(name, None)
+            with self.board_lock:
+                if record['score'] is not None:
+                    self.scores[name] = record['score']
+                    self.leaderboard.update(name, record['score'])
+                elif self.scores.pop(name, None) is not None:
+                    self.leaderboard.remove(name)
+
+    def get_leaderboard(self, limit, after=None, offset=0):
+        with self.board_lock:
+            return self.leaderboard.top(limit, after, offset)
+
+    def count_ranked_before(self, score, player_name):
+        with self.board_lock:
+            return self.leaderboard.count_before(score, player_name)
+
+    def get_score(self, player_name):
+        return self.scores.get(player_name)
+
+    def get_rank(self, player_name):
+        with self.board_lock:
+            return self.leaderboard.rank(player_name)
+
+    def count_players(self):
+        return len(self.players)
+
+    def count_scores(self):
+        return len(self.leaderboard)
+
+    def get_stats(self, player_name):
+        with self.locks(player_name):
+            stats = self.stats.get(player_name)
+            return stats.to_dict() if stats else None
+
+    def clear(self):
+        with self.locks.all(), self.board_lock, self.names_lock:
+            self.players.clear()
+            self.names.clear()
+            self.scores.clear()
+            self.leaderboard.clear()
+            self.stats.clear()
+
+    def dump(self):
+        """Copy of everything stored, as JSON-ready data for snapshots."""
+        with self.locks.all(), self.board_lock:
+            return {
+                'players': {name: list(player['guesses']) for name, player in self.players.items()},
+                'scores': dict(self.scores),
+                'stats': {name: stats.dump() for name, stats in self.stats.items()},
+            }
+
+    def load(self, state):
+        """Replace everything stored with a dump()."""
+        with self.locks.all(), self.board_lock, self.names_lock:
+            self.players = {name: {'guesses': guesses} for name, guesses in state['players'].items()}
+            self.names.clear()
+            self.names.add_many(self.players)
+            self.scores = dict(state['scores'])
+            self.leaderboard.clear()
+            for name, score in self.scores.items():
+                self.leaderboard.update(name, score)
+            self.stats = {name: PlayerStats.load(stats) for name, stats in state['stats'].items()}
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS players (name TEXT PRIMARY KEY);
+CREATE INDEX IF NOT EXISTS players_search ON players (name COLLATE NOCASE, name);
+CREATE TABLE IF NOT EXISTS guesses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    player TEXT NOT NULL,
+    guess INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS guesses_player ON guesses (player);
+CREATE TABLE IF NOT EXISTS scores (player TEXT PRIMARY KEY, score INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS scores_rank ON scores (score, player);
+CREATE TABLE IF NOT EXISTS player_stats (
+    player TEXT PRIMARY KEY,
+    games INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    best INTEGER NOT NULL,
+    last INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS score_histogram (
+    player TEXT NOT NULL,
+    guesses INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    PRIMARY KEY (player, guesses)
+) WITHOUT ROWID;
+'''
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache can reuse the prepared form on every call
+INSERT_PLAYER = 'INSERT OR IGNORE INTO players (name) VALUES (?)'
+SELECT_PLAYER = 'SELECT 1 FROM players WHERE name = ?'
+INSERT_GUESS = 'INSERT INTO guesses (player, guess) SELECT name, ? FROM players WHERE name = ?'
+SELECT_GUESSES = 'SELECT guess FROM guesses WHERE player = ? ORDER BY id'
+COUNT_GUESSES = 'SELECT COUNT(*) FROM guesses WHERE player = ?'
+UPSERT_SCORE = 'INSERT OR REPLACE INTO scores (player, score) VALUES (?, ?)'
+DELETE_GUESSES = 'DELETE FROM guesses WHERE player = ?'
+DELETE_PLAYER = 'DELETE FROM players WHERE name = ?'
+DELETE_SCORE = 'DELETE FROM scores WHERE player = ?'
+SELECT_ALL_PLAYERS = 'SELECT name FROM players ORDER BY name'
+# LIKE is case-insensitive and served by players_search for prefixes
+SEARCH_PLAYERS = ("SELECT name FROM players WHERE name LIKE ? ESCAPE '\\' "
+                  'ORDER BY name COLLATE NOCASE, name LIMIT ?')
+SEARCH_PLAYERS_AFTER = ("SELECT name FROM players WHERE name LIKE ? ESCAPE '\\' "
+                        'AND (name COLLATE NOCASE, name) > (?, ?) ORDER BY name COLLATE NOCASE, name LIMIT ?')
+SELECT_ALL_GUESSES = 'SELECT player, guess FROM guesses ORDER BY id'
+SELECT_ALL_SCORES = 'SELECT player, score FROM scores'
+SELECT_SCORE = 'SELECT score FROM scores WHERE player = ?'
+SELECT_TOP = 'SELECT player, score FROM scores ORDER BY score, player LIMIT ? OFFSET ?'
+SELECT_TOP_AFTER = ('SELECT player, score FROM scores WHERE (score, player) > (?, ?) '
+                    'ORDER BY score, player LIMIT ?')
+COUNT_RANKED_BEFORE = 'SELECT COUNT(*) FROM scores WHERE (score, player) < (?, ?)'
+COUNT_SCORES = 'SELECT COUNT(*) FROM scores'
+COUNT_PLAYERS = 'SELECT COUNT(*) FROM players'
+EXPORT_PLAYERS = (
+    'SELECT p.name, '
+    '(SELECT json_group_array(guess) FROM (SELECT guess FROM guesses WHERE player = p.name ORDER BY id)), '
+    's.score FROM players p LEFT JOIN scores s ON s.player = p.name ORDER BY p.name'
+)
+IMPORT_GUESS = 'INSERT INTO guesses (player, guess) VALUES (?, ?)'
+UPSERT_STATS = ('INSERT INTO player_stats (player, games, total, best, last) VALUES (?, 1, ?, ?, ?) '
+                'ON CONFLICT (player) DO UPDATE SET games = games + 1, total = total + excluded.total, '
+                'best = MIN(best, excluded.best), last = excluded.last')
+UPSERT_HISTOGRAM = ('INSERT INTO score_histogram (player, guesses, games) VALUES (?, ?, 1) '
+                    'ON CONFLICT (player, guesses) DO UPDATE SET games = games + 1')
+SELECT_STATS = 'SELECT games, total, best, last FROM player_stats WHERE player = ?'
+SELECT_HISTOGRAM = 'SELECT guesses, games FROM score_histogram WHERE player = ? ORDER BY guesses'
+INSERT_STATS = 'INSERT INTO player_stats (player, games, total, best, last) VALUES (?, ?, ?, ?, ?)'
+INSERT_HISTOGRAM = 'INSERT INTO score_histogram (player, guesses, games) VALUES (?, ?, ?)'
+DELETE_STATS = 'DELETE FROM player_stats WHERE player = ?'
+DELETE_HISTOGRAM = 'DELETE FROM score_histogram WHERE player = ?'
+RENAME_PLAYER = (
+    'UPDATE players SET name = ? WHERE name = ?',
+    'UPDATE guesses SET player = ? WHERE player = ?',
+    'UPDATE player_stats SET player = ? WHERE player = ?',
+    'UPDATE score_histogram SET player = ? WHERE player = ?',
+)
+RENAME_SCORE = 'UPDATE scores SET player = ? WHERE player = ?'
+
+
+class SQLiteStorage(Storage):
+    """SQLite database in WAL mode, shared by every worker process.
+
+    Connections are pooled per process and re-created after a fork, so a
+    gunicorn master can open the store before spawning workers.
+    """
+
+    shared = True
+
+    def __init__(self, path, pool_size=8, timeout=5.0):
+        self.path = path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=%d' % int(self.timeout * 1000))
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pool = queue.LifoQueue(self.pool_size)
+        pool = self._pool
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def add_player(self, player_name):
+        with self.connection() as conn:
+            conn.execute(INSERT_PLAYER, (player_name,))
+
+    def has_player(self, player_name):
+        with self.connection() as conn:
+            return conn.execute(SELECT_PLAYER, (player_name,)).fetchone() is not None
+
+    def add_guess(self, player_name, guess):
+        with self.connection() as conn:
+            conn.execute(INSERT_GUESS, (guess, player_name))
+
+    def get_guesses(self, player_name):
+        with self.connection() as conn:
+            if conn.execute(SELECT_PLAYER, (player_name,)).fetchone() is None:
+                return None
+            return [row[0] for row in conn.execute(SELECT_GUESSES, (player_name,))]
+
+    def clear_guesses(self, player_name):
+        with self.connection() as conn:
+            conn.execute(DELETE_GUESSES, (player_name,))
+
+    def record_score(self, player_name, expected_guesses=None, score=None, keep_guesses=False):
+        with self.transaction() as conn:
+            if conn.execute(SELECT_PLAYER, (player_name,)).fetchone() is None:
+                return None
+            pending = conn.execute(COUNT_GUESSES, (player_name,)).fetchone()[0]
+            if expected_guesses is not None and pending != expected_guesses:
+                return None
+            if score is None:
+                score = pending
+            conn.execute(UPSERT_SCORE, (player_name, score))
+            if not keep_guesses:
+                conn.execute(DELETE_GUESSES, (player_name,))
+            conn.execute(UPSERT_STATS, (player_name, score, score, score))
+            conn.execute(UPSERT_HISTOGRAM, (player_name, min(score, HISTOGRAM_SIZE - 1)))
+            return score
+
+    def delete_player(self, player_name):
+        with self.transaction() as conn:
+            conn.execute(DELETE_GUESSES, (player_name,))
+            conn.execute(DELETE_STATS, (player_name,))
+            conn.execute(DELETE_HISTOGRAM, (player_name,))
+            conn.execute(DELETE_SCORE, (player_name,))
+            return conn.execute(DELETE_PLAYER, (player_name,)).rowcount > 0
+
+    def rename_player(self, old_name, new_name):
+        with self.transaction() as conn:
+            if (conn.execute(SELECT_PLAYER, (old_name,)).fetchone() is None
+                    or conn.execute(SELECT_PLAYER, (new_name,)).fetchone() is not None):
+                return False
+            for statement in RENAME_PLAYER:
+                conn.execute(statement, (new_name, old_name))
+            conn.execute(RENAME_SCORE, (new_name, old_name))
+            return True
+
+    def get_players(self):
+        with self.connection() as conn:
+            players = {name: {'guesses': []} for name, in conn.execute(SELECT_ALL_PLAYERS)}
+            for name, guess in conn.execute(SELECT_ALL_GUESSES):
+                if name in players:
+                    players[name]['guesses'].append(guess)
+            return players
+
+    def search_players(self, limit, prefix=None, query=None, after=None):
+        # Substring queries scan the whole index; only prefixes use it
+        pattern = ('%' + like_escape(query) if query else like_escape(prefix or '')) + '%'
+        with self.connection() as conn:
+            if after is not None:
+                rows = conn.execute(SEARCH_PLAYERS_AFTER, (pattern, after, after, limit))
+            else:
+                rows = conn.execute(SEARCH_PLAYERS, (pattern, limit))
+            return [name for name, in rows]
+
+    def get_scores(self):
+        with self.connection() as conn:
+            return dict(conn.execute(SELECT_ALL_SCORES).fetchall())
+
+    def iter_players(self):
+        # The cursor streams rows, so memory does not grow with the table
+        with self.connection() as conn:
+            for name, guesses, score in conn.execute(EXPORT_PLAYERS):
+                yield {'name': name, 'guesses': json.loads(guesses), 'score': score}
+
+    def bulk_import(self, records):
+        created = updated = 0
+        with self.transaction() as conn:
+            for record in records:
+                name = record['name']
+                if conn.execute(INSERT_PLAYER, (name,)).rowcount:
+                    created += 1
+                else:
+                    updated += 1
+                if record.get('guesses') is not None:
+                    conn.execute(DELETE_GUESSES, (name,))
+                    conn.executemany(IMPORT_GUESS, ((name, guess) for guess in record['guesses']))
+                if record.get('score') is not None:
+                    conn.execute(UPSERT_SCORE, (name, record['score']))
+        return created, updated
+
+    def get_record(self, player_name):
+        with self.connection() as conn:
+            if conn.execute(SELECT_PLAYER, (player_name,)).fetchone() is None:
+                return None
+            guesses = [row[0] for row in conn.execute(SELECT_GUESSES, (player_name,))]
+            score = conn.execute(SELECT_SCORE, (player_name,)).fetchone()
+            stats = conn.execute(SELECT_STATS, (player_name,)).fetchone()
+            if stats is not None:
+                distribution = dict(conn.execute(SELECT_HISTOGRAM, (player_name,)).fetchall())
+                histogram = [distribution.get(count, 0) for count in range(max(distribution, default=-1) + 1)]
+                stats = [*stats, histogram]
+            return {'name': player_name, 'guesses': guesses, 'score': score[0] if score else None, 'stats': stats}
+
+    def put_record(self, record):
+        name = record['name']
+        with self.transaction() as conn:
+            conn.execute(INSERT_PLAYER, (name,))
+            conn.execute(DELETE_GUESSES, (name,))
+            conn.executemany(IMPORT_GUESS, ((name, guess) for guess in record['guesses']))
+            if record['score'] is not None:
+                conn.execute(UPSERT_SCORE, (name, record['score']))
+            else:
+                conn.execute(DELETE_SCORE, (name,))
+            conn.execute(DELETE_STATS, (name,))
+            conn.execute(DELETE_HISTOGRAM, (name,))
+            if record['stats'] is not None:
+                games, total, best, last, histogram = record['stats']
+                conn.execute(INSERT_STATS, (name, games, total, best, last))
+                conn.executemany(INSERT_HISTOGRAM, ((name, count, games) for count, games in enumerate(histogram) if games))
+
+    def get_leaderboard(self, limit, after=None, offset=0):
+        with self.connection() as conn:
+            if after:
+                rows = conn.execute(SELECT_TOP_AFTER, (after[0], after[1], limit))
+            else:
+                rows = conn.execute(SELECT_TOP, (limit, offset))
+            return rows.fetchall()
+
+    def get_score(self, player_name):
+        with self.connection() as conn:
+            row = conn.execute(SELECT_SCORE, (player_name,)).fetchone()
+            return row[0] if row else None
+
+    def get_rank(self, player_name):
+        with self.connection() as conn:
+            row = conn.execute(SELECT_SCORE, (player_name,)).fetchone()
+            if row is None:
+                return None
+            return conn.execute(COUNT_RANKED_BEFORE, (row[0], player_name)).fetchone()[0] + 1
+
+    def count_ranked_before(self, score, player_name):
+        with self.connection() as conn:
+            return conn.execute(COUNT_RANKED_BEFORE, (score, player_name)).fetchone()[0]
+
+    def count_players(self):
+        with self.connection() as conn:
+            return conn.execute(COUNT_PLAYERS).fetchone()[0]
+
+    def count_scores(self):
+        with self.connection() as conn:
+            return conn.execute(COUNT_SCORES).fetchone()[0]
+
+    def get_stats(self, player_name):
+        with self.connection() as conn:
+            row = conn.execute(SELECT_STATS, (player_name,)).fetchone()
+            if row is None:
+                return None
+            distribution = dict(conn.execute(SELECT_HISTOGRAM, (player_name,)).fetchall())
+            return stats_dict(*row, distribution)
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM guesses')
+            conn.execute('DELETE FROM player_stats')
+            conn.execute('DELETE FROM score_histogram')
+            conn.execute('DELETE FROM scores')
+            conn.execute('DELETE FROM players')
+
+
+def like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def storage_from_url(url):
+    """Build a storage backend from ``memory://`` or ``sqlite:///path``.
+
+    A comma-separated list of URLs shards players across them, and
+    ``shard://:<authkey>@<host>:<port>`` is a shard process (see app.shards).
+    """
+    if url and (',' in url or url.startswith('shard://')):
+        # A lone shard process is a ring of one, so it can follow shards
+        # added later
+        from app.shards import ShardedStorage, remote_from_url
+        parts = [part.strip() for part in url.split(',')]
+        return ShardedStorage([remote_from_url(part) if part.startswith('shard://') else storage_from_url(part)
+                               for part in parts])
+    if not url or url == 'memory://':
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url[len('sqlite:///'):])
+    raise ValueError('Unsupported storage URL: %s' % url)
@@ -0,0 +1,96 @@
+import random
+import threading
+from array import array
+from collections import deque
+
+# Selectable game ranges
+DIFFICULTIES = {
+    'easy': (1, 100),
+    'hard': (1, 10 ** 6),
+    'extreme': (1, 10 ** 9),
+}
+
+DEFAULT_DIFFICULTY = 'easy'
+
+# Range of the default difficulty unless GAME_RANGE replaces it
+DEFAULT_RANGE = DIFFICULTIES[DEFAULT_DIFFICULTY]
+
+# Targets generated per refill, and the pool size that triggers one
+BATCH_SIZE = 4096
+LOW_WATER = 1024
+
+
+def draw_batch(rng, low, high, size):
+    """Draw about ``size`` uniform targets in ``low``..``high`` at once.
+
+    One randbytes call supplies the raw words for the whole batch; values
+    outside the range after masking are rejected, which keeps the result
+    uniform.
+    """
+    span = high - low + 1
+    mask = (1 << (span - 1).bit_length()) - 1
+    words = array('I' if mask < 1 << 32 else 'Q')
+    words.frombytes(rng.randbytes(size * words.itemsize))
+    return [low + word for word in (word & mask for word in words) if word < span]
+
+
+class TargetPool:
+    """Pre-generated targets for one range.
+
+    Games take targets with a lock-free deque pop; when the pool runs low a
+    background thread refills it from the pool's own RNG, so a burst of new
+    games neither waits on generation nor contends on the global ``random``.
+    """
+
+    def __init__(self, low, high, batch_size=BATCH_SIZE, low_water=LOW_WATER):
+        self.low = low
+        self.high = high
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self._rng = random.Random()
+        self._targets = deque()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+
+    def __len__(self):
+        return len(self._targets)
+
+    def refill(self):
+        with self._refill_lock:
+            self._targets.extend(draw_batch(self._rng, self.low, self.high, self.batch_size))
+            self._refilling = False
+
+    def _refill_in_background(self):
+        if not self._refilling:
+            self._refilling = True
+            threading.Thread(target=self.refill, daemon=True).start()
+
+    def take(self):
+        while True:
+            try:
+                target = self._targets.popleft()
+            except IndexError:
+                self.refill()
+                continue
+            if len(self._targets) < self.low_water:
+                self._refill_in_background()
+            return target
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(low, high):
+    pool = _pools.get((low, high))
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault((low, high), TargetPool(low, high))
+    return pool
+
+
+def new_target(low, high, seed=None):
+    """A target for a new game; seeded games always get the same one."""
+    if seed is not None:
+        return random.Random(seed).randint(low, high)
+    return get_pool(low, high).take()
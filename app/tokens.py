@@ -0,0 +1,85 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from itsdangerous import BadData, URLSafeTimedSerializer
+
+from app.sessions import GameSession, IDLE_TIMEOUT
+
+# Tokens older than this are rejected, like idle server-side games
+TOKEN_MAX_AGE = IDLE_TIMEOUT
+
+# Spent tokens remembered per process to refuse replays
+SPENT_TOKENS = 100000
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class GameTokens:
+    """Stateless games carried in signed tokens.
+
+    The token holds the game's range, the interval still open, the guess
+    count and the target encrypted with a keystream derived from the app's
+    secret key and a per-game nonce, then the whole payload is signed with
+    Flask's itsdangerous serializer. Any worker holding the secret key can
+    continue the game without looking anything up.
+
+    Every guess issues a new token and spends the old one. Spent tokens are
+    remembered in a bounded per-process set, so replaying an earlier state
+    is refused by the worker that saw it; across workers the expiry is what
+    bounds replays.
+    """
+
+    def __init__(self, secret_key, max_age=TOKEN_MAX_AGE, spent_size=SPENT_TOKENS):
+        secret = secret_key.encode('utf-8') if isinstance(secret_key, str) else secret_key
+        self.serializer = URLSafeTimedSerializer(secret, salt='game-token')
+        self.key = hashlib.sha256(secret + b'game-target').digest()
+        self.max_age = max_age
+        self.spent_size = spent_size
+        self._spent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _keystream(self, nonce):
+        return int.from_bytes(hmac.new(self.key, nonce.encode('ascii'), hashlib.sha256).digest()[:8], 'big')
+
+    def issue(self, game, guesses=0):
+        """Token for ``game``'s current state, after ``guesses`` guesses."""
+        return self.serializer.dumps({
+            'n': game.id,
+            't': game.target ^ self._keystream(game.id),
+            'r': list(game.range),
+            'i': [game.low, game.high],
+            'c': guesses,
+            'p': game.player,
+        })
+
+    def new_game(self, target, low, high, player=None):
+        return GameSession(secrets.token_hex(8), target, player, low, high)
+
+    def load(self, token):
+        """Return (game, guesses) for a token, spending it.
+
+        Raises InvalidToken if the token is forged, expired or already used.
+        """
+        try:
+            data = self.serializer.loads(token, max_age=self.max_age)
+        except BadData as e:
+            raise InvalidToken('Invalid or expired game token') from e
+        key = (data['n'], data['c'])
+        now = time.monotonic()
+        with self._lock:
+            while self._spent and next(iter(self._spent.values())) < now - self.max_age:
+                self._spent.popitem(last=False)
+            if key in self._spent:
+                raise InvalidToken('Game token already used')
+            self._spent[key] = now
+            if len(self._spent) > self.spent_size:
+                self._spent.popitem(last=False)
+        game = GameSession(data['n'], data['t'] ^ self._keystream(data['n']), data['p'], *data['r'])
+        game.low, game.high = data['i']
+        return game, data['c']
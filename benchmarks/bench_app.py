@@ -0,0 +1,286 @@
+"""Load benchmark for the game endpoints.
+
+Simulates players doing full games (POST /game, binary-search guesses on
+/guess, then /scores) against create_app(), either in-process through
+Flask's test client or over HTTP through a real threaded WSGI server, and
+reports throughput, per-route p50/p99 latency and memory per player.
+
+Latency is measured twice: the wall-clock time the simulated browser
+waits, and the CPU time the app spends on the request. With many threads
+on few cores the wall-clock tail is mostly time spent waiting for the GIL
+and the scheduler, so --check compares the CPU time, which only changes
+when the code does.
+
+    python benchmarks/bench_app.py --players 500 --concurrency 16 --mode wsgi
+    python benchmarks/bench_app.py --update-baseline
+    python benchmarks/bench_app.py --check     # exit 1 on regression
+"""
+import argparse
+import gc
+import http.cookiejar
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, game  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Allowed slowdown against the baseline before --check fails
+TOLERANCE = 0.30
+
+RANGE = re.compile(rb'between (\d+) - (\d+)')
+
+
+class TestClientSession:
+    """One player's browser, in-process through Flask's test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.data
+
+
+class HTTPSession:
+    """One player's browser over real HTTP, with its own cookie jar."""
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self.NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode('ascii') if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+class CPUTimer:
+    """WSGI middleware recording each request's CPU time in the app, per route."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.lock = threading.Lock()
+        self.times = defaultdict(list)
+
+    def __call__(self, environ, start_response):
+        start = time.thread_time()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            elapsed = time.thread_time() - start
+            with self.lock:
+                self.times[f"{environ['REQUEST_METHOD']} {environ['PATH_INFO']}"].append(elapsed)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+
+    def timed(self, session, route, method, path, data=None):
+        start = time.perf_counter()
+        status, body = session.request(method, path, data)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[route].append(elapsed)
+        if status >= 400:
+            raise RuntimeError(f'{method} {path} returned {status}')
+        return body
+
+
+def play_game(session, recorder, name):
+    recorder.timed(session, 'POST /game', 'POST', '/game', {'player_name': name})
+    page = recorder.timed(session, 'GET /game', 'GET', '/game')
+    low, high = (int(value) for value in RANGE.search(page).groups())
+    guesses = 0
+    while True:
+        guess = (low + high) // 2
+        guesses += 1
+        body = recorder.timed(session, 'POST /guess', 'POST', '/guess', {'guess': guess})
+        if b'guessed it right' in body:
+            break
+        page = recorder.timed(session, 'GET /game', 'GET', '/game')
+        if b'Too low!' in page:
+            low = guess + 1
+        elif b'Too High!' in page:
+            high = guess - 1
+        else:
+            raise RuntimeError('No feedback for guess %d' % guess)
+    recorder.timed(session, 'GET /scores', 'GET', '/scores')
+    return guesses
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def memory_per_player(app, players):
+    """Bytes retained per finished player, measured in a separate pass."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    recorder = Recorder()
+    for index in range(players):
+        play_game(TestClientSession(app), recorder, f'memory-{index}')
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return retained / players
+
+
+def serve(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(players=200, concurrency=8, mode='testclient', memory_players=200):
+    app = create_app()
+    timer = CPUTimer(app.wsgi_app)
+    app.wsgi_app = timer
+    game.storage.clear()
+    game.games.clear()
+    server = None
+    if mode == 'wsgi':
+        server = serve(app)
+        base_url = 'http://127.0.0.1:%d' % server.server_port
+
+        def new_session():
+            return HTTPSession(base_url)
+    else:
+        def new_session():
+            return TestClientSession(app)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            guesses = list(pool.map(lambda index: play_game(new_session(), recorder, f'player-{index}'),
+                                    range(players)))
+    finally:
+        if server is not None:
+            server.shutdown()
+    elapsed = time.perf_counter() - start
+
+    requests = sum(len(values) for values in recorder.latencies.values())
+    routes = {
+        route: {
+            'count': len(values),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'cpu_p50_ms': percentile(timer.times[route], 0.50) * 1000,
+            'cpu_p99_ms': percentile(timer.times[route], 0.99) * 1000,
+        }
+        for route, values in sorted(recorder.latencies.items())
+    }
+    # Not part of the memory a player costs
+    app.wsgi_app = timer.wsgi_app
+    return {
+        'mode': mode,
+        'players': players,
+        'concurrency': concurrency,
+        'games_per_second': players / elapsed,
+        'requests_per_second': requests / elapsed,
+        'guesses_per_game': statistics.mean(guesses),
+        'routes': routes,
+        'memory_per_player_bytes': memory_per_player(app, memory_players) if memory_players else None,
+    }
+
+
+def regressions(result, baseline, tolerance=TOLERANCE):
+    found = []
+    if result['requests_per_second'] < baseline['requests_per_second'] * (1 - tolerance):
+        found.append('throughput %.0f req/s < baseline %.0f req/s'
+                     % (result['requests_per_second'], baseline['requests_per_second']))
+    for route, stats in result['routes'].items():
+        expected = baseline['routes'].get(route)
+        if expected and stats['cpu_p99_ms'] > expected['cpu_p99_ms'] * (1 + tolerance):
+            found.append('%s CPU p99 %.2f ms > baseline %.2f ms'
+                         % (route, stats['cpu_p99_ms'], expected['cpu_p99_ms']))
+    if baseline.get('memory_per_player_bytes') and result['memory_per_player_bytes'] is not None:
+        if result['memory_per_player_bytes'] > baseline['memory_per_player_bytes'] * (1 + tolerance):
+            found.append('memory %.0f B/player > baseline %.0f B/player'
+                         % (result['memory_per_player_bytes'], baseline['memory_per_player_bytes']))
+    return found
+
+
+def report(result):
+    print(f"{result['mode']}: {result['players']} players, concurrency {result['concurrency']}")
+    print(f"  {result['games_per_second']:.1f} games/s, {result['requests_per_second']:.1f} requests/s, "
+          f"{result['guesses_per_game']:.2f} guesses/game")
+    for route, stats in result['routes'].items():
+        print(f"  {route:<12} n={stats['count']:<6} p50={stats['p50_ms']:.2f} ms  p99={stats['p99_ms']:.2f} ms  "
+              f"CPU p50={stats['cpu_p50_ms']:.2f} ms  p99={stats['cpu_p99_ms']:.2f} ms")
+    if result['memory_per_player_bytes'] is not None:
+        print(f"  memory: {result['memory_per_player_bytes']:.0f} bytes/player")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=('testclient', 'wsgi'), default='testclient')
+    parser.add_argument('--memory-players', type=int, default=200)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit 1 if slower than the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    result = run(args.players, args.concurrency, args.mode, args.memory_players)
+    report(result)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if args.update_baseline:
+        baselines[args.mode] = result
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline for {args.mode} written to {args.baseline}')
+    elif args.check:
+        if args.mode not in baselines:
+            print(f'No {args.mode} baseline in {args.baseline}')
+            return 1
+        found = regressions(result, baselines[args.mode], args.tolerance)
+        for problem in found:
+            print('REGRESSION: ' + problem)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+function deleteScore(name) {
+    if (confirm('Are you sure you want to delete this player and their score?')) {
+        fetch('/scores/' + encodeURIComponent(name), {
+            method: 'DELETE'
+        })
+        .then(response => response.json())
+        .then(data => {
+            alert(data.message);
+            if (!window.EventSource) {
+                window.location.reload();
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Error deleting player');
+        });
+    }
+}
+
+function updateScore(name) {
+    if (confirm('Do you want to play a new game with this player?')) {
+        fetch('/scores/' + encodeURIComponent(name), {
+            method: 'PUT'
+        })
+        .then(response => response.json())
+        .then(data => {
+            alert(data.message);
+            window.location.href = '/game';
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Error updating player');
+        });
+    }
+}
+
+document.addEventListener('click', function (event) {
+    var button = event.target.closest('button[data-action]');
+    if (!button) {
+        return;
+    }
+    if (button.dataset.action === 'delete') {
+        deleteScore(button.dataset.name);
+    } else if (button.dataset.action === 'update') {
+        updateScore(button.dataset.name);
+    }
+});
+
+// Autocomplete player names from /players?prefix= and look up their rank
+(function () {
+    var form = document.querySelector('form.player-search');
+    if (!form) {
+        return;
+    }
+    var input = form.elements.name;
+    var list = document.getElementById('player-names');
+    var pending = null;
+    input.addEventListener('input', () => {
+        clearTimeout(pending);
+        if (!input.value) {
+            return;
+        }
+        pending = setTimeout(() => {
+            fetch(form.dataset.search + '?limit=10&prefix=' + encodeURIComponent(input.value))
+                .then(response => response.json())
+                .then(data => {
+                    list.replaceChildren(...data.players.map(name => {
+                        var option = document.createElement('option');
+                        option.value = name;
+                        return option;
+                    }));
+                });
+        }, 150);
+    });
+    form.addEventListener('submit', event => {
+        event.preventDefault();
+        fetch('/scores/' + encodeURIComponent(input.value))
+            .then(response => response.json())
+            .then(data => {
+                alert(data.error ? data.error : data.name + ': ' + data.score + ' guesses, rank ' + data.rank);
+            });
+    });
+})();
+
+// Keep the table live: apply rank changes pushed by /scores/stream
+function rowFor(table, name) {
+    return Array.from(table.querySelectorAll('tr[data-name]')).find(row => row.dataset.name === name);
+}
+
+function newRow(table, change) {
+    var row = document.createElement('tr');
+    row.dataset.name = change.name;
+    row.innerHTML = '<td></td><td class="score"></td><td>' +
+        '<button class="btn btn-small btn-red" data-action="delete">Delete</button> ' +
+        '<button class="btn btn-small btn-blue" data-action="update">Update</button></td>';
+    row.cells[0].textContent = change.name;
+    row.querySelectorAll('button').forEach(button => { button.dataset.name = change.name; });
+    return row;
+}
+
+function applyChange(table, change) {
+    var row = rowFor(table, change.name);
+    if (change.deleted) {
+        if (row) {
+            row.remove();
+        }
+        return;
+    }
+    var rows = Array.from(table.querySelectorAll('tr[data-name]')).filter(other => other !== row);
+    var position = change.rank - parseInt(table.dataset.firstRank, 10);
+    if (position < 0 || position > rows.length) {
+        if (row) {
+            row.remove();
+        }
+        return;
+    }
+    var empty = table.querySelector('tr.empty');
+    if (empty) {
+        empty.remove();
+    }
+    row = row || newRow(table, change);
+    row.querySelector('.score').textContent = change.score;
+    var before = rows[position];
+    (before ? before.parentNode : table.querySelector('tbody') || table).insertBefore(row, before || null);
+}
+
+(function () {
+    var table = document.querySelector('table.scores');
+    if (!table || !window.EventSource) {
+        return;
+    }
+    var source = new EventSource(table.dataset.stream);
+    source.addEventListener('scores', event => {
+        JSON.parse(event.data).forEach(change => applyChange(table, change));
+    });
+    source.addEventListener('reset', () => window.location.reload());
+})();
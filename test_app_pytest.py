@@ -0,0 +1,1123 @@
+import gzip
+import json
+import os
+import re
+import pytest
+from app import create_app
+from app import game
+from app.sessions import GameRegistry
+from app.shards import ShardedStorage
+from app.storage import MemoryStorage, SQLiteStorage, storage_from_url
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    """Create a test client for the application factory."""
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture(autouse=True)
+def setup_and_teardown():
+    """Reset the shared game state around each test."""
+    game.set_storage(MemoryStorage())
+    game.games.clear()
+    yield
+    game.storage.clear()
+    game.games.clear()
+    game.rooms.clear()
+
+def start_game(client, name='TestPlayer'):
+    client.post('/game', data={'player_name': name})
+    with client.session_transaction() as session:
+        return session['game_id']
+
+def test_registry_evicts_idle_games():
+    """Games idle past the timeout are dropped on lookup and on create."""
+    now = [0]
+    registry = GameRegistry(idle_timeout=10, clock=lambda: now[0])
+    first = registry.create(target=5)
+    now[0] = 5
+    second = registry.create(target=6)
+    now[0] = 12
+    assert registry.get(first.id) is None
+    assert registry.get(second.id) is second
+    now[0] = 30
+    registry.create(target=7)
+    assert len(registry) == 1
+
+def test_registry_is_bounded():
+    """The least recently used game is evicted beyond max_games."""
+    registry = GameRegistry(max_games=2)
+    first = registry.create(target=1)
+    second = registry.create(target=2)
+    registry.get(first.id)
+    registry.create(target=3)
+    assert first.id in registry
+    assert second.id not in registry
+
+def test_each_session_has_its_own_target(app):
+    """Concurrent players do not share a secret number."""
+    alice, bob = app.test_client(), app.test_client()
+    alice_game = start_game(alice, 'Alice')
+    bob_game = start_game(bob, 'Bob')
+    assert alice_game != bob_game
+    game.get_game(alice_game).target = 10
+    game.get_game(bob_game).target = 90
+    bob.post('/play-again')
+    assert game.get_number(alice_game) == 10
+
+@pytest.mark.parametrize("guess,expected_message", [
+    (25, b'Too low!'),
+    (75, b'Too High!'),
+    (50, b'You guessed it right in 3 tries!'),
+])
+def test_guess_sequence(client, guess, expected_message):
+    """Guesses are checked against the session's own game."""
+    game_id = start_game(client)
+    game.get_game(game_id).target = 50
+    for number in (10, 90):
+        client.post('/guess', data={'guess': number})
+    response = client.post('/guess', data={'guess': guess}, follow_redirects=True)
+    assert expected_message in response.data
+    if guess == 50:
+        assert game.get_scores()['TestPlayer'] == 3
+
+@pytest.fixture(params=['memory', 'sqlite', 'sharded'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    if request.param == 'sharded':
+        return ShardedStorage([MemoryStorage(), SQLiteStorage(str(tmp_path / 'game.db')), MemoryStorage()])
+    return SQLiteStorage(str(tmp_path / 'game.db'))
+
+def test_storage_records_scores(storage):
+    """Both backends implement the same player and score semantics."""
+    storage.add_player('Alice')
+    storage.add_player('Alice')
+    storage.add_guess('Alice', 20)
+    storage.add_guess('Alice', 40)
+    storage.add_guess('Ghost', 1)
+    assert storage.get_players() == {'Alice': {'guesses': [20, 40]}}
+    assert storage.record_score('Alice') == 2
+    assert storage.get_guesses('Alice') == []
+    assert storage.get_scores() == {'Alice': 2}
+    assert storage.record_score('Ghost') is None
+    storage.delete_player('Alice')
+    assert not storage.has_player('Alice')
+    assert storage.get_scores() == {}
+
+def test_sqlite_storage_is_shared(tmp_path):
+    """Separate SQLiteStorage instances (one per worker) see the same data."""
+    path = str(tmp_path / 'game.db')
+    first, second = SQLiteStorage(path), SQLiteStorage(path)
+    first.add_player('Alice')
+    second.add_guess('Alice', 7)
+    assert first.record_score('Alice') == 1
+    assert second.get_scores() == {'Alice': 1}
+
+def test_app_uses_configured_storage(monkeypatch, tmp_path):
+    """GAME_STORAGE_URL selects the backend behind app.game."""
+    monkeypatch.setenv('GAME_STORAGE_URL', 'sqlite:///' + str(tmp_path / 'game.db'))
+    client = create_app().test_client()
+    client.post('/players', json={'name': 'Alice'})
+    assert isinstance(game.storage, SQLiteStorage)
+    assert client.get('/players').get_json() == {'Alice': {'guesses': []}}
+
+def test_leaderboard_ranks_and_pages(storage):
+    """Scores are ranked fewest guesses first and paged by cursor."""
+    for name, guesses in [('Carol', 3), ('Alice', 5), ('Bob', 3), ('Dave', 1)]:
+        storage.add_player(name)
+        for number in range(guesses):
+            storage.add_guess(name, number)
+        storage.record_score(name)
+    assert storage.get_leaderboard(2) == [('Dave', 1), ('Bob', 3)]
+    assert storage.get_leaderboard(2, after=(3, 'Bob')) == [('Carol', 3), ('Alice', 5)]
+    assert storage.get_leaderboard(2, offset=3) == [('Alice', 5)]
+    assert storage.get_rank('Carol') == 3
+    storage.delete_player('Dave')
+    assert storage.get_rank('Carol') == 2
+    assert storage.count_scores() == 3
+
+def test_sorted_keys_match_a_sorted_list():
+    """Blocks split and empty out without changing positions or pages."""
+    import bisect
+    import random
+    from app.leaderboard import SortedKeys
+    rng = random.Random(1)
+    keys, expected = SortedKeys(load=4), []
+    for _ in range(2000):
+        if expected and rng.random() < 0.4:
+            key = expected.pop(rng.randrange(len(expected)))
+            keys.remove(key)
+        else:
+            key = (rng.randint(1, 50), f'p{rng.randrange(10 ** 6)}')
+            bisect.insort(expected, key)
+            keys.add(key)
+        probe = (rng.randint(1, 50), 'p5')
+        start = rng.randrange(len(expected) + 2)
+        assert len(keys) == len(expected)
+        assert keys.bisect_left(probe) == bisect.bisect_left(expected, probe)
+        assert keys.bisect_right(probe) == bisect.bisect_right(expected, probe)
+        assert keys.slice(start, start + 7) == expected[start:start + 7]
+
+def test_scores_json_pagination(client):
+    """/scores.json follows next_cursor until the table is exhausted."""
+    for name, score in [('Alice', 4), ('Bob', 2), ('Carol', 6)]:
+        game.add_player(name)
+        for number in range(score):
+            game.add_guess(name, number)
+        game.record_score(name)
+    first = client.get('/scores.json?limit=2').get_json()
+    assert [row['name'] for row in first['scores']] == ['Bob', 'Alice']
+    assert first['total'] == 3
+    second = client.get('/scores.json?limit=2&cursor=' + first['next_cursor']).get_json()
+    assert [row['name'] for row in second['scores']] == ['Carol']
+    assert second['next_cursor'] is None
+    assert client.get('/scores/Carol').get_json() == {'name': 'Carol', 'score': 6, 'rank': 3}
+    assert client.get('/scores.json?cursor=bogus').status_code == 400
+
+def test_game_page_escapes_player_name(client):
+    """Templates autoescape user input and link the shared stylesheet."""
+    client.post('/game', data={'player_name': '<b>Eve</b>'})
+    response = client.get('/game')
+    assert b'Hello, &lt;b&gt;Eve&lt;/b&gt;!' in response.data
+    assert re.search(rb'/assets/game\.[0-9a-f]{10}\.css', response.data)
+
+def test_scores_page_revalidates_with_etag(client):
+    """An unchanged score table is answered with 304 Not Modified."""
+    game.add_player('Alice')
+    game.record_score('Alice')
+    response = client.get('/scores')
+    assert b'Alice' in response.data
+    etag = response.headers['ETag']
+    assert client.get('/scores', headers={'If-None-Match': etag}).status_code == 304
+    game.delete_player('Alice')
+    response = client.get('/scores', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Alice' not in response.data
+    # A restarted worker makes as many changes to different scores
+    game.set_storage(MemoryStorage())
+    game.add_player('Bob')
+    game.record_score('Bob')
+    response = client.get('/scores', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Bob' in response.data
+
+def test_batch_guesses_stop_at_correct(client):
+    """A whole game can be played in a single batch request."""
+    created = client.post('/api/games', json={'player': 'Bot'})
+    assert created.status_code == 201
+    game_id = created.get_json()['id']
+    game.get_game(game_id).target = 30
+    response = client.post(f'/api/games/{game_id}/guesses', json={'guesses': [50, 25, 30, 99]})
+    body = response.get_json()
+    assert [r['result'] for r in body['results']] == ['high', 'low', 'correct']
+    assert body['finished'] and body['unused'] == 1
+    assert game.get_score('Bot') == 3
+    again = client.post(f'/api/games/{game_id}/guesses', json=[1])
+    assert again.status_code == 409
+
+@pytest.mark.parametrize("payload,expected_status", [
+    ({'guesses': []}, 400),
+    ({'guesses': ['10']}, 400),
+    ({'guesses': [True]}, 400),
+    ('not json', 400),
+])
+def test_batch_guesses_validation(client, payload, expected_status):
+    """Malformed batches are rejected before touching the game."""
+    game_id = client.post('/api/games').get_json()['id']
+    response = client.post(f'/api/games/{game_id}/guesses', json=payload)
+    assert response.status_code == expected_status
+    assert game.get_game(game_id).guesses == []
+
+def test_batch_guesses_unknown_game(client):
+    """Guessing in an expired or unknown game returns 404."""
+    response = client.post('/api/games/missing/guesses', json=[1])
+    assert response.status_code == 404
+
+def test_player_stats_accumulate(storage):
+    """Stats keep every finished game, not just the latest score."""
+    storage.add_player('Alice')
+    for guesses in (5, 3, 5, 200):
+        for number in range(guesses):
+            storage.add_guess('Alice', number)
+        storage.record_score('Alice')
+    stats = storage.get_stats('Alice')
+    assert stats['games'] == 4
+    assert stats['best'] == 3
+    assert stats['last'] == 200
+    assert stats['mean'] == 53.25
+    assert stats['distribution'] == {3: 1, 5: 2, 200: 1}
+    storage.delete_player('Alice')
+    assert storage.get_stats('Alice') is None
+
+def test_player_stats_route(client):
+    """GET /players/<name>/stats reports zero games before the first win."""
+    client.post('/players', json={'name': 'Alice'})
+    assert client.get('/players/Alice/stats').get_json() == {'games': 0}
+    assert client.get('/players/Nobody/stats').status_code == 404
+
+def test_decision_table_par():
+    """Par is the binary-search depth of the target."""
+    from app.solver import DecisionTable, TABLE_LIMIT
+    table = DecisionTable(1, 100)
+    assert table.par(50) == 1
+    assert table.par(25) == 2
+    assert max(table.par(n) for n in range(1, 101)) == table.worst_case == 7
+    large = DecisionTable(1, TABLE_LIMIT * 4)
+    assert large.depths is None
+    assert large.par(TABLE_LIMIT * 2) == 1
+    assert large.par(TABLE_LIMIT) == 2
+    assert large.par(7) <= large.worst_case
+
+def test_hint_follows_guesses(app, client):
+    """With hints enabled the remaining interval narrows after each guess."""
+    app.config['GAME_HINTS'] = True
+    game_id = client.post('/api/games').get_json()['id']
+    game.get_game(game_id).target = 30
+    client.post(f'/api/games/{game_id}/guesses', json=[50, 20])
+    assert client.get(f'/api/games/{game_id}/hint').get_json() == {
+        'low': 21, 'high': 49, 'remaining': 29, 'next_guess': 35, 'guesses': 2, 'par': None,
+    }
+    app.config['GAME_HINTS'] = False
+    assert client.get(f'/api/games/{game_id}/hint').status_code == 404
+
+def test_target_pool_draws_in_range():
+    """Batched targets are uniform draws inside the requested range."""
+    from app.targets import TargetPool
+    pool = TargetPool(5, 9, batch_size=64, low_water=0)
+    targets = [pool.take() for _ in range(500)]
+    assert set(targets) == {5, 6, 7, 8, 9}
+    large = TargetPool(1, 10 ** 12, batch_size=16, low_water=0)
+    assert all(1 <= large.take() <= 10 ** 12 for _ in range(50))
+
+def test_seeded_games_are_reproducible(client):
+    """The same seed and difficulty always produce the same target."""
+    first = client.post('/api/games', json={'difficulty': 'hard', 'seed': 7}).get_json()
+    second = client.post('/api/games', json={'difficulty': 'hard', 'seed': 7}).get_json()
+    assert (first['low'], first['high']) == (1, 10 ** 6)
+    assert game.get_number(first['id']) == game.get_number(second['id'])
+    assert client.post('/api/games', json={'difficulty': 'impossible'}).status_code == 400
+
+def test_difficulty_sets_page_range(client):
+    """The chosen difficulty drives the range shown on the game page."""
+    client.post('/game', data={'player_name': 'Alice', 'difficulty': 'extreme'})
+    response = client.get('/game')
+    assert b'between 1 - 1000000000' in response.data
+    assert b'max="1000000000"' in response.data
+    client.post('/play-again')
+    with client.session_transaction() as session:
+        assert game.get_game(session['game_id']).range == (1, 10 ** 9)
+
+def test_concurrent_games_keep_consistent_scores(app):
+    """Threads playing full games at once each record exactly one score."""
+    import threading
+
+    def play(index):
+        client = app.test_client()
+        game_id = client.post('/api/games', json={'player': f'P{index}'}).get_json()['id']
+        client.post(f'/api/games/{game_id}/guesses', json=list(range(1, 101)))
+        client.get('/scores.json')
+
+    threads = [threading.Thread(target=play, args=(index,)) for index in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert game.count_scores() == 32
+    assert len(game.get_players()) == 32
+
+def test_open_games_score_their_own_guesses(client):
+    """A second game for the same player does not change the first one's score."""
+    game_id = start_game(client, 'Alice')
+    target = game.get_game(game_id).target
+    misses = [number for number in range(1, 101) if number != target][:5]
+    for number in misses:
+        client.post('/guess', data={'guess': number})
+    api_id = client.post('/api/games', json={'player': 'Alice'}).get_json()['id']
+    client.post('/guess', data={'guess': target})
+    assert game.get_score('Alice') == 6
+    client.post(f'/api/games/{api_id}/guesses', json=[game.get_game(api_id).target])
+    assert game.get_stats('Alice')['games'] == 2
+    assert game.get_stats('Alice')['best'] == 1
+
+def test_wsgi_entry_point_under_gevent():
+    """wsgi:app serves games with the standard library monkey-patched."""
+    import subprocess
+    import sys
+    pytest.importorskip('gevent')
+    script = '''
+from gevent import monkey; monkey.patch_all()
+import gevent
+from wsgi import app
+from app import game
+
+def play(index):
+    client = app.test_client()
+    game_id = client.post('/api/games', json={'player': 'P%d' % index}).get_json()['id']
+    client.post('/api/games/%s/guesses' % game_id, json=list(range(1, 101)))
+
+gevent.joinall([gevent.spawn(play, index) for index in range(200)])
+assert game.count_scores() == 200, game.count_scores()
+'''
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_atomic_player_operations(storage):
+    """Rename, delete and conditional record_score are compare-and-set."""
+    storage.add_player('Alice')
+    storage.add_player('Bob')
+    storage.add_guess('Alice', 3)
+    assert storage.record_score('Alice', expected_guesses=2) is None
+    assert storage.record_score('Alice', expected_guesses=1) == 1
+    assert not storage.rename_player('Alice', 'Bob')
+    assert not storage.rename_player('Nobody', 'Carol')
+    assert storage.rename_player('Alice', 'Carol')
+    assert storage.get_scores() == {'Carol': 1}
+    assert storage.get_rank('Carol') == 1
+    assert storage.get_stats('Carol')['games'] == 1
+    assert storage.delete_player('Carol')
+    assert not storage.delete_player('Carol')
+
+def test_rename_route_keeps_score(client):
+    """PUT /players/<name> renames in place and refuses taken names."""
+    for name in ('Alice', 'Bob'):
+        client.post('/players', json={'name': name})
+    game.record_score('Alice')
+    assert client.put('/players/Alice', json={'name': 'Bob'}).status_code == 409
+    assert client.put('/players/Alice', json={'name': 'Carol'}).status_code == 200
+    assert game.get_scores() == {'Carol': 0}
+    assert client.put('/players/Alice', json={'name': 'Dave'}).status_code == 404
+
+def test_rename_races_with_guesses(app):
+    """Renames interleaved with guesses never lose or duplicate a player."""
+    import threading
+    game.add_player('P0')
+    names = [f'P{index}' for index in range(200)]
+
+    def rename():
+        for old, new in zip(names, names[1:]):
+            game.rename_player(old, new)
+
+    def guess():
+        for name in names * 5:
+            game.add_guess(name, 1)
+
+    threads = [threading.Thread(target=rename)] + [threading.Thread(target=guess) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(game.get_players()) == ['P199']
+
+def test_score_feed_coalesces_changes():
+    """Subscribers see only the latest change per player since their position."""
+    from app.events import ScoreFeed
+    feed = ScoreFeed(history=3)
+    feed.publish('Alice', {'score': 5})
+    feed.publish('Alice', {'score': 3})
+    feed.publish('Bob', {'score': 4})
+    assert feed.wait(0, timeout=0, coalesce=0) == (3, {'Alice': {'score': 3}, 'Bob': {'score': 4}})
+    assert feed.wait(3, timeout=0, coalesce=0) == (3, {})
+    feed.publish('Carol', {'score': 1})
+    feed.publish('Dave', {'score': 2})
+    assert feed.changes_since(0) == (5, None)
+
+def test_score_stream_pushes_rank_changes(client):
+    """/scores/stream emits a scores event when record_score fires."""
+    game.add_player('Alice')
+    response = client.get('/scores/stream', headers={'Last-Event-ID': str(game.feed.sequence)}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    game.record_score('Alice')
+    event = next(chunks).decode()
+    assert 'event: scores' in event
+    assert '"name": "Alice", "score": 0, "rank": 1' in event
+    response.close()
+
+@pytest.mark.parametrize('offset', [1000, None])
+def test_score_stream_resets_unknown_event_ids(client, offset):
+    """An ID from another worker or process is answered with a reset, then live events."""
+    game.add_player('Alice')
+    last_id = game.feed.sequence + offset if offset else -1
+    response = client.get('/scores/stream', headers={'Last-Event-ID': str(last_id)}, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    assert next(chunks).decode() == f'id: {game.feed.sequence}\nevent: reset\ndata: {{}}\n\n'
+    game.record_score('Alice')
+    assert 'event: scores' in next(chunks).decode()
+    response.close()
+
+def test_benchmark_harness_smoke():
+    """The load benchmark plays full games over real HTTP and flags regressions."""
+    from benchmarks.bench_app import run, regressions
+    result = run(players=4, concurrency=2, mode='wsgi', memory_players=2)
+    assert set(result['routes']) == {'POST /game', 'GET /game', 'POST /guess', 'GET /scores'}
+    assert result['routes']['GET /scores']['count'] == 4
+    assert 0 < result['routes']['GET /scores']['cpu_p99_ms'] <= result['routes']['GET /scores']['p99_ms']
+    assert regressions(result, result) == []
+    slower = dict(result, requests_per_second=result['requests_per_second'] * 2)
+    assert regressions(result, slower)
+
+def test_metrics_disabled_by_default(client):
+    """/metrics only exists when GAME_METRICS is set."""
+    assert client.get('/metrics').status_code == 404
+
+def test_metrics_endpoint(monkeypatch):
+    """Prometheus output covers route latency, game counters and store sizes."""
+    from app.metrics import counters
+    monkeypatch.setenv('GAME_METRICS', '1')
+    counters.reset()
+    client = create_app().test_client()
+    game_id = client.post('/api/games', json={'player': 'Alice'}).get_json()['id']
+    game.get_game(game_id).target = 40
+    client.post(f'/api/games/{game_id}/guesses', json=[20, 40])
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'guess_request_duration_seconds_count{endpoint="api.submit_guesses"} 1' in text
+    assert 'guess_request_duration_seconds_bucket{endpoint="api.create_game",le="+Inf"} 1' in text
+    assert 'guess_guesses_total 2' in text
+    assert 'guess_wins_total 1' in text
+    assert 'guess_games_total 1' in text
+    assert 'guess_players 1' in text
+    assert 'guess_scores 1' in text
+
+def test_profiler_captures_slow_requests():
+    """With the profiler on, requests over the threshold keep their hot stacks."""
+    import time
+    from app.metrics import SamplingProfiler
+    profiler = SamplingProfiler()
+    profiler.start(interval=0.001, threshold=0.02)
+    try:
+        profiler.begin()
+        time.sleep(0.05)
+        profile = profiler.end('GET /slow', 0.05)
+        profiler.begin()
+        assert profiler.end('GET /fast', 0.001) is None
+    finally:
+        profiler.stop()
+    assert profile['samples'] > 0
+    assert any('test_profiler_captures_slow_requests' in frame
+               for frame in profile['hot_stacks'][0]['stack'])
+    assert list(profiler.slow_requests) == [profile]
+
+def test_profiler_samples_greenlets_under_gevent():
+    """Under gevent the profiler samples both running and switched-out greenlets."""
+    import subprocess
+    import sys
+    pytest.importorskip('gevent')
+    script = '''
+from gevent import monkey; monkey.patch_all()
+import gevent
+import time
+from app.metrics import SamplingProfiler
+
+profiler = SamplingProfiler()
+profiler.start(interval=0.001, threshold=0.01)
+
+def busy():
+    started = time.perf_counter()
+    while time.perf_counter() - started < 0.05:
+        pass
+
+def request(work):
+    profiler.begin()
+    work()
+    return profiler.end(work.__name__, 0.1)
+
+def idle():
+    gevent.sleep(0.05)
+
+for profile in (gevent.spawn(request, busy).get(), gevent.spawn(request, idle).get()):
+    assert profile['samples'] > 0, profile
+    assert any(profile['request'] in frame for frame in profile['hot_stacks'][0]['stack']), profile
+'''
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_profiler_endpoint_needs_admin_token(monkeypatch):
+    """/metrics/profiler is off without GAME_ADMIN_TOKEN and refuses other callers."""
+    monkeypatch.setenv('GAME_METRICS', '1')
+    assert create_app().test_client().get('/metrics/profiler').status_code == 404
+    monkeypatch.setenv('GAME_ADMIN_TOKEN', 'letmein')
+    client = create_app().test_client()
+    assert client.post('/metrics/profiler', json={'enabled': True}).status_code == 401
+    assert client.get('/metrics/profiler', headers={'Authorization': 'Bearer nope'}).status_code == 401
+    response = client.get('/metrics/profiler', headers={'Authorization': 'Bearer letmein'})
+    assert response.status_code == 200 and not response.get_json()['enabled']
+
+def test_bulk_import_and_export(storage):
+    """Bulk imports create and update players in one go; export streams them back."""
+    storage.add_player('Alice')
+    created, updated = storage.bulk_import([
+        {'name': 'Alice', 'guesses': [1, 2], 'score': 4},
+        {'name': 'Bob', 'guesses': None, 'score': None},
+        {'name': 'Carol', 'guesses': [9], 'score': 2},
+    ])
+    assert (created, updated) == (2, 1)
+    assert sorted(storage.iter_players(), key=lambda record: record['name']) == [
+        {'name': 'Alice', 'guesses': [1, 2], 'score': 4},
+        {'name': 'Bob', 'guesses': [], 'score': None},
+        {'name': 'Carol', 'guesses': [9], 'score': 2},
+    ]
+    assert storage.get_rank('Carol') == 1
+
+def test_ndjson_round_trip(client):
+    """POST /players.ndjson imports what GET /players.ndjson exported."""
+    import json
+    lines = '\n'.join(json.dumps({'name': f'P{index}', 'guesses': [index], 'score': index % 7})
+                      for index in range(1000))
+    response = client.post('/players.ndjson', data=lines, content_type='application/x-ndjson')
+    assert response.get_json() == {'created': 1000, 'updated': 0}
+    exported = client.get('/players.ndjson')
+    assert exported.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in exported.get_data(as_text=True).splitlines()]
+    assert len(records) == 1000
+    assert {'name': 'P8', 'guesses': [8], 'score': 1} in records
+
+def test_ndjson_import_is_all_or_nothing(client):
+    """A bad line rejects the whole import."""
+    body = '{"name": "Alice"}\n{"name": "Bob", "score": -1}\n'
+    response = client.post('/players.ndjson', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert 'Line 2' in response.get_json()['error']
+    assert game.get_players() == {}
+
+def test_stateless_tokens_work_across_workers(monkeypatch):
+    """A token issued by one app instance is accepted by another with the same key."""
+    import random
+    monkeypatch.setenv('GAME_STATELESS', '1')
+    # Each worker keeps its own storage, swapped in around its requests
+    workers = []
+    for _ in range(2):
+        workers.append((create_app().test_client(), game.storage))
+
+    def post(worker, url, payload):
+        client, storage = workers[worker]
+        game.set_storage(storage)
+        return client.post(url, json=payload).get_json()
+
+    created = post(0, '/api/tokens', {'player': 'Alice', 'seed': 3})
+    target = random.Random(3).randint(1, 100)
+    first = post(0, '/api/tokens/guesses', {'token': created['token'], 'guesses': [0]})
+    miss = post(1, '/api/tokens/guesses', {'token': first['token'], 'guesses': [0]})
+    assert miss['guesses'] == 2 and not miss['finished']
+    won = post(1, '/api/tokens/guesses', {'token': miss['token'], 'guesses': [target]})
+    assert won['finished'] and won['token'] is None
+    assert won['guesses'] == 3
+    assert game.get_score('Alice') == 3
+    assert workers[0][1].get_score('Alice') is None
+
+def test_stateless_tokens_keep_no_pending_guesses(monkeypatch):
+    """Token games score from the token, not from the player's pending guesses."""
+    import random
+    monkeypatch.setenv('GAME_STATELESS', '1')
+    client = create_app().test_client()
+    game.add_player('Alice')
+    for number in range(40):
+        game.add_guess('Alice', number)
+    token = client.post('/api/tokens', json={'player': 'Alice', 'seed': 5}).get_json()['token']
+    target = random.Random(5).randint(1, 100)
+    client.post('/api/tokens/guesses', json={'token': token, 'guesses': [target]})
+    assert game.get_score('Alice') == 1
+    assert len(game.get_player('Alice')['guesses']) == 40
+
+def test_stateless_tokens_reject_replay_and_tampering(monkeypatch):
+    """Spent, forged and unknown tokens are refused."""
+    monkeypatch.setenv('GAME_STATELESS', '1')
+    client = create_app().test_client()
+    token = client.post('/api/tokens', json={'seed': 11}).get_json()['token']
+    assert client.post('/api/tokens/guesses', json={'token': token, 'guesses': [0]}).status_code == 200
+    assert client.post('/api/tokens/guesses', json={'token': token, 'guesses': [0]}).status_code == 403
+    assert client.post('/api/tokens/guesses', json={'token': token[:-2] + 'xx', 'guesses': [0]}).status_code == 403
+
+def test_stateless_token_hides_target():
+    """The target inside a token is encrypted, not just signed."""
+    from app.tokens import GameTokens
+    tokens = GameTokens('secret')
+    game_state = tokens.new_game(42, 1, 100)
+    payload = tokens.serializer.loads(tokens.issue(game_state))
+    assert payload['t'] != 42
+    restored, guesses = tokens.load(tokens.issue(game_state))
+    assert (restored.target, guesses) == (42, 0)
+
+def test_stateless_mode_is_opt_in(client):
+    """Without GAME_STATELESS the token endpoints do not exist."""
+    assert client.post('/api/tokens').status_code == 404
+
+def test_response_cache_invalidated_by_writes(client):
+    """Cached player and score responses change as soon as the data does."""
+    client.post('/players', json={'name': 'Ann'})
+    first = client.get('/players')
+    assert first.get_json() == {'Ann': {'guesses': []}}
+    assert client.get('/players', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/players/Ann').get_json() == {'Ann': {'guesses': [], 'score': None}}
+
+    game.add_guess('Ann', 50)
+    assert client.get('/players', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+    assert client.get('/players/Ann').get_json() == {'Ann': {'guesses': [50], 'score': None}}
+    game.record_score('Ann')
+    assert client.get('/players/Ann').get_json() == {'Ann': {'guesses': [], 'score': 1}}
+    assert client.get('/scores.json').get_json()['scores'] == [{'name': 'Ann', 'score': 1}]
+
+    game.rename_player('Ann', 'Bea')
+    assert client.get('/players/Ann').status_code == 404
+    assert client.get('/scores.json').get_json()['scores'] == [{'name': 'Bea', 'score': 1}]
+
+def test_response_cache_is_bounded():
+    from app.cache import ResponseCache
+    cache = ResponseCache(max_entries=2)
+    builds = []
+
+    def build(body):
+        builds.append(body)
+        return body
+    for name in (b'a', b'b', b'a', b'c', b'b'):
+        cache.get(('player', name), None, lambda: build(name))
+    assert builds == [b'a', b'b', b'c', b'b']
+    assert len(cache) == 2
+
+    # A write during a build keeps the stale body out of the cache
+    cache.get('page', 'scores', lambda: cache.invalidate(scores=True) or b'old')
+    assert cache.get('page', 'scores', lambda: b'new')[1] == b'new'
+
+def test_response_cache_disabled_for_shared_storage(tmp_path):
+    game.set_storage(SQLiteStorage(str(tmp_path / 'game.db')))
+    assert not game.response_cache.enabled
+    game.set_storage(MemoryStorage())
+    assert game.response_cache.enabled
+
+def test_rate_limiter_refills_over_time():
+    from app.ratelimit import MemoryRateLimiter, parse_rate
+    now = [0.0]
+    limiter = MemoryRateLimiter(rate=2, burst=3, max_clients=2, clock=lambda: now[0])
+    assert [limiter.take('a') for _ in range(3)] == [0, 0, 0]
+    assert limiter.take('a') == 0.5
+    now[0] = 1.0
+    assert limiter.take('a', 2) == 0
+    assert limiter.take('a', 4) == float('inf')
+    limiter.take('b')
+    limiter.take('c')
+    assert len(limiter) == 2
+    assert parse_rate('5/30') == (5.0, 30)
+    with pytest.raises(ValueError):
+        parse_rate('0/1')
+
+def test_shared_rate_limiter(tmp_path):
+    from app.ratelimit import SQLiteRateLimiter
+    now = [100.0]
+    storage = SQLiteStorage(str(tmp_path / 'game.db'))
+    first = SQLiteRateLimiter(storage, rate=1, burst=2, clock=lambda: now[0])
+    second = SQLiteRateLimiter(storage, rate=1, burst=2, clock=lambda: now[0])
+    assert first.take('1.2.3.4') == 0
+    assert second.take('1.2.3.4') == 0
+    assert first.take('1.2.3.4') == 1.0
+    now[0] += 1
+    assert second.take('1.2.3.4') == 0
+
+def test_guess_route_is_rate_limited(monkeypatch):
+    monkeypatch.setenv('GAME_RATE_LIMIT', '1/3')
+    client = create_app().test_client()
+    start_game(client)
+    statuses = [client.post('/guess', data={'guess': '0'}).status_code for _ in range(4)]
+    assert statuses == [302, 302, 302, 429]
+    assert client.post('/guess', data={'guess': '0'}).headers['Retry-After'] == '1'
+    # Another player behind the same address has their own bucket
+    other = client.application.test_client()
+    start_game(other, 'Other')
+    assert other.post('/guess', data={'guess': '0'}).status_code == 302
+    # but new games come out of the address's bucket, so they do not reset it
+    assert client.post('/game', data={'player_name': 'TestPlayer'}).status_code == 429
+
+def test_game_creation_is_rate_limited(monkeypatch):
+    monkeypatch.setenv('GAME_RATE_LIMIT', '1/3')
+    client = create_app().test_client()
+    statuses = [client.post('/api/games', json={'player': 'Bot'}).status_code for _ in range(4)]
+    assert statuses == [201, 201, 201, 429]
+    assert client.post('/api/rooms').status_code == 429
+    elsewhere = {'REMOTE_ADDR': '10.0.0.2'}
+    assert client.post('/api/games', json={'player': 'Bot'}, environ_base=elsewhere).status_code == 201
+
+def test_new_game_drops_pending_guesses(client):
+    """Guesses left in an abandoned game do not count towards the next one."""
+    game_id = client.post('/api/games', json={'player': 'Bot'}).get_json()['id']
+    client.post(f'/api/games/{game_id}/guesses', json={'guesses': [0] * 50})
+    game_id = client.post('/api/games', json={'player': 'Bot'}).get_json()['id']
+    assert game.get_player('Bot')['guesses'] == []
+    target = game.get_game(game_id).target
+    client.post(f'/api/games/{game_id}/guesses', json={'guesses': [target]})
+    assert game.get_scores()['Bot'] == 1
+
+def test_guesses_per_game_are_capped(client):
+    from app.sessions import MAX_GUESSES
+    game_id = start_game(client)
+    response = client.post(f'/api/games/{game_id}/guesses', json={'guesses': [0] * 1000})
+    assert len(response.get_json()['results']) == MAX_GUESSES
+    assert client.post(f'/api/games/{game_id}/guesses', json={'guesses': [0]}).status_code == 409
+    client.post('/guess', data={'guess': '0'})
+    assert game.OUT_OF_GUESSES in client.get('/game').get_data(as_text=True)
+
+def test_finished_game_refuses_guesses(client):
+    """Re-posting the number after a win neither scores again nor counts a game."""
+    game_id = start_game(client)
+    game.get_game(game_id).target = 50
+    client.post('/guess', data={'guess': 10})
+    assert b'You guessed it right in 2 tries!' in client.post('/guess', data={'guess': 50}).data
+    client.post('/guess', data={'guess': 50})
+    assert game.GAME_FINISHED in client.get('/game').get_data(as_text=True)
+    assert game.get_scores()['TestPlayer'] == 2
+    stats = client.get('/players/TestPlayer/stats').get_json()
+    assert stats['games'] == 1
+
+def test_room_race_broadcasts_to_members(client):
+    """Members share one target; every guess is pushed to the room's stream."""
+    room_id = client.post('/api/rooms', json={'player': 'Ann', 'seed': 7}).get_json()['id']
+    assert client.post(f'/api/rooms/{room_id}/members', json={'player': 'Bob'}).status_code == 200
+    room = game.get_room(room_id)
+    stream = client.get(f'/api/rooms/{room_id}/events', buffered=False)
+    chunks = iter(stream.response)
+    assert next(chunks).startswith(b'retry:')
+    assert game.room_guess(room, 'Ann', room.target - 1) == game.TOO_LOW
+    assert '"player": "Ann", "guess": %d, "result": "low"' % (room.target - 1) in next(chunks).decode()
+    stream.close()
+
+    guess = lambda player, number: client.post(f'/api/rooms/{room_id}/guesses',
+                                                json={'player': player, 'guess': number})
+    assert guess('Bob', room.target).get_json() == {
+        'guess': room.target, 'result': 'correct', 'finished': True, 'winner': 'Bob'}
+    assert guess('Ann', room.target).status_code == 409
+    assert guess('Eve', room.target).status_code == 403
+    assert game.get_score('Bob') == 1
+    assert client.get(f'/api/rooms/{room_id}').get_json()['members'] == {'Ann': 1, 'Bob': 1}
+
+def test_room_scores_are_separate_from_solo_games(client):
+    """A room win scores the room's guesses and leaves the solo game alone."""
+    game_id = start_game(client, 'Ann')
+    target = game.get_game(game_id).target
+    for _ in range(3):
+        client.post('/guess', data={'guess': 0 if target != 0 else 1})
+    room_id = client.post('/api/rooms', json={'player': 'Ann'}).get_json()['id']
+    room = game.get_room(room_id)
+    game.room_guess(room, 'Ann', room.target - 1)
+    assert game.room_guess(room, 'Ann', room.target) == game.CORRECT
+    assert game.get_score('Ann') == 2
+    assert len(game.get_player('Ann')['guesses']) == 3
+    client.post('/guess', data={'guess': target})
+    assert game.get_stats('Ann')['games'] == 2
+    assert game.get_stats('Ann')['last'] == 4
+
+def test_empty_rooms_are_closed(client):
+    room_id = client.post('/api/rooms', json={'player': 'Ann'}).get_json()['id']
+    client.post(f'/api/rooms/{room_id}/members', json={'player': 'Bob'})
+    assert client.delete(f'/api/rooms/{room_id}/members/Ann').status_code == 200
+    assert client.get(f'/api/rooms/{room_id}').get_json()['members'] == {'Bob': 0}
+    room = game.get_room(room_id)
+    client.delete(f'/api/rooms/{room_id}/members/Bob')
+    assert room.closed and len(game.rooms) == 0
+    assert client.get(f'/api/rooms/{room_id}').status_code == 404
+    assert client.post(f'/api/rooms/{room_id}/members', json={'player': 'Ann'}).status_code == 404
+
+def test_room_registry_evicts_idle_rooms():
+    from app.rooms import RoomRegistry
+    now = [0]
+    registry = RoomRegistry(idle_timeout=10, max_rooms=2, clock=lambda: now[0])
+    first = registry.create(5)
+    registry.create(6)
+    registry.create(7)
+    assert first.closed and len(registry) == 2
+    now[0] = 11
+    registry.create(8)
+    assert len(registry) == 1
+
+def test_create_app_accepts_config(monkeypatch):
+    """Settings come from a Config object, a dict, or the environment."""
+    from app.config import Config
+    from app.targets import DIFFICULTIES
+    monkeypatch.setitem(DIFFICULTIES, 'easy', DIFFICULTIES['easy'])
+    monkeypatch.setenv('GAME_MAX_GAMES', '7')
+    app = create_app(Config(game_range=(1, 10), game_cache_size=3))
+    assert (game.games.max_games, game.response_cache.max_entries) == (7, 3)
+    client = app.test_client()
+    client.post('/game', data={'player_name': 'Ann'})
+    assert b'between 1 - 10' in client.get('/game').data
+
+    create_app({'GAME_PRELOAD': False})
+    assert DIFFICULTIES['easy'] == (1, 100)
+    with pytest.raises(ValueError):
+        create_app({'GAME_WORKER_MODE': 'threads'})
+    with pytest.raises(RuntimeError):
+        create_app({'GAME_WORKER_MODE': 'gevent'})
+
+def test_event_log_recovers_games_and_players(tmp_path):
+    """A restarted worker replays the log and continues where it stopped."""
+    directory = str(tmp_path / 'journal')
+    client = create_app({'GAME_JOURNAL': directory}).test_client()
+    game_id = start_game(client, 'Ann')
+    target = game.get_game(game_id).target
+    client.post('/guess', data={'guess': str(target + 1)})
+    client.post('/players', json={'name': 'Bob'})
+    game.add_guess('Bob', 3)
+    game.record_score('Bob')
+    game.journal.close()
+
+    game.games.clear()
+    client = create_app({'GAME_JOURNAL': directory}).test_client()
+    assert game.get_players() == {'Ann': {'guesses': [target + 1]}, 'Bob': {'guesses': []}}
+    assert game.get_score('Bob') == 1 and game.get_stats('Bob')['games'] == 1
+    restored = game.get_game(game_id)
+    assert (restored.target, restored.guesses, restored.player) == (target, [target + 1], 'Ann')
+    # Startup compacted the replayed tail into a snapshot
+    assert sorted(os.listdir(directory)) == ['LOCK', 'journal-%012d.log' % (game.journal.sequence + 1), 'snapshot.json']
+    game.journal.close()
+
+def test_event_log_snapshots_and_torn_writes(tmp_path):
+    from app.journal import EventLog
+    log = EventLog(str(tmp_path), snapshot_every=3)
+    log.start(lambda: (log.sequence, {'events': log.sequence}))
+    for number in range(4):
+        log.wait(log.append(('add_player', f'p{number}')))
+    log.close()
+    with open(log._segment.name, 'a') as f:
+        f.write('[9,"add_pl')
+
+    log = EventLog(str(tmp_path))
+    state, events = log.recover()
+    assert state['events'] >= 3
+    assert events == [['add_player', f'p{number}'] for number in range(state['events'], 4)]
+    with pytest.raises(RuntimeError, match='in use by process %d' % os.getpid()):
+        EventLog(str(tmp_path), lock_timeout=0.2)
+    log.close()
+
+def test_analytics_fingerprints_players():
+    pytest.importorskip('numpy')
+    from app import analytics
+    events = []
+    # Ann bisects 1-100 with steady human timing, Bot scans upwards every 50ms
+    for number in range(20):
+        events.append(['new_game', f'a{number}', 70, 'Ann', 1, 100])
+        for step, guess in enumerate((50, 75, 62, 68, 71, 69, 70)):
+            events.append(['guess', f'a{number}', guess, number * 100 + step * (1.5 + step % 3)])
+        events.append(['new_game', f'b{number}', 30, 'Bot', 1, 100])
+        for guess in range(1, 31):
+            events.append(['guess', f'b{number}', guess, number * 100 + guess * 0.05])
+    events.append(['reset_game', 'a0', 50])
+    events.append(['guess', 'a0', 50, 5000.0])
+
+    report = analytics.report(analytics.load_guesses(events))
+    assert (report['games'], report['finished']) == (41, 41)
+    ann, bot = report['players']['Ann'], report['players']['Bot']
+    assert ann['style'] == 'binary-search' and ann['flags'] == []
+    assert ann['games'] == 21 and ann['mean_par'] == pytest.approx((20 * 7 + 1) / 21)
+    assert ann['efficiency'] == pytest.approx(1.0)
+    assert bot['style'] == 'linear-scan' and bot['patterns']['sequential'] > 0.9
+    assert set(bot['flags']) == {'fast', 'regular', 'brute-force'}
+    assert bot['timing']['median'] == pytest.approx(0.05)
+
+def test_analytics_reads_archived_segments(tmp_path, capsys):
+    pytest.importorskip('numpy')
+    from app import analytics, journal
+    directory = str(tmp_path / 'journal')
+    client = create_app({'GAME_JOURNAL': directory, 'GAME_JOURNAL_ARCHIVE': True}).test_client()
+    game_id = start_game(client, 'Ann')
+    target = game.get_game(game_id).target
+    for number in (target - 1, target):
+        client.post('/guess', data={'guess': str(number)})
+    game.journal.snapshot_every = 1
+    start_game(client, 'Ann')
+    game.journal.close()
+    assert journal.segments(os.path.join(directory, journal.ARCHIVE))
+
+    assert analytics.main([directory]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert (report['games'], report['finished'], report['guesses']) == (2, 1, 2)
+    assert report['players']['Ann']['finished'] == 1
+
+def test_player_search_follows_writes(storage):
+    """Prefix and substring search see adds, renames, deletes and imports."""
+    for name in ('alice', 'Albert', 'bob', 'Alicia', 'al_x', 'Malia'):
+        storage.add_player(name)
+    storage.bulk_import([{'name': 'ALINA'}, {'name': 'bob'}])
+    assert storage.search_players(10, prefix='al') == ['al_x', 'Albert', 'alice', 'Alicia', 'ALINA']
+    assert storage.search_players(2, prefix='AL', after='Albert') == ['alice', 'Alicia']
+    assert storage.search_players(10, prefix='al_') == ['al_x']
+    assert storage.search_players(10, query='ali') == ['alice', 'Alicia', 'ALINA', 'Malia']
+    assert storage.search_players(10, query='LI', after='alice') == ['Alicia', 'ALINA', 'Malia']
+    storage.rename_player('Alicia', 'Zed')
+    storage.delete_player('Malia')
+    assert storage.search_players(10, query='ali') == ['alice', 'ALINA']
+    assert storage.search_players(10, prefix='z') == ['Zed']
+
+def test_player_search_route(client):
+    for number in range(25):
+        client.post('/players', json={'name': f'player{number:02d}'})
+    client.post('/players', json={'name': 'other'})
+    page = client.get('/players?prefix=Play').get_json()
+    assert page['players'] == [f'player{number:02d}' for number in range(20)]
+    rest = client.get(f'/players?prefix=play&cursor={page["next_cursor"]}').get_json()
+    assert rest == {'players': [f'player{number:02d}' for number in range(20, 25)], 'next_cursor': None}
+    assert client.get('/players?q=er1&limit=3').get_json()['players'] == ['player10', 'player11', 'player12']
+    assert client.get('/players?q=x&cursor=_w').status_code == 400
+    assert 'other' in client.get('/players').get_json()
+
+def test_assets_are_fingerprinted_and_compressed(client):
+    """/assets/ serves immutable, precompressed, range-capable static files."""
+    page = client.get('/game').data.decode()
+    url = re.search(r'/assets/game\.[0-9a-f]{10}\.css', page).group()
+    with open('static/game.css', 'rb') as f:
+        css = f.read()
+
+    response = client.get(url)
+    assert response.data == css and response.mimetype == 'text/css'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip' and compressed.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(compressed.data) == css
+
+    partial = client.get(url, headers={'Range': 'bytes=0-9'})
+    assert partial.status_code == 206 and partial.data == css[:10]
+    assert client.get('/assets/game.0000000000.css').status_code == 404
+
+def test_vendored_images_fall_back_to_remote(tmp_path):
+    """Feedback GIFs link to their original host until they are fetched."""
+    from app import assets
+    app = create_app({'GAME_ASSETS': False})
+    with app.test_request_context():
+        assert assets.asset_url('game.css') == '/static/game.css'
+        if not os.path.exists(os.path.join(app.static_folder, 'img/win.gif')):
+            assert assets.asset_url('img/win.gif') == assets.REMOTE['img/win.gif']
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'img' / 'win.gif').write_bytes(b'GIF89a' + bytes(1000))
+    manifest = assets.AssetManifest(str(tmp_path))
+    image = manifest.get(manifest.url_names['img/win.gif'])
+    assert image.mimetype == 'image/gif' and list(image.bodies) == ['identity']
+
+def test_sharded_storage_merges_global_views(tmp_path):
+    """Leaderboards, ranks and renames span shards like a single store."""
+    storage = ShardedStorage([MemoryStorage(), SQLiteStorage(str(tmp_path / 'game.db')), MemoryStorage()])
+    names = [f'player{number}' for number in range(30)]
+    for number, name in enumerate(names):
+        storage.add_player(name)
+        for guess in range(number % 7):
+            storage.add_guess(name, guess)
+        storage.record_score(name)
+    assert all(shard.count_players() for shard in storage.shards)
+    ranked = sorted(names, key=lambda name: (names.index(name) % 7, name))
+    assert [name for name, _ in storage.get_leaderboard(10, offset=5)] == ranked[5:15]
+    assert [name for name, _ in storage.get_leaderboard(5, after=(2, ranked[12]))] == ranked[13:18]
+    assert [storage.get_rank(name) for name in ranked] == list(range(1, 31))
+
+    # Renames move players, with their score and stats, between shards
+    for number, name in enumerate(names[:10]):
+        assert storage.rename_player(name, f'renamed{number}')
+        assert storage.get_score(f'renamed{number}') == number % 7 and not storage.has_player(name)
+        assert storage.get_stats(f'renamed{number}')['games'] == 1
+    assert not storage.rename_player('renamed1', 'renamed2')
+    assert storage.count_players() == storage.count_scores() == 30
+
+def test_sharded_storage_rebalances_onto_new_shard():
+    storage = ShardedStorage([MemoryStorage(), MemoryStorage()])
+    storage.bulk_import([{'name': f'p{number}', 'guesses': [number], 'score': number} for number in range(300)])
+    before = {name: storage.shard_index(name) for name in storage.get_players()}
+    moved = storage.add_shard(MemoryStorage())
+    # Only the players the new shard owns move, about a third of them
+    assert moved == storage.shards[2].count_players() and 50 < moved < 150
+    assert all(storage.shard_index(name) in (index, 2) for name, index in before.items())
+    assert storage.count_players() == 300
+    assert storage.get_record('p7') == {'name': 'p7', 'guesses': [7], 'score': 7, 'stats': None}
+    assert storage.get_rank('p7') == 8
+
+def test_sharded_storage_over_shard_processes():
+    """The app plays against shards living in other processes."""
+    from app import shards
+    processes, urls = shards.start_local(3)
+    try:
+        client = create_app({'GAME_STORAGE_URL': ','.join(urls[:2])}).test_client()
+        assert game.storage.shared
+        for number in range(20):
+            client.post('/players', json={'name': f'player{number}'})
+        game.record_score('player3')
+        assert len(client.get('/players').get_json()) == 20
+        assert client.get('/scores/player3').get_json()['rank'] == 1
+        assert client.get('/players?prefix=player1').get_json()['players'][:2] == ['player1', 'player10']
+
+        moved = game.storage.add_shard(shards.remote_from_url(urls[2]))
+        assert moved and game.storage.count_players() == 20
+        assert client.get('/scores/player3').get_json()['score'] == 0
+    finally:
+        game.set_storage(MemoryStorage())
+        for process in processes:
+            process.terminate()
+
+def test_shard_rebalance_reaches_other_workers():
+    """Workers that missed a rebalance are refused by the shards and follow it."""
+    from app import shards
+    processes, urls = shards.start_local(3)
+    try:
+        rebalancer, worker, late = (storage_from_url(','.join(urls[:2])) for _ in range(3))
+        for number in range(50):
+            worker.add_player(f'player{number}')
+            worker.add_guess(f'player{number}', number)
+        assert rebalancer.add_shard(shards.remote_from_url(urls[2]))
+        moved = next(name for name in rebalancer.get_players() if rebalancer.shard_index(name) == 2)
+        # The stale worker's call is refused, and it reloads the layout
+        assert worker.get_guesses(moved) == [int(moved[len('player'):])]
+        assert len(worker.shards) == 3 and worker.version == rebalancer.version
+        worker.add_guess(moved, 99)
+        assert rebalancer.get_guesses(moved)[-1] == 99
+        assert worker.count_players() == 50
+        # New players land on the shard that owns them, not an old one
+        name = next(f'new{number}' for number in range(1000) if rebalancer.ring.node(f'new{number}') == 2)
+        late.add_player(name)
+        assert rebalancer.shards[2].has_player(name) and rebalancer.count_players() == 51
+    finally:
+        for process in processes:
+            process.terminate()
+
+def test_sharded_storage_rate_limits_in_its_sqlite_shard(monkeypatch, tmp_path):
+    from app.ratelimit import SQLiteRateLimiter
+    monkeypatch.setenv('GAME_RATE_LIMIT', '1/2')
+    app = create_app({'GAME_STORAGE_URL': f"memory://,sqlite:///{tmp_path / 'game.db'}"})
+    assert isinstance(app.extensions['guess_limiter'], SQLiteRateLimiter)
+
+def test_shards_require_an_authkey():
+    """Shard processes unpickle what clients send, so the key is mandatory."""
+    from app import shards
+    with pytest.raises(ValueError):
+        shards.serve(('127.0.0.1', 0), b'')
+    with pytest.raises(ValueError):
+        shards.remote_from_url('shard://127.0.0.1:7001')
+    with pytest.raises(SystemExit):
+        shards.main(['serve', '127.0.0.1:0', '--authkey', ''])
+
+def test_simulation_matches_binary_search_par():
+    """Simulated binary searchers always score par, whatever the worker count."""
+    from app import simulation
+    report = simulation.run(3000, 'binary', workers=2, seed=7, rate=10, chunk=1000)
+    assert (report['games'], report['won'], report['lost_share']) == (3000, 3000, 0)
+    assert report['scores']['mean'] == report['mean_par'] and report['scores']['max'] == 7
+    assert sum(report['scores']['distribution'].values()) == 3000
+    page = report['requests_per_game']['page']
+    assert page['POST /guess'] == report['scores']['mean'] and page['total'] == 1 + 2 * page['POST /guess']
+    assert report['requests_per_second']['api']['POST /api/games'] == 10
+    again = simulation.run(3000, 'binary', workers=1, seed=7, rate=10, chunk=1000)
+    assert again['scores'] == report['scores']
+
+def test_simulation_strategies_and_guess_cap():
+    from app import simulation
+    human = simulation.run(500, 'human', workers=1, seed=1)
+    assert human['scores']['mean'] > human['mean_par']
+    random_guesses = simulation.run(20, 'app.simulation:RandomGuess', difficulty='hard', workers=1, seed=1)
+    assert random_guesses['lost_share'] == 0 and random_guesses['scores']['mean'] > random_guesses['mean_par']
+    # Scanning a thousand numbers runs into the guess cap most of the time
+    scan = simulation.run(200, 'linear', game_range=(1, 1000), workers=1, seed=1)
+    assert 0.6 < scan['lost_share'] < 0.95 and scan['scores']['max'] <= 200
+    assert scan['requests_per_game']['api']['POST /api/games/<id>/guesses'] > 150
+    with pytest.raises(ValueError):
+        simulation.run(1, 'psychic')
@@ -0,0 +1,9 @@
+# Production entry point: gunicorn -k gevent wsgi:app
+#
+# The gevent worker monkey-patches the standard library before it imports
+# this module, so the threading locks guarding app.game state become
+# cooperative and an idle game connection costs a greenlet, not a thread.
+# Do not combine it with --preload, which would create those locks unpatched.
+from app import create_app
+
+app = create_app()